@@ -0,0 +1,92 @@
+"""Stored bytes of LLM request/response columns under each column codec.
+
+Run with ``uv run python benchmarks/bench_compression.py``. The corpus is
+2,000 synthetic Anthropic-style request bodies, response bodies and header
+maps of a few hundred bytes to a few KB, the sizes that stay inline in
+SQLite (larger bodies go to the blob store). ``zstd`` trains its dictionary
+on the first 1,000 values, as :class:`ColumnCodec` does in production.
+"""
+
+from __future__ import annotations
+
+import json
+import random
+import time
+
+from agentprobe.storage.compression import ColumnCodec, zstandard
+
+_VALUES = 2000
+
+
+def _corpus() -> list[str]:
+    rng = random.Random(3)
+    words = "the file test function error import value return class module path".split()
+    values = []
+    for i in range(_VALUES // 3 + 1):
+        text = " ".join(rng.choice(words) for _ in range(rng.randint(20, 400)))
+        values.append(
+            json.dumps(
+                {
+                    "model": "claude-sonnet",
+                    "max_tokens": 8192,
+                    "messages": [{"role": "user", "content": [{"type": "text", "text": text}]}],
+                    "metadata": {"user_id": f"user_{i % 7:032x}"},
+                    "stream": True,
+                },
+                separators=(",", ":"),
+            )
+        )
+        values.append(
+            json.dumps(
+                {
+                    "id": f"msg_{i:024x}",
+                    "type": "message",
+                    "role": "assistant",
+                    "content": [{"type": "text", "text": text[::-1]}],
+                    "usage": {
+                        "input_tokens": rng.randint(100, 9000),
+                        "output_tokens": rng.randint(1, 900),
+                    },
+                },
+                separators=(",", ":"),
+            )
+        )
+        values.append(
+            json.dumps(
+                {
+                    "content-type": "application/json",
+                    "anthropic-version": "2023-06-01",
+                    "user-agent": "claude-cli/1.0.0 (external, cli)",
+                    "x-request-id": f"req_{i:024x}",
+                },
+                separators=(",", ":"),
+            )
+        )
+    return values[:_VALUES]
+
+
+def main() -> None:
+    values = _corpus()
+    raw = sum(len(v.encode()) for v in values)
+    print(f"{_VALUES} values, {raw:,} bytes raw")
+    methods = ["zlib", "zstd"] if zstandard is not None else ["zlib"]
+    for method in methods:
+        codec = ColumnCodec(method)
+        start = time.perf_counter()
+        packed = [codec.compress(v) for v in values]
+        elapsed = time.perf_counter() - start
+        assert [codec.decompress(p) for p in packed] == values
+        # Only values compressed after training show the dictionary's effect.
+        tail = packed[_VALUES // 2 :]
+        tail_raw = sum(len(v.encode()) for v in values[_VALUES // 2 :])
+        stored = sum(len(p) for p in packed)
+        tail_stored = sum(len(p) for p in tail)
+        print(
+            f"{method:6}{stored:>12,} bytes  {raw / stored:4.1f}x overall, "
+            f"{tail_raw / tail_stored:4.1f}x after warm-up, "
+            f"{elapsed / _VALUES * 1e6:.0f} us/value"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""Request-body bytes stored per turn for a 200-turn coding-agent session.
+
+Run with ``uv run python benchmarks/bench_delta.py``. The session is
+synthetic but shaped like a Claude Code ``/v1/messages`` conversation: a
+~12 KB system prompt and ~40 KB of tool definitions on every call, and each
+turn appending an assistant ``tool_use`` and a user ``tool_result`` of a
+few hundred bytes to a few KB. ``full`` is what the request body column
+holds today; ``delta`` is what :class:`DeltaEncoder` stores instead. The
+time column is the encoder's CPU per turn, spent on the writer thread.
+"""
+
+from __future__ import annotations
+
+import json
+import random
+import time
+
+from agentprobe.storage.delta import DeltaEncoder, apply_delta
+
+_TURNS = 200
+_KEYFRAME_INTERVAL = 32
+
+
+def _session(turns: int) -> list[str]:
+    rng = random.Random(7)
+    system = [{"type": "text", "text": "You are an interactive CLI coding agent. " * 300}]
+    tools = [
+        {
+            "name": f"Tool{i}",
+            "description": "Runs an operation on the workspace. " * 30,
+            "input_schema": {
+                "type": "object",
+                "properties": {
+                    f"arg{j}": {"type": "string", "description": "x" * 40} for j in range(6)
+                },
+            },
+        }
+        for i in range(20)
+    ]
+    messages: list[dict] = [{"role": "user", "content": "Fix the failing tests in this repo."}]
+    bodies = []
+    for turn in range(turns):
+        body = {
+            "model": "claude-sonnet",
+            "max_tokens": 32000,
+            "system": system,
+            "tools": tools,
+            "messages": messages,
+            "stream": True,
+        }
+        bodies.append(json.dumps(body, separators=(",", ":"), ensure_ascii=False))
+        tool_id = f"toolu_{turn:04d}"
+        messages = messages + [
+            {
+                "role": "assistant",
+                "content": [
+                    {"type": "text", "text": "Let me look at that. " * rng.randint(1, 10)},
+                    {
+                        "type": "tool_use",
+                        "id": tool_id,
+                        "name": "Tool3",
+                        "input": {"arg0": "src/x.py"},
+                    },
+                ],
+            },
+            {
+                "role": "user",
+                "content": [
+                    {
+                        "type": "tool_result",
+                        "tool_use_id": tool_id,
+                        "content": "line of output\n" * rng.randint(20, 300),
+                    },
+                ],
+            },
+        ]
+    return bodies
+
+
+def main() -> None:
+    bodies = _session(_TURNS)
+    encoder = DeltaEncoder(keyframe_interval=_KEYFRAME_INTERVAL)
+    stored: dict[str, str] = {}
+    deltas: dict[str, dict] = {}
+    full_total = delta_total = 0
+    start = time.perf_counter()
+    for turn, body in enumerate(bodies):
+        request_id = str(turn)
+        encoded = encoder.encode(request_id, body)
+        delta = encoded[1] if encoded is not None else None
+        if delta is None:
+            stored[request_id] = body
+        else:
+            deltas[request_id] = json.loads(delta)
+        full_total += len(body.encode())
+        delta_total += len((delta or body).encode())
+    elapsed = time.perf_counter() - start
+
+    # Every body must come back byte for byte.
+    for turn, body in enumerate(bodies):
+        chain = []
+        request_id = str(turn)
+        while request_id in deltas:
+            chain.append(deltas[request_id])
+            request_id = chain[-1]["base"]
+        obj = json.loads(stored[request_id])
+        for step in reversed(chain):
+            obj = apply_delta(obj, step)
+        assert json.dumps(obj, separators=(",", ":"), ensure_ascii=False) == body
+
+    print(f"{_TURNS} turns, keyframe every {_KEYFRAME_INTERVAL}")
+    print(f"{'':8}{'total':>12}{'per turn':>12}{'last turn':>12}")
+    print(f"{'full':8}{full_total:>12,}{full_total // _TURNS:>12,}{len(bodies[-1]):>12,}")
+    print(f"{'delta':8}{delta_total:>12,}{delta_total // _TURNS:>12,}")
+    print(f"ratio {full_total / delta_total:.1f}x, encode {elapsed / _TURNS * 1000:.2f} ms/turn")
+
+
+if __name__ == "__main__":
+    main()
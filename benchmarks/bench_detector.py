@@ -0,0 +1,59 @@
+"""Per-request cost of agent detection, uncached and cached.
+
+Run with ``uv run python benchmarks/bench_detector.py``. Uncached cost grows
+with the number of custom signatures, every one of which is tried at every
+position of the header text; cached cost should stay flat.
+"""
+
+from __future__ import annotations
+
+import time
+
+from agentprobe.parser.detector import AgentMatcher
+
+_SIGNATURES = [0, 10, 50, 200]
+_REQUESTS = 100_000
+
+_HEADERS = [
+    {
+        "user-agent": "claude-cli/1.0.118 (external, cli)",
+        "anthropic-version": "2023-06-01",
+        "anthropic-beta": "interleaved-thinking-2025-05-14",
+        "content-type": "application/json",
+        "x-app": "cli",
+        "x-stainless-lang": "js",
+        "x-stainless-runtime": "node",
+    },
+    {
+        "User-Agent": "opencode/0.5.1 ai-sdk/provider-utils/3.0.0",
+        "Content-Type": "application/json",
+    },
+    {"user-agent": "codex_cli_rs/0.20.0 (Mac OS 14.5.0; arm64)", "originator": "codex_cli_rs"},
+    {"user-agent": "GeminiCLI/0.1.18 (darwin; arm64)", "x-goog-api-client": "gl-node/22.0.0"},
+    {"user-agent": "python-requests/2.32.0", "accept": "*/*"},
+]
+
+
+def _custom(count: int) -> dict[str, list[str]]:
+    return {f"agent_{i}": [rf"agent[-_]?{i}/\d+"] for i in range(count)}
+
+
+def _run(matcher: AgentMatcher) -> float:
+    headers = _HEADERS
+    started = time.perf_counter()
+    for i in range(_REQUESTS):
+        matcher.detect(headers[i % len(headers)])
+    return time.perf_counter() - started
+
+
+def main() -> None:
+    print(f"{'signatures':>10} {'uncached ns':>12} {'cached ns':>10}")
+    for count in _SIGNATURES:
+        signatures = _custom(count)
+        uncached = _run(AgentMatcher(signatures, cache_size=0))
+        cached = _run(AgentMatcher(signatures))
+        print(f"{count:>10} {uncached / _REQUESTS * 1e9:>12.0f} {cached / _REQUESTS * 1e9:>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
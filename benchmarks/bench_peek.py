@@ -0,0 +1,46 @@
+"""Cost of protocol and model detection in the request hook across body sizes.
+
+Run with ``uv run python benchmarks/bench_peek.py``. The peek column should
+stay flat from the smallest body to the largest; a full parse grows with
+the body.
+"""
+
+from __future__ import annotations
+
+import json
+import time
+
+from agentprobe.parser.detector import detect_model, detect_protocol, peek_json
+
+_SIZES = [1 << 10, 64 << 10, 1 << 20, 5 << 20]
+_ROUNDS = 20
+
+
+def _body(size: int) -> str:
+    messages = [{"role": "user", "content": "first question"}]
+    while len(messages) * 1000 < size:
+        messages.append({"role": "assistant", "content": "x" * 1000})
+        messages.append({"role": "user", "content": "y" * 1000})
+    return json.dumps({"model": "claude-sonnet-4-5", "max_tokens": 8192, "messages": messages})
+
+
+def _run(body: str, read) -> float:
+    started = time.perf_counter()
+    for _ in range(_ROUNDS):
+        parsed = read(body)
+        detect_protocol("llm.internal", "/chat", parsed)
+        detect_model("/chat", parsed)
+    return (time.perf_counter() - started) / _ROUNDS
+
+
+def main() -> None:
+    print(f"{'body':>10} {'parse us':>10} {'peek us':>10}")
+    for size in _SIZES:
+        body = _body(size)
+        parse = _run(body, json.loads)
+        peek = _run(body, peek_json)
+        print(f"{len(body) / 1024:>8.0f}KB {parse * 1e6:>10.1f} {peek * 1e6:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
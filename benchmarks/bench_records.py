@@ -0,0 +1,87 @@
+"""Memory held by one captured 10k-event stream, before and after SSEBatch.
+
+Run with ``uv run python benchmarks/bench_records.py``. The previous path kept
+every parsed event dict for the lifetime of the flow and built one Pydantic
+``SSEEvent`` (uuid4 + ``datetime.now``) per event at completion. The current
+path appends the same parser output to a columnar ``SSEBatch``. Both are
+measured with ``tracemalloc`` while the stream is retained, counting live
+allocated blocks and bytes. The event strings themselves come from the
+parser in both paths and are not included.
+"""
+
+from __future__ import annotations
+
+import gc
+import json
+import tracemalloc
+
+from agentprobe.storage.models import SSEEvent
+from agentprobe.storage.records import SSEBatch
+
+_EVENTS = 10_000
+_PER_CHUNK = 4
+
+
+def _parsed_chunks() -> list[list[dict]]:
+    chunks = []
+    for start in range(0, _EVENTS, _PER_CHUNK):
+        chunk = []
+        for i in range(start, min(start + _PER_CHUNK, _EVENTS)):
+            delta = {"type": "content_block_delta", "index": 0, "delta": {"text": f"tok{i} "}}
+            chunk.append({"event": "content_block_delta", "data": json.dumps(delta)})
+        chunks.append(chunk)
+    return chunks
+
+
+def _before(chunks: list[list[dict]]) -> object:
+    events: list[dict] = []
+    for chunk in chunks:
+        events.extend(dict(e) for e in chunk)
+    models = [
+        SSEEvent(
+            request_id="req",
+            event_index=idx,
+            event_type=raw.get("event", "message"),
+            data=raw.get("data", ""),
+        )
+        for idx, raw in enumerate(events)
+    ]
+    return events, models
+
+
+def _after(chunks: list[list[dict]]) -> object:
+    batch = SSEBatch()
+    for n, chunk in enumerate(chunks):
+        batch.append([dict(e) for e in chunk], n * 0.001)
+    return batch
+
+
+def _measure(fn, chunks: list[list[dict]]) -> tuple[int, int, int]:
+    gc.collect()
+    tracemalloc.start()
+    baseline = tracemalloc.take_snapshot()
+    kept = fn(chunks)
+    snapshot = tracemalloc.take_snapshot()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    diff = snapshot.compare_to(baseline, "filename")
+    blocks = sum(stat.count_diff for stat in diff)
+    size = sum(stat.size_diff for stat in diff)
+    del kept
+    return blocks, size, peak
+
+
+def main() -> None:
+    chunks = _parsed_chunks()
+    print(f"{_EVENTS:,} events per stream")
+    print(f"{'path':>8} {'live blocks':>12} {'live KiB':>10} {'peak KiB':>10} {'B/event':>9}")
+    for name, fn in (("before", _before), ("after", _after)):
+        blocks, size, peak = _measure(fn, chunks)
+        print(
+            f"{name:>8} {blocks:>12,} {size / 1024:>10,.0f} {peak / 1024:>10,.0f} "
+            f"{size / _EVENTS:>9,.0f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
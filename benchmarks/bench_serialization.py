@@ -0,0 +1,57 @@
+"""Throughput of encoding request summaries for broadcast and REST lists.
+
+Run with ``uv run python benchmarks/bench_serialization.py``. Compares the
+previous path (Pydantic ``to_summary().model_dump(mode="json")`` followed by
+``json.dumps``) with ``summary_dict()`` encoded by ``agentprobe.serialization``.
+"""
+
+from __future__ import annotations
+
+import json
+import time
+
+from agentprobe import serialization
+from agentprobe.storage.models import CapturedRequest
+
+_COUNT = 50_000
+
+
+def _captured(i: int) -> CapturedRequest:
+    return CapturedRequest(
+        sequence=i,
+        agent_type="claude_code",
+        method="POST",
+        url="https://api.anthropic.com/v1/messages?beta=true",
+        host="api.anthropic.com",
+        path="/v1/messages?beta=true",
+        status_code=200,
+        duration_ms=1234.5,
+        response_size=48213,
+        is_streaming=True,
+    )
+
+
+def _pydantic(items: list[CapturedRequest]) -> None:
+    for captured in items:
+        summary = captured.to_summary().model_dump(mode="json")
+        json.dumps({"type": "request_complete", "data": summary})
+
+
+def _fast(items: list[CapturedRequest]) -> None:
+    for captured in items:
+        serialization.dumps({"type": "request_complete", "data": captured.summary_dict()})
+
+
+def main() -> None:
+    items = [_captured(i) for i in range(_COUNT)]
+    print(f"backend: {serialization.BACKEND}")
+    print(f"{'path':>10} {'summaries/s':>14} {'us/summary':>12}")
+    for name, fn in (("pydantic", _pydantic), ("fast", _fast)):
+        started = time.perf_counter()
+        fn(items)
+        elapsed = time.perf_counter() - started
+        print(f"{name:>10} {_COUNT / elapsed:>14,.0f} {elapsed / _COUNT * 1e6:>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""Per-byte cost of SSEParser across stream sizes.
+
+Run with ``uv run python benchmarks/bench_sse.py``. The ns/byte column should
+stay flat from the smallest to the largest stream.
+"""
+
+from __future__ import annotations
+
+import json
+import time
+
+from agentprobe.proxy.sse import SSEParser
+
+_SIZES = [1 << 10, 64 << 10, 1 << 20, 8 << 20, 50 << 20]
+_CHUNK = 16 * 1024
+
+
+def _event(i: int) -> bytes:
+    data = {
+        "type": "content_block_delta",
+        "index": 0,
+        "delta": {"type": "text_delta", "text": f"token {i} ✓ "},
+    }
+    return b"event: content_block_delta\r\ndata: " + json.dumps(data).encode() + b"\r\n\r\n"
+
+
+def _stream(size: int) -> bytes:
+    parts: list[bytes] = []
+    total = 0
+    i = 0
+    while total < size:
+        ev = _event(i)
+        parts.append(ev)
+        total += len(ev)
+        i += 1
+    return b"".join(parts)
+
+
+def _run(stream: bytes) -> tuple[float, int]:
+    parser = SSEParser()
+    count = 0
+    started = time.perf_counter()
+    for offset in range(0, len(stream), _CHUNK):
+        count += len(parser.feed(stream[offset : offset + _CHUNK]))
+    count += len(parser.flush())
+    return time.perf_counter() - started, count
+
+
+def main() -> None:
+    print(f"{'stream':>10} {'events':>10} {'seconds':>10} {'ns/byte':>10}")
+    for size in _SIZES:
+        stream = _stream(size)
+        elapsed, count = _run(stream)
+        print(
+            f"{len(stream) / 1024:>8.0f}KB {count:>10} {elapsed:>10.4f}"
+            f" {elapsed / len(stream) * 1e9:>10.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
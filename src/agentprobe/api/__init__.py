@@ -1,20 +1,55 @@
 from __future__ import annotations
 
+import asyncio
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 
+from agentprobe.api.websocket import WebSocketHub
+from agentprobe.api.websocket import hub as default_hub
 from agentprobe.config import Config
+from agentprobe.proxy.bridge import LoopBridge
 from agentprobe.storage.database import Database
+from agentprobe.storage.enrichment import EnrichmentWorker
+from agentprobe.storage.retention import RetentionWorker
+from agentprobe.storage.writer import CaptureWriter
 
 from .router import router
 
 
-def create_app(config: Config, db: Database) -> FastAPI:
-    app = FastAPI(title="AgentProbe", version="0.1.0")
+def create_app(
+    config: Config,
+    db: Database,
+    writer: CaptureWriter | None = None,
+    bridge: LoopBridge | None = None,
+    hub: WebSocketHub | None = None,
+    retention: RetentionWorker | None = None,
+    enrichment: EnrichmentWorker | None = None,
+) -> FastAPI:
+    @asynccontextmanager
+    async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+        # The serving loop owns the database and WebSockets; the proxy
+        # reaches it through the bridge only while the app is up.
+        if bridge is not None:
+            bridge.bind(asyncio.get_running_loop())
+        try:
+            yield
+        finally:
+            if bridge is not None:
+                bridge.unbind()
+
+    app = FastAPI(title="AgentProbe", version="0.1.0", lifespan=lifespan)
 
     app.state.config = config
     app.state.db = db
+    app.state.writer = writer
+    app.state.bridge = bridge
+    app.state.hub = hub if hub is not None else default_hub
+    app.state.retention = retention
+    app.state.enrichment = enrichment
 
     app.add_middleware(
         CORSMiddleware,
@@ -22,6 +57,7 @@ def create_app(config: Config, db: Database) -> FastAPI:
         allow_credentials=True,
         allow_methods=["*"],
         allow_headers=["*"],
+        expose_headers=["X-Next-Cursor"],
     )
 
     app.include_router(router)
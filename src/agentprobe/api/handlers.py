@@ -1,32 +1,216 @@
 from __future__ import annotations
 
+import asyncio
+import base64
+import binascii
+import re
 import shlex
+import zlib
+from collections.abc import AsyncIterator, Mapping
+from datetime import UTC, datetime, timedelta
 from typing import Any
 
 from fastapi import HTTPException
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 
-from agentprobe.storage.database import Database
+from agentprobe.api.websocket import WebSocketHub
+from agentprobe.proxy.bridge import LoopBridge
+from agentprobe.serialization import dumps
+from agentprobe.storage.database import BODY_PARTS, Database
+from agentprobe.storage.enrichment import EnrichmentWorker
+from agentprobe.storage.queries import FILTER_FIELDS, fts_match_expression
+from agentprobe.storage.retention import RetentionWorker
+from agentprobe.storage.rollups import (
+    RESOLUTIONS,
+    ROLLUP_DIMENSIONS,
+    build_timeseries,
+    merge_rollups,
+)
+from agentprobe.storage.sessions import session_summary
+from agentprobe.storage.writer import CaptureWriter
 
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+DEFAULT_TIMESERIES_BUCKETS = 60
+MAX_TIMESERIES_BUCKETS = 10_000
+DEFAULT_QUANTILES = (0.5, 0.95, 0.99)
 
-async def list_requests(db: Database) -> list[dict[str, Any]]:
-    rows = await db.list_requests()
-    return [r.model_dump(mode="json") for r in rows]
+_TRUE = ("1", "true", "yes")
+_FALSE = ("0", "false", "no")
 
+# Single "bytes=first-last" or suffix "bytes=-length" ranges; other forms
+# (multiple ranges, other units) are ignored and get the whole body.
+_RANGE_RE = re.compile(r"bytes=(\d*)-(\d*)")
 
-async def get_request(db: Database, request_id: str) -> dict[str, Any]:
+
+def _json_response(content: Any) -> Response:
+    # Pre-encoded so FastAPI skips its jsonable_encoder pass over the payload.
+    return Response(content=dumps(content), media_type="application/json")
+
+
+def parse_filters(params: Mapping[str, str]) -> dict[str, Any]:
+    """Read the ``FILTER_FIELDS`` query parameters, rejecting malformed values."""
+    filters: dict[str, Any] = {}
+    for key in FILTER_FIELDS:
+        value = params.get(key)
+        if not value:
+            continue
+        if key == "status_code":
+            if not value.isdigit():
+                raise HTTPException(status_code=400, detail="status_code must be an integer")
+            filters[key] = int(value)
+        elif key in ("is_streaming", "enriched"):
+            if value.lower() not in _TRUE + _FALSE:
+                raise HTTPException(status_code=400, detail=f"{key} must be a boolean")
+            filters[key] = value.lower() in _TRUE
+        elif key in ("since", "until"):
+            filters[key] = _parse_time(key, value)
+        else:
+            filters[key] = value
+    return filters
+
+
+def _parse_time(name: str, value: str) -> str:
+    # Stored timestamps are UTC isoformat strings, so normalise to the same
+    # form and let SQLite compare them as text.
+    try:
+        when = datetime.fromisoformat(value)
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"{name} must be an ISO 8601 time") from None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=UTC)
+    return when.astimezone(UTC).isoformat()
+
+
+def _parse_limit(value: str | None) -> int:
+    if not value:
+        return DEFAULT_PAGE_SIZE
+    if not value.isdigit() or int(value) == 0:
+        raise HTTPException(status_code=400, detail="limit must be a positive integer")
+    return min(int(value), MAX_PAGE_SIZE)
+
+
+def _encode_cursor(key: tuple[int, int]) -> str:
+    return base64.urlsafe_b64encode(f"{key[0]}:{key[1]}".encode()).rstrip(b"=").decode()
+
+
+def _decode_cursor(cursor: str) -> tuple[int, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        sequence, rowid = raw.split(":")
+        return int(sequence), int(rowid)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise HTTPException(status_code=400, detail="invalid cursor") from None
+
+
+async def list_requests(db: Database, params: Mapping[str, str]) -> Response:
+    """One newest-first page of request summaries.
+
+    The page is a JSON list. When older rows exist, the ``X-Next-Cursor``
+    header holds an opaque cursor to pass back as ``after_sequence``.
+
+    With ``q``, the rows are instead the best full-text matches for every
+    term in ``q``, ranked by relevance, each with a ``snippet`` of the
+    matching text; search results are a single page.
+    """
+    filters = parse_filters(params)
+    limit = _parse_limit(params.get("limit"))
+    match = fts_match_expression(params.get("q", ""))
+    if match is not None:
+        return _json_response(await db.search_summaries(match, filters=filters, limit=limit))
+    cursor = params.get("after_sequence")
+    after = _decode_cursor(cursor) if cursor else None
+    page, next_key = await db.list_summary_page(filters=filters, after=after, limit=limit)
+    response = _json_response(page)
+    if next_key is not None:
+        response.headers["X-Next-Cursor"] = _encode_cursor(next_key)
+    return response
+
+
+async def get_request(db: Database, request_id: str) -> Response:
     row = await db.get_request(request_id)
     if row is None:
         raise HTTPException(status_code=404, detail="Request not found")
-    return row.model_dump(mode="json")
+    return _json_response(row.model_dump())
 
 
-async def get_request_sse_events(db: Database, request_id: str) -> list[dict[str, Any]]:
-    row = await db.get_request(request_id)
-    if row is None:
+def _parse_range(header: str | None, size: int) -> tuple[int, int] | None:
+    """Return the ``[start, stop)`` byte range a Range header asks for."""
+    if not header:
+        return None
+    match = _RANGE_RE.fullmatch(header.strip())
+    if match is None or match.group(1) == match.group(2) == "":
+        return None
+    first, last = match.groups()
+    if not first:
+        length = int(last)
+        if length == 0:
+            raise _range_not_satisfiable(size)
+        return max(0, size - length), size
+    start = int(first)
+    if start >= size or (last and int(last) < start):
+        raise _range_not_satisfiable(size)
+    return start, min(int(last) + 1, size) if last else size
+
+
+def _range_not_satisfiable(size: int) -> HTTPException:
+    return HTTPException(
+        status_code=416,
+        detail="Requested range not satisfiable",
+        headers={"Content-Range": f"bytes */{size}"},
+    )
+
+
+async def get_request_body(
+    db: Database, request_id: str, part: str, range_header: str | None
+) -> Response:
+    """Serve the raw request or response body, honouring a single byte range.
+
+    Bodies in the blob store are read through ``mmap`` so a range costs only
+    the pages it covers.
+    """
+    if part not in BODY_PARTS:
+        raise HTTPException(status_code=400, detail="part must be request or response")
+    columns = await db.get_body_columns(request_id, part)
+    if columns is None:
+        raise HTTPException(status_code=404, detail="Request not found")
+
+    ref = columns["ref"]
+    blobs = db.blobs
+    data = b""
+    if ref is not None:
+        if blobs is None:
+            raise HTTPException(status_code=404, detail="Blob store is not configured")
+        try:
+            size = await asyncio.to_thread(blobs.size, ref)
+        except FileNotFoundError:
+            raise HTTPException(status_code=404, detail="Body blob is missing") from None
+    else:
+        data = (columns["body"] or "").encode()
+        size = len(data)
+
+    media_type = next(
+        (v for k, v in columns["headers"].items() if k.lower() == "content-type"),
+        "application/octet-stream",
+    )
+    headers = {"Accept-Ranges": "bytes"}
+    byte_range = _parse_range(range_header, size)
+    start, stop = byte_range if byte_range is not None else (0, size)
+    if ref is not None and blobs is not None:
+        data = await asyncio.to_thread(blobs.read_range, ref, start, stop)
+    elif byte_range is not None:
+        data = data[start:stop]
+    if byte_range is None:
+        return Response(content=data, media_type=media_type, headers=headers)
+    headers["Content-Range"] = f"bytes {start}-{stop - 1}/{size}"
+    return Response(content=data, status_code=206, media_type=media_type, headers=headers)
+
+
+async def get_request_sse_events(db: Database, request_id: str) -> Response:
+    if not await db.request_exists(request_id):
         raise HTTPException(status_code=404, detail="Request not found")
     events = await db.get_sse_events(request_id)
-    return [e.model_dump(mode="json") for e in events]
+    return _json_response([e.model_dump() for e in events])
 
 
 async def clear_requests(db: Database) -> JSONResponse:
@@ -38,56 +222,201 @@ async def get_stats(db: Database) -> dict[str, Any]:
     return await db.get_stats()
 
 
-async def export_har(db: Database) -> dict[str, Any]:
-    summaries = await db.list_requests(limit=10000)
-    requests = []
-    for s in summaries:
-        full = await db.get_request(s.id)
-        if full is not None:
-            requests.append(full)
-    entries = []
-    for req in requests:
-        entry: dict[str, Any] = {
-            "startedDateTime": req.timestamp,
-            "time": req.duration_ms or 0,
-            "request": {
-                "method": req.method,
-                "url": req.url,
-                "httpVersion": "HTTP/1.1",
-                "headers": [{"name": k, "value": v} for k, v in (req.request_headers or {}).items()],
-                "queryString": [],
-                "bodySize": len(req.request_body) if req.request_body else 0,
-                "postData": {
-                    "mimeType": req.request_headers.get("content-type", "") if req.request_headers else "",
-                    "text": req.request_body or "",
-                } if req.request_body else None,
-            },
-            "response": {
-                "status": req.status_code or 0,
-                "statusText": "",
-                "httpVersion": "HTTP/1.1",
-                "headers": [{"name": k, "value": v} for k, v in (req.response_headers or {}).items()],
-                "content": {
-                    "size": len(req.response_body) if req.response_body else 0,
-                    "mimeType": req.response_headers.get("content-type", "") if req.response_headers else "",
-                    "text": req.response_body or "",
-                },
-                "bodySize": len(req.response_body) if req.response_body else 0,
-            },
-            "cache": {},
-            "timings": {"send": 0, "wait": req.duration_ms or 0, "receive": 0},
+async def get_metrics(
+    writer: CaptureWriter | None,
+    bridge: LoopBridge | None,
+    hub: WebSocketHub,
+    retention: RetentionWorker | None = None,
+    enrichment: EnrichmentWorker | None = None,
+) -> dict[str, Any]:
+    return {
+        "writer": writer.stats() if writer is not None else None,
+        "tasks": bridge.stats() if bridge is not None else None,
+        "websocket": hub.stats(),
+        "retention": retention.stats() if retention is not None else None,
+        "enrichment": enrichment.stats() if enrichment is not None else None,
+    }
+
+
+def _parse_quantiles(value: str | None) -> tuple[float, ...]:
+    if not value:
+        return DEFAULT_QUANTILES
+    try:
+        quantiles = tuple(float(part) for part in value.split(","))
+    except ValueError:
+        quantiles = ()
+    if not quantiles or not all(0 <= q <= 1 for q in quantiles):
+        raise HTTPException(status_code=400, detail="quantiles must be numbers between 0 and 1")
+    return quantiles
+
+
+async def get_timeseries(db: Database, params: Mapping[str, str]) -> Response:
+    """Counts, bytes, errors and latency percentiles per time bucket.
+
+    Read from the rollups kept as flows complete, so any window costs one
+    row per bucket and key rather than a scan of the requests. Buckets are
+    ``resolution`` wide (minute, hour or day) and hold the flows that
+    started in them; ``since`` and ``until`` are rounded out to whole
+    buckets and default to the last 60. ``dimension`` (total, agent,
+    provider, host or model) splits the result into one series per value,
+    or just ``key``. ``quantiles`` is a comma separated list, 0.5,0.95,0.99
+    by default; percentiles are within 1% of the exact value.
+    """
+    resolution = params.get("resolution") or "minute"
+    if resolution not in RESOLUTIONS:
+        raise HTTPException(
+            status_code=400, detail=f"resolution must be one of {', '.join(RESOLUTIONS)}"
+        )
+    dimension = params.get("dimension") or "total"
+    if dimension not in ROLLUP_DIMENSIONS:
+        raise HTTPException(
+            status_code=400, detail=f"dimension must be one of {', '.join(ROLLUP_DIMENSIONS)}"
+        )
+    quantiles = _parse_quantiles(params.get("quantiles"))
+    width = RESOLUTIONS[resolution]
+    until = params.get("until")
+    if until:
+        end = datetime.fromisoformat(_parse_time("until", until)).timestamp()
+        end_bucket = int(-(-end // width) * width)
+    else:
+        # Up to and including the bucket in progress.
+        end_bucket = (int(datetime.now(UTC).timestamp()) // width + 1) * width
+    since = params.get("since")
+    if since:
+        start_bucket = int(datetime.fromisoformat(_parse_time("since", since)).timestamp())
+        start_bucket -= start_bucket % width
+    else:
+        start_bucket = end_bucket - DEFAULT_TIMESERIES_BUCKETS * width
+    if start_bucket >= end_bucket:
+        raise HTTPException(status_code=400, detail="since must be before until")
+    if (end_bucket - start_bucket) // width > MAX_TIMESERIES_BUCKETS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"window spans more than {MAX_TIMESERIES_BUCKETS} {resolution} buckets",
+        )
+    rows = await db.get_rollups(resolution, dimension, params.get("key"), start_bucket, end_bucket)
+    return _json_response(
+        {
+            "resolution": resolution,
+            "dimension": dimension,
+            "since": datetime.fromtimestamp(start_bucket, UTC),
+            "until": datetime.fromtimestamp(end_bucket, UTC),
+            "series": build_timeseries(merge_rollups(rows), quantiles),
         }
-        entries.append(entry)
+    )
 
-    return {
-        "log": {
-            "version": "1.2",
-            "creator": {"name": "AgentProbe", "version": "0.1.0"},
-            "entries": entries,
+
+async def list_sessions(db: Database, params: Mapping[str, str], window: float) -> Response:
+    """Sessions, most recently active first, with their aggregates.
+
+    The aggregates are kept up to date as requests are written, so this
+    reads one row per session. ``agent`` keeps one agent's sessions and
+    ``limit`` caps how many are returned. A session is ``active`` while
+    its last request started less than ``window`` seconds ago.
+    """
+    limit = _parse_limit(params.get("limit"))
+    rows = await db.get_sessions(limit, params.get("agent") or None)
+    cutoff = (datetime.now(UTC) - timedelta(seconds=window)).isoformat()
+    return _json_response(
+        {
+            "sessions": [
+                {**session_summary(row), "active": row["last_seen"] > cutoff} for row in rows
+            ],
         }
+    )
+
+
+_HAR_CHUNK_BYTES = 64 * 1024
+
+
+def _har_entry(req: dict[str, Any]) -> dict[str, Any]:
+    request_headers = req["request_headers"] or {}
+    response_headers = req["response_headers"] or {}
+    request_body = req["request_body"]
+    response_body = req["response_body"]
+    return {
+        "startedDateTime": req["timestamp"],
+        "time": req["duration_ms"] or 0,
+        "request": {
+            "method": req["method"],
+            "url": req["url"],
+            "httpVersion": "HTTP/1.1",
+            "headers": [{"name": k, "value": v} for k, v in request_headers.items()],
+            "queryString": [],
+            "bodySize": len(request_body) if request_body else 0,
+            "postData": {
+                "mimeType": request_headers.get("content-type", ""),
+                "text": request_body,
+            }
+            if request_body
+            else None,
+        },
+        "response": {
+            "status": req["status_code"] or 0,
+            "statusText": "",
+            "httpVersion": "HTTP/1.1",
+            "headers": [{"name": k, "value": v} for k, v in response_headers.items()],
+            "content": {
+                "size": len(response_body) if response_body else 0,
+                "mimeType": response_headers.get("content-type", ""),
+                "text": response_body or "",
+            },
+            "bodySize": len(response_body) if response_body else 0,
+        },
+        "cache": {},
+        "timings": {"send": 0, "wait": req["duration_ms"] or 0, "receive": 0},
     }
 
 
+async def _har_chunks(db: Database, filters: dict[str, Any]) -> AsyncIterator[bytes]:
+    # The document is written by hand around the entries so that only one
+    # entry is ever encoded at a time; output is batched into ~64 KiB chunks.
+    creator = dumps({"name": "AgentProbe", "version": "0.1.0"})
+    buffer = bytearray(b'{"log":{"version":"1.2","creator":' + creator + b',"entries":[')
+    first = True
+    async for req in db.iter_request_dicts(filters):
+        if not first:
+            buffer += b","
+        first = False
+        buffer += dumps(_har_entry(req))
+        if len(buffer) >= _HAR_CHUNK_BYTES:
+            yield bytes(buffer)
+            buffer.clear()
+    buffer += b"]}}"
+    yield bytes(buffer)
+
+
+async def _gzip_chunks(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits 31: gzip container
+    async for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+async def export_har(db: Database, params: Mapping[str, str]) -> StreamingResponse:
+    """Stream matching requests, oldest first, as a HAR 1.2 document.
+
+    Takes the same filters and time range as :func:`list_requests`. With
+    ``gzip=true`` the download is a gzip file of the same document.
+    """
+    filters = parse_filters(params)
+    compress = params.get("gzip", "").lower() in _TRUE
+    chunks = _har_chunks(db, filters)
+    filename = "agentprobe.har"
+    media_type = "application/json"
+    if compress:
+        chunks = _gzip_chunks(chunks)
+        filename += ".gz"
+        media_type = "application/gzip"
+    return StreamingResponse(
+        chunks,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
 async def export_curl(db: Database, request_id: str) -> JSONResponse:
     row = await db.get_request(request_id)
     if row is None:
@@ -3,25 +3,32 @@ from __future__ import annotations
 from typing import Any
 
 from fastapi import APIRouter, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import Response, StreamingResponse
 
 from agentprobe.api import handlers
-from agentprobe.api.websocket import hub
 
 router = APIRouter()
 
 
 @router.get("/api/requests")
-async def list_requests(request: Request) -> list[dict[str, Any]]:
-    return await handlers.list_requests(request.app.state.db)
+async def list_requests(request: Request) -> Response:
+    return await handlers.list_requests(request.app.state.db, request.query_params)
 
 
 @router.get("/api/requests/{request_id}")
-async def get_request(request_id: str, request: Request) -> dict[str, Any]:
+async def get_request(request_id: str, request: Request) -> Response:
     return await handlers.get_request(request.app.state.db, request_id)
 
 
+@router.get("/api/requests/{request_id}/body")
+async def get_request_body(request_id: str, request: Request, part: str = "response") -> Response:
+    return await handlers.get_request_body(
+        request.app.state.db, request_id, part, request.headers.get("range")
+    )
+
+
 @router.get("/api/requests/{request_id}/sse-events")
-async def get_request_sse_events(request_id: str, request: Request) -> list[dict[str, Any]]:
+async def get_request_sse_events(request_id: str, request: Request) -> Response:
     return await handlers.get_request_sse_events(request.app.state.db, request_id)
 
 
@@ -35,9 +42,28 @@ async def get_stats(request: Request) -> dict[str, Any]:
     return await handlers.get_stats(request.app.state.db)
 
 
+@router.get("/api/metrics")
+async def get_metrics(request: Request) -> dict[str, Any]:
+    state = request.app.state
+    return await handlers.get_metrics(
+        state.writer, state.bridge, state.hub, state.retention, state.enrichment
+    )
+
+
+@router.get("/api/metrics/timeseries")
+async def get_timeseries(request: Request) -> Response:
+    return await handlers.get_timeseries(request.app.state.db, request.query_params)
+
+
+@router.get("/api/sessions")
+async def list_sessions(request: Request) -> Response:
+    state = request.app.state
+    return await handlers.list_sessions(state.db, request.query_params, state.config.session_window)
+
+
 @router.get("/api/export/har")
-async def export_har(request: Request) -> dict[str, Any]:
-    return await handlers.export_har(request.app.state.db)
+async def export_har(request: Request) -> StreamingResponse:
+    return await handlers.export_har(request.app.state.db, request.query_params)
 
 
 @router.get("/api/export/curl/{request_id}")
@@ -47,9 +73,12 @@ async def export_curl(request_id: str, request: Request):  # type: ignore[no-unt
 
 @router.websocket("/ws")
 async def websocket_endpoint(ws: WebSocket) -> None:
+    hub = ws.app.state.hub
     await hub.connect(ws)
     try:
         while True:
-            await ws.receive_text()
+            hub.handle_message(ws, await ws.receive_text())
     except WebSocketDisconnect:
+        pass
+    finally:
         hub.disconnect(ws)
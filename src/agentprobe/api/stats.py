@@ -0,0 +1,68 @@
+"""Push of aggregate stats to WebSocket clients while captures change them."""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from agentprobe.api.websocket import WebSocketHub
+    from agentprobe.storage.database import Database
+    from agentprobe.storage.partitions import PartitionedDatabase
+
+log = logging.getLogger(__name__)
+
+
+class StatsPublisher:
+    """Broadcasts ``stats_update`` messages instead of clients polling ``/api/stats``.
+
+    Every ``interval`` seconds, if the store has committed writes since the
+    last push and a client is connected, the stats are read from the
+    counter table and broadcast. A queued update that has not been sent yet
+    is replaced by the newer one.
+    """
+
+    def __init__(
+        self,
+        db: Database | PartitionedDatabase,
+        hub: WebSocketHub,
+        interval: float = 1.0,
+    ) -> None:
+        self._db = db
+        self._hub = hub
+        self._interval = interval
+        self._task: asyncio.Task[None] | None = None
+        self._published_changes = -1
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def close(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def publish(self) -> bool:
+        """Broadcast the stats if they may have changed; return whether it did."""
+        changes = self._db.changes
+        if changes == self._published_changes or not self._hub.connection_count:
+            return False
+        stats = await self._db.get_stats()
+        await self._hub.broadcast({"type": "stats_update", "data": stats})
+        self._published_changes = changes
+        return True
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.publish()
+            except Exception:
+                log.exception("stats push failed")
+            await asyncio.sleep(self._interval)
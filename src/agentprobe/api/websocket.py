@@ -2,51 +2,293 @@
 
 from __future__ import annotations
 
+import asyncio
+import itertools
 import json
 import logging
+import time
+from collections import Counter, deque
 from typing import Any
 
 from fastapi import WebSocket
 
+from agentprobe.serialization import dumps_str
+
 logger = logging.getLogger(__name__)
 
+# Subscribing to this request id receives the SSE events of every stream.
+ALL_STREAMS = "*"
+
+# Summary messages for the same request replace each other while queued.
+_COALESCED_TYPES = {"new_request", "request_complete"}
+
+# Only the newest queued stats message is worth sending.
+_STATS_KEY = "stats_update"
+
+# Close code sent to clients that fall too far behind (RFC 6455 "try again later").
+_SLOW_CLIENT_CLOSE_CODE = 1013
+
+_client_ids = itertools.count(1)
+
+
+class _Outbound:
+    __slots__ = ("payload", "key", "enqueued_at")
+
+    def __init__(self, payload: str, key: str | None, enqueued_at: float) -> None:
+        self.payload = payload
+        self.key = key
+        self.enqueued_at = enqueued_at
+
+
+class _Client:
+    """One connection with its own bounded outbound queue and sender task.
+
+    When the queue is full the oldest message is dropped. A summary for a
+    request that still has an unsent summary queued replaces it in place, so
+    a client may see ``request_complete`` for a request whose ``new_request``
+    it never received and should treat it as an upsert.
+    """
+
+    def __init__(self, ws: WebSocket, queue_size: int, max_lag: float) -> None:
+        self.id = next(_client_ids)
+        self.ws = ws
+        self.subscriptions: set[str] = set()
+        self._queue: deque[_Outbound] = deque()
+        self._keyed: dict[str, _Outbound] = {}
+        self._queue_size = queue_size
+        self._max_lag = max_lag
+        self._wakeup = asyncio.Event()
+        self._task: asyncio.Task[None] | None = None
+        self.closed = False
+        self.evicted = False
+
+        self.sent = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.last_lag_ms = 0.0
+        self.max_lag_ms = 0.0
+
+    def start(self) -> None:
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def stop(self) -> None:
+        self.closed = True
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def enqueue(self, payload: str, key: str | None = None) -> None:
+        if self.closed:
+            return
+        now = time.monotonic()
+        if self._queue and now - self._queue[0].enqueued_at > self._max_lag:
+            self._evict()
+            return
+        if key is not None:
+            queued = self._keyed.get(key)
+            if queued is not None:
+                queued.payload = payload
+                self.coalesced += 1
+                return
+        if len(self._queue) >= self._queue_size:
+            oldest = self._queue.popleft()
+            if oldest.key is not None:
+                self._keyed.pop(oldest.key, None)
+            self.dropped += 1
+        entry = _Outbound(payload, key, now)
+        self._queue.append(entry)
+        if key is not None:
+            self._keyed[key] = entry
+        self._wakeup.set()
+
+    def stats(self) -> dict[str, Any]:
+        lag_ms = (time.monotonic() - self._queue[0].enqueued_at) * 1000 if self._queue else 0.0
+        return {
+            "id": self.id,
+            "depth": len(self._queue),
+            "sent": self.sent,
+            "dropped": self.dropped,
+            "coalesced": self.coalesced,
+            "lag_ms": lag_ms,
+            "last_send_lag_ms": self.last_lag_ms,
+            "max_send_lag_ms": self.max_lag_ms,
+            "subscriptions": len(self.subscriptions),
+        }
+
+    def _evict(self) -> None:
+        # The sender may be stuck in a send to a stalled socket, so cancel it
+        # rather than waiting for it to notice.
+        self.evicted = True
+        self.stop()
+        self._queue.clear()
+        self._keyed.clear()
+        logger.warning("closing slow WebSocket client %d", self.id)
+        asyncio.get_running_loop().create_task(self._close())
+
+    async def _close(self) -> None:
+        try:
+            await asyncio.wait_for(self.ws.close(code=_SLOW_CLIENT_CLOSE_CODE), timeout=1.0)
+        except Exception:
+            pass
+
+    async def _run(self) -> None:
+        while True:
+            if not self._queue:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            entry = self._queue.popleft()
+            if entry.key is not None and self._keyed.get(entry.key) is entry:
+                del self._keyed[entry.key]
+            try:
+                await self.ws.send_text(entry.payload)
+            except Exception:
+                self.closed = True
+                return
+            lag_ms = (time.monotonic() - entry.enqueued_at) * 1000
+            self.sent += 1
+            self.last_lag_ms = lag_ms
+            self.max_lag_ms = max(self.max_lag_ms, lag_ms)
+
 
 class WebSocketHub:
-    """Manages WebSocket connections and broadcasts events."""
+    """Manages WebSocket connections and broadcasts events.
+
+    Broadcasting only enqueues: each client has a bounded outbound queue
+    drained by its own sender task, so a slow browser delays nobody else.
+    A client whose oldest queued message is older than ``max_lag`` seconds is
+    disconnected.
 
-    def __init__(self) -> None:
-        self._connections: list[WebSocket] = []
+    Request summaries go to every client. Live SSE events only go to clients
+    that subscribed to the stream by sending
+    ``{"type": "subscribe_sse", "request_id": ...}`` (or ``"*"`` for all
+    streams), and ``{"type": "unsubscribe_sse", ...}`` to stop.
+    """
+
+    def __init__(self, queue_size: int = 1000, max_lag: float = 10.0) -> None:
+        self._clients: dict[WebSocket, _Client] = {}
+        self._sse_interest: Counter[str] = Counter()
+        self._queue_size = queue_size
+        self._max_lag = max_lag
+        self._evicted = 0
 
     async def connect(self, ws: WebSocket) -> None:
         await ws.accept()
-        self._connections.append(ws)
-        logger.debug("WebSocket client connected (%d total)", len(self._connections))
+        client = _Client(ws, self._queue_size, self._max_lag)
+        client.start()
+        self._clients[ws] = client
+        logger.debug("WebSocket client connected (%d total)", len(self._clients))
 
     def disconnect(self, ws: WebSocket) -> None:
-        self._connections.remove(ws)
-        logger.debug("WebSocket client disconnected (%d total)", len(self._connections))
+        self._drop(ws)
+        logger.debug("WebSocket client disconnected (%d total)", len(self._clients))
+
+    def handle_message(self, ws: WebSocket, text: str) -> None:
+        try:
+            message = json.loads(text)
+        except json.JSONDecodeError:
+            return
+        if not isinstance(message, dict):
+            return
+        request_id = message.get("request_id")
+        if not isinstance(request_id, str):
+            return
+        if message.get("type") == "subscribe_sse":
+            self.subscribe_sse(ws, request_id)
+        elif message.get("type") == "unsubscribe_sse":
+            self.unsubscribe_sse(ws, request_id)
+
+    def subscribe_sse(self, ws: WebSocket, request_id: str) -> None:
+        client = self._clients.get(ws)
+        if client is not None and request_id not in client.subscriptions:
+            client.subscriptions.add(request_id)
+            self._sse_interest[request_id] += 1
+
+    def unsubscribe_sse(self, ws: WebSocket, request_id: str) -> None:
+        client = self._clients.get(ws)
+        if client is not None and request_id in client.subscriptions:
+            client.subscriptions.discard(request_id)
+            self._release_interest(request_id)
+
+    def wants_sse(self, request_id: str) -> bool:
+        return bool(self._sse_interest[ALL_STREAMS] or self._sse_interest[request_id])
 
     async def broadcast(self, message: dict[str, Any]) -> None:
-        payload = json.dumps(message)
-        stale: list[WebSocket] = []
-        for ws in self._connections:
-            try:
-                await ws.send_text(payload)
-            except Exception:
-                stale.append(ws)
-        for ws in stale:
-            self._connections.remove(ws)
+        key = None
+        if message.get("type") in _COALESCED_TYPES:
+            data = message.get("data")
+            if isinstance(data, dict):
+                key = data.get("id")
+        elif message.get("type") == _STATS_KEY:
+            key = _STATS_KEY
+        # Encoded once and shared by every client's queue.
+        self._enqueue(list(self._clients.values()), dumps_str(message), key)
 
     async def broadcast_sse_event(self, request_id: str, event: dict[str, Any]) -> None:
-        await self.broadcast({
-            "type": "sse_event",
-            "request_id": request_id,
-            "event": event,
-        })
+        await self.broadcast_sse_events(request_id, 0, [event])
+
+    async def broadcast_sse_events(
+        self,
+        request_id: str,
+        start_index: int,
+        events: list[dict[str, Any]],
+        dropped: int = 0,
+    ) -> None:
+        """Send a batch of live events to the stream's subscribers.
+
+        ``start_index`` is the position of the first event in the stream and
+        ``dropped`` how many events before it were skipped by rate limiting;
+        the full stream stays available from the REST API.
+        """
+        targets = [
+            client
+            for client in self._clients.values()
+            if request_id in client.subscriptions or ALL_STREAMS in client.subscriptions
+        ]
+        if not targets:
+            return
+        payload = dumps_str(
+            {
+                "type": "sse_events",
+                "request_id": request_id,
+                "start_index": start_index,
+                "dropped": dropped,
+                "events": events,
+            }
+        )
+        self._enqueue(targets, payload, None)
 
     @property
     def connection_count(self) -> int:
-        return len(self._connections)
+        return len(self._clients)
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "connections": len(self._clients),
+            "evicted": self._evicted,
+            "clients": [client.stats() for client in self._clients.values()],
+        }
+
+    def _enqueue(self, targets: list[_Client], payload: str, key: str | None) -> None:
+        for client in targets:
+            client.enqueue(payload, key)
+            if client.closed:
+                if client.evicted:
+                    self._evicted += 1
+                self._drop(client.ws)
+
+    def _drop(self, ws: WebSocket) -> None:
+        client = self._clients.pop(ws, None)
+        if client is None:
+            return
+        client.stop()
+        for request_id in client.subscriptions:
+            self._release_interest(request_id)
+
+    def _release_interest(self, request_id: str) -> None:
+        self._sse_interest[request_id] -= 1
+        if self._sse_interest[request_id] <= 0:
+            del self._sse_interest[request_id]
 
 
 hub = WebSocketHub()
@@ -4,6 +4,7 @@ import asyncio
 import logging
 import sys
 import threading
+from typing import TYPE_CHECKING
 
 import click
 import uvicorn
@@ -11,6 +12,11 @@ from rich.console import Console
 
 from agentprobe import __version__
 
+if TYPE_CHECKING:
+    from agentprobe.config import Config
+    from agentprobe.storage.database import Database
+    from agentprobe.storage.partitions import PartitionedDatabase
+
 console = Console()
 
 
@@ -24,13 +30,34 @@ def cli() -> None:
 @click.option("--web-port", default=9091, type=int, show_default=True)
 @click.option("--host", default="127.0.0.1", show_default=True)
 @click.option("--headless", is_flag=True, default=False)
-def start(proxy_port: int, web_port: int, host: str, headless: bool) -> None:
+@click.option(
+    "--capture-mode",
+    type=click.Choice(["incremental", "finalize"]),
+    default="incremental",
+    show_default=True,
+)
+@click.option("--journal", is_flag=True, default=False, help="Journal in-flight flows.")
+def start(
+    proxy_port: int,
+    web_port: int,
+    host: str,
+    headless: bool,
+    capture_mode: str,
+    journal: bool,
+) -> None:
     from agentprobe.api import create_app
-    from agentprobe.api.websocket import WebSocketHub, hub
+    from agentprobe.api.stats import StatsPublisher
+    from agentprobe.api.websocket import WebSocketHub
     from agentprobe.config import Config
+    from agentprobe.parser.detector import AgentMatcher
+    from agentprobe.parser.session import SessionTracker
     from agentprobe.proxy.addon import AgentProbeAddon
+    from agentprobe.proxy.bridge import LoopBridge
     from agentprobe.proxy.launcher import ProxyLauncher
-    from agentprobe.storage.database import Database
+    from agentprobe.storage.enrichment import EnrichmentWorker
+    from agentprobe.storage.journal import FlowJournal
+    from agentprobe.storage.retention import RetentionWorker
+    from agentprobe.storage.writer import CaptureWriter
 
     logging.basicConfig(
         level=logging.INFO,
@@ -43,39 +70,155 @@ def start(proxy_port: int, web_port: int, host: str, headless: bool) -> None:
         web_host="0.0.0.0",
         web_port=web_port,
         headless=headless,
+        capture_mode=capture_mode,
+        capture_journal=journal,
+    )
+    db = _build_database(config)
+    flow_journal = (
+        FlowJournal(config.journal_path)
+        if config.capture_journal and config.capture_mode == "finalize"
+        else None
+    )
+    writer = CaptureWriter(
+        db,
+        queue_size=config.write_queue_size,
+        batch_size=config.write_batch_size,
+        flush_interval=config.write_flush_interval,
+        overflow=config.write_overflow,
+        search_index=config.search_index,
+        on_commit=flow_journal.end if flow_journal is not None else None,
     )
-    db = Database()
-    ws_hub: WebSocketHub = hub
+    retention = RetentionWorker(
+        db,
+        max_requests=config.max_stored_requests,
+        max_age=config.retention_max_age,
+        max_bytes=config.retention_max_bytes,
+        interval=config.retention_interval,
+        batch_size=config.retention_batch_size,
+        idle_after=config.compaction_idle_after,
+    )
+    enrichment = (
+        EnrichmentWorker(
+            writer,
+            workers=config.enrichment_workers,
+            queue_size=config.enrichment_queue_size,
+        )
+        if config.enrichment
+        else None
+    )
+    ws_hub = WebSocketHub(queue_size=config.ws_queue_size, max_lag=config.ws_max_lag)
+    stats_publisher = StatsPublisher(db, ws_hub, interval=config.stats_push_interval)
+    bridge = LoopBridge()
 
-    addon = AgentProbeAddon(db=db, hub=ws_hub)
+    addon = AgentProbeAddon(
+        writer=writer,
+        hub=ws_hub,
+        bridge=bridge,
+        capture_mode=config.capture_mode,
+        journal=flow_journal,
+        sse_push_interval=config.sse_push_interval,
+        sse_push_max_events=config.sse_push_max_events,
+        enrichment=enrichment,
+        stall_threshold=config.stall_threshold,
+        sessions=SessionTracker(window=config.session_window),
+        agents=AgentMatcher(config.agent_signatures, config.agent_cache_size),
+        parse_limit=config.parse_limit,
+    )
     launcher = ProxyLauncher(config=config, addon=addon)
-    app = create_app(config=config, db=db)
+    app = create_app(
+        config=config,
+        db=db,
+        writer=writer,
+        bridge=bridge,
+        hub=ws_hub,
+        retention=retention,
+        enrichment=enrichment,
+    )
 
     console.print(f"[bold green]AgentProbe v{__version__}[/]")
     console.print(f"  Proxy  → [cyan]http://{host}:{proxy_port}[/]")
     console.print(f"  Web UI → [cyan]http://0.0.0.0:{web_port}[/]")
 
-    async def _run() -> None:
-        await db.init(config.db_path)
-        uv_config = uvicorn.Config(
-            app,
-            host="0.0.0.0",
-            port=web_port,
-            log_level="warning",
-        )
-        server = uvicorn.Server(uv_config)
-        web_thread = threading.Thread(target=server.run, daemon=True)
-        web_thread.start()
-        try:
-            await launcher.start()
-        finally:
-            server.should_exit = True
-            await db.close()
+    # Storage is opened and closed on the web loop, which owns it; the proxy
+    # loop only ever reaches it through the bridge.
+    async def _open_storage() -> None:
+        await _init_database(db, config)
+        writer.start()
+        if enrichment is not None:
+            enrichment.start()
+        last_sequence = await db.max_sequence()
+        if flow_journal is not None:
+            # Recovered flows are ended like live ones, once their rows commit.
+            partials = flow_journal.recover()
+            flow_journal.open()
+            for partial in partials:
+                await writer.save_request(partial)
+                last_sequence = max(last_sequence, partial.sequence)
+        addon.resume_sequence(last_sequence)
+        retention.start()
+        stats_publisher.start()
+
+    async def _close_storage() -> None:
+        await stats_publisher.close()
+        await retention.close()
+        if enrichment is not None:
+            await enrichment.close()
+        await writer.close()
+        if flow_journal is not None:
+            flow_journal.close()
+        await db.close()
+
+    uv_config = uvicorn.Config(
+        app,
+        host="0.0.0.0",
+        port=web_port,
+        log_level="warning",
+    )
+    server = uvicorn.Server(uv_config)
+    web_thread = threading.Thread(target=server.run, daemon=True)
+    web_thread.start()
+    while not bridge.wait_ready(timeout=0.1):
+        if not web_thread.is_alive():
+            click.echo("web server failed to start", err=True)
+            sys.exit(1)
+    bridge.run(_open_storage())
 
     try:
-        asyncio.run(_run())
+        asyncio.run(launcher.start())
     except KeyboardInterrupt:
         console.print("\n[yellow]shutting down…[/]")
+    finally:
+        bridge.run(_close_storage(), timeout=30)
+        server.should_exit = True
+        web_thread.join(timeout=5)
+
+
+@cli.command()
+@click.option("--all", "everything", is_flag=True, default=False, help="Re-parse every request.")
+def backfill(everything: bool) -> None:
+    """Parse stored requests into the model, token and tool call columns."""
+    from agentprobe.config import Config
+    from agentprobe.storage.enrichment import EnrichmentWorker
+    from agentprobe.storage.writer import CaptureWriter
+
+    config = Config()
+    db = _build_database(config)
+
+    async def _backfill() -> int:
+        await _init_database(db, config)
+        writer = CaptureWriter(db, search_index=False)
+        enrichment = EnrichmentWorker(writer, workers=config.enrichment_workers)
+        writer.start()
+        enrichment.start()
+        try:
+            return await enrichment.backfill(db, everything=everything)
+        finally:
+            await enrichment.close()
+            await writer.close()
+            await db.close()
+
+    count = asyncio.run(_backfill())
+    console.print(f"[green]✓[/] enriched {count} requests")
 
 
 @cli.command()
@@ -120,3 +263,38 @@ def env() -> None:
 @cli.command()
 def version() -> None:
     console.print(f"agentprobe {__version__}")
+
+
+def _build_database(config: Config) -> Database | PartitionedDatabase:
+    from agentprobe.storage.blobs import BlobStore
+    from agentprobe.storage.database import Database
+    from agentprobe.storage.partitions import PartitionedDatabase
+
+    storage_options = dict(
+        sse_storage=config.sse_storage,
+        blobs=BlobStore(config.blob_dir, compress=config.blob_compression),
+        blob_threshold=config.max_body_size,
+        body_storage=config.body_storage,
+        keyframe_interval=config.delta_keyframe_interval,
+        compression=config.column_compression,
+        rollup_retention={
+            "minute": config.rollup_minute_retention,
+            "hour": config.rollup_hour_retention,
+        },
+    )
+    if config.partition_by == "none":
+        return Database(**storage_options)
+    return PartitionedDatabase(
+        partition_by=config.partition_by,
+        partition_rows=config.partition_rows,
+        **storage_options,
+    )
+
+
+async def _init_database(db: Database | PartitionedDatabase, config: Config) -> None:
+    from agentprobe.storage.partitions import PartitionedDatabase
+
+    if isinstance(db, PartitionedDatabase):
+        await db.init(config.partition_dir)
+    else:
+        await db.init(config.db_path)
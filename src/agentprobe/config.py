@@ -2,6 +2,7 @@
 
 from __future__ import annotations
 
+import json
 import os
 from dataclasses import dataclass, field
 from pathlib import Path
@@ -22,24 +23,93 @@ class Config:
     # Storage
     data_dir: Path = field(default_factory=lambda: Path.home() / ".agentprobe")
     db_path: Path = field(default=None)  # type: ignore[assignment]
+    # "inline" keeps streams in requests and sse_events; "rows" only in sse_events,
+    # and switching an existing database to it drops its inline copies for good
+    sse_storage: str = "inline"
+    blob_compression: bool = False  # zstd-compress blob files (needs agentprobe[zstd])
+    body_storage: str = "full"  # opt in with "delta" to store prompts as deltas on earlier turns
+    delta_keyframe_interval: int = 32  # every Nth turn of a conversation is stored in full
+    # Opt in with "zstd" (zlib without agentprobe[zstd]) or "zlib"
+    column_compression: str = "none"
+    partition_by: str = "none"  # "day" or "rows" splits captures into one SQLite file per partition
+    partition_rows: int = 100_000  # requests per partition with partition_by="rows"
+
+    # Capture writer
+    capture_mode: str = "incremental"  # "finalize" writes each flow once when it completes
+    capture_journal: bool = False  # journal in-flight flows in finalize mode for crash recovery
+    write_queue_size: int = 10000
+    write_batch_size: int = 500
+    write_flush_interval: float = 0.05  # seconds a flush window stays open
+    write_overflow: str = "block"  # "block" applies backpressure, "drop" discards and counts
+    search_index: bool = True  # index prompt/tool/response text for /api/requests?q=
+    enrichment: bool = True  # parse finished flows for model, tokens, tool calls, stop reason
+    enrichment_workers: int = 2  # parser threads
+    enrichment_queue_size: int = 10000  # finished flows waiting; more are skipped until backfill
+
+    # WebSocket clients
+    ws_queue_size: int = 1000  # outbound messages buffered per client before dropping the oldest
+    ws_max_lag: float = 10.0  # seconds a client may fall behind before it is disconnected
+    stats_push_interval: float = 1.0  # seconds between stats_update pushes while captures change
+
+    # Live SSE push
+    sse_push_interval: float = 0.1  # seconds between pushes per stream
+    sse_push_max_events: int = 200  # newest events kept when a push would exceed this
+    stall_threshold: float = 2.0  # seconds between two outputs of a stream that count as a stall
+
+    # Sessions
+    session_window: float = 1800.0  # seconds without requests that end a session
+
+    # Agent detection
+    # Extra agent name -> User-Agent/x-client-name/x-app regexes, checked before
+    # the built-in ones; read from data_dir/agents.json when not given.
+    agent_signatures: dict[str, list[str]] = field(default_factory=dict)
+    agent_cache_size: int = 1024  # header signatures whose detected agent is cached
 
     # mitmproxy CA
     mitmproxy_dir: Path = field(default_factory=lambda: Path.home() / ".mitmproxy")
 
     # Behavior
     headless: bool = False
-    max_body_size: int = 10 * 1024 * 1024  # 10MB — bodies larger than this stored as file refs
-    max_requests_in_memory: int = 10000
+    max_body_size: int = 64 * 1024  # bodies larger than this (bytes) go to the blob store
+    parse_limit: int = 64 * 1024  # request bodies larger than this are parsed by enrichment only
+
+    # Retention (request limits are off by default: captures are kept until deleted)
+    max_stored_requests: int | None = None  # requests kept on disk; older ones are pruned
+    retention_max_age: float | None = None  # seconds a request is kept
+    retention_max_bytes: int | None = None  # captured request + response bytes kept
+    retention_interval: float = 30.0  # seconds between retention passes
+    retention_batch_size: int = 200  # requests deleted per transaction
+    rollup_minute_retention: float = 2 * 86400  # seconds per-minute timeseries rollups are kept
+    rollup_hour_retention: float = 90 * 86400  # seconds per-hour rollups are kept (days: forever)
+    compaction_idle_after: float = 5.0  # seconds without writes before space is reclaimed
 
     def __post_init__(self) -> None:
         if self.db_path is None:
             self.db_path = self.data_dir / "agentprobe.db"
         self.data_dir.mkdir(parents=True, exist_ok=True)
+        if not self.agent_signatures and self.agents_path.exists():
+            self.agent_signatures = json.loads(self.agents_path.read_text())
+
+    @property
+    def agents_path(self) -> Path:
+        return self.data_dir / "agents.json"
 
     @property
     def ca_cert_path(self) -> Path:
         return self.mitmproxy_dir / "mitmproxy-ca-cert.pem"
 
+    @property
+    def journal_path(self) -> Path:
+        return self.data_dir / "inflight.journal"
+
+    @property
+    def blob_dir(self) -> Path:
+        return self.data_dir / "blobs"
+
+    @property
+    def partition_dir(self) -> Path:
+        return self.data_dir / "partitions"
+
     @property
     def static_dir(self) -> Path:
         """Path to built frontend static files."""
@@ -1,13 +1,18 @@
 from __future__ import annotations
 
+_PROMPT_USAGE_KEYS = (
+    ("input_tokens", "input_tokens"),
+    ("cache_read_input_tokens", "cache_read_tokens"),
+    ("cache_creation_input_tokens", "cache_creation_tokens"),
+)
+
 
 def parse_anthropic_request(body: dict) -> dict:
     messages = body.get("messages", [])
     system_parts = body.get("system", "")
     if isinstance(system_parts, list):
         system_text = " ".join(
-            p.get("text", "") if isinstance(p, dict) else str(p)
-            for p in system_parts
+            p.get("text", "") if isinstance(p, dict) else str(p) for p in system_parts
         )
     else:
         system_text = str(system_parts) if system_parts else ""
@@ -44,11 +49,13 @@ def parse_anthropic_response(body: dict) -> dict:
         if block_type == "text":
             text_parts.append(block.get("text", ""))
         elif block_type == "tool_use":
-            tool_calls.append({
-                "id": block.get("id", ""),
-                "name": block.get("name", ""),
-                "input": block.get("input", {}),
-            })
+            tool_calls.append(
+                {
+                    "id": block.get("id", ""),
+                    "name": block.get("name", ""),
+                    "input": block.get("input", {}),
+                }
+            )
 
     usage = body.get("usage", {})
 
@@ -78,6 +85,8 @@ def parse_anthropic_sse_event(event_type: str, data: dict) -> dict:
         result["role"] = message.get("role", "")
         usage = message.get("usage", {})
         result["input_tokens"] = usage.get("input_tokens", 0)
+        result["cache_read_tokens"] = usage.get("cache_read_input_tokens", 0)
+        result["cache_creation_tokens"] = usage.get("cache_creation_input_tokens", 0)
 
     elif event_type == "content_block_start":
         block = data.get("content_block", {})
@@ -106,6 +115,10 @@ def parse_anthropic_sse_event(event_type: str, data: dict) -> dict:
         result["stop_reason"] = delta.get("stop_reason", "")
         usage = data.get("usage", {})
         result["output_tokens"] = usage.get("output_tokens", 0)
+        # Cumulative prompt counts, when the API repeats them at the end.
+        for key, name in _PROMPT_USAGE_KEYS:
+            if usage.get(key) is not None:
+                result[name] = usage[key]
 
     elif event_type == "message_stop":
         pass
@@ -143,11 +156,13 @@ def _summarize_messages(messages: list) -> list[dict]:
                         for sub in block.get("content", []):
                             if isinstance(sub, dict) and sub.get("type") == "text":
                                 total_len += len(sub.get("text", ""))
-            summary.append({
-                "role": role,
-                "block_types": block_types,
-                "length": total_len,
-            })
+            summary.append(
+                {
+                    "role": role,
+                    "block_types": block_types,
+                    "length": total_len,
+                }
+            )
     return summary
 
 
@@ -1,30 +1,123 @@
+from __future__ import annotations
+
+import functools
+import json
 import re
+from collections.abc import Mapping, Sequence
+from typing import Any
 
-_AGENT_PATTERNS: dict[str, list[re.Pattern[str]]] = {
-    "claude_code": [
-        re.compile(r"claude[-_]?code", re.IGNORECASE),
-        re.compile(r"claude[-_]?cli", re.IGNORECASE),
-        re.compile(r"anthropic[-_]?cli", re.IGNORECASE),
-    ],
-    "opencode": [
-        re.compile(r"opencode", re.IGNORECASE),
-        re.compile(r"open[-_]?code", re.IGNORECASE),
-    ],
-    "cline": [
-        re.compile(r"cline", re.IGNORECASE),
-        re.compile(r"vscode.*cline", re.IGNORECASE),
-    ],
-    "codex": [
-        re.compile(r"codex", re.IGNORECASE),
-        re.compile(r"vscode.*codex", re.IGNORECASE),
-        re.compile(r"openai[-_]?codex", re.IGNORECASE),
-    ],
-    "gemini": [
-        re.compile(r"gemini[-_]?cli", re.IGNORECASE),
-        re.compile(r"google[-_]?gemini", re.IGNORECASE),
-    ],
+# Built-in agent signatures, searched for in the User-Agent, x-client-name
+# and x-app headers. When several agents match, the one listed first wins.
+_AGENT_SIGNATURES: dict[str, list[str]] = {
+    "claude_code": [r"claude[-_]?code", r"claude[-_]?cli", r"anthropic[-_]?cli"],
+    "opencode": [r"opencode", r"open[-_]?code"],
+    "cline": [r"cline", r"vscode.*cline"],
+    "codex": [r"codex", r"vscode.*codex", r"openai[-_]?codex"],
+    "gemini": [r"gemini[-_]?cli", r"google[-_]?gemini"],
 }
 
+# x-app values of Claude Code requests, which carry Anthropic headers.
+_CLAUDE_CODE_X_APPS = {"cli", "claude-code"}
+
+DEFAULT_AGENT_CACHE_SIZE = 1024
+
+
+class AgentMatcher:
+    """Agent detection with every signature compiled into one regex.
+
+    Each signature is an alternative of a single pattern, in a group that
+    maps back to its agent, so the header text is scanned once however
+    many agents are known. The alternatives sit in a lookahead, so a match
+    consumes nothing and every start position is tried: a greedy signature
+    such as ``vscode.*cline`` cannot swallow an earlier agent's token.
+    ``signatures`` (agent name -> regexes, e.g. from
+    ``Config.agent_signatures``) come before the built-in ones and win when
+    both match.
+
+    Agents send the same few headers on every call, so results are kept in
+    an LRU cache of ``cache_size`` entries keyed by the headers read.
+    """
+
+    def __init__(
+        self,
+        signatures: Mapping[str, Sequence[str]] | None = None,
+        cache_size: int = DEFAULT_AGENT_CACHE_SIZE,
+    ) -> None:
+        # Group index of each alternative -> (priority, agent); a lower priority wins.
+        self._groups: dict[int, tuple[int, str]] = {}
+        alternatives = []
+        index = 1
+        for priority, (agent, patterns) in enumerate(
+            [*(signatures or {}).items(), *_AGENT_SIGNATURES.items()]
+        ):
+            for pattern in patterns:
+                compiled = _compile_signature(agent, pattern)
+                self._groups[index] = (priority, agent)
+                alternatives.append(f"({pattern})")
+                index += 1 + compiled.groups
+        try:
+            self._pattern = re.compile(f"(?=(?:{'|'.join(alternatives)}))", re.IGNORECASE)
+        except re.error as exc:
+            raise ValueError(f"invalid agent signatures: {exc}") from None
+        self._lookup = functools.lru_cache(maxsize=cache_size)(self._match)
+
+    def detect(self, headers: Mapping | None, user_agent: str | None = None) -> str:
+        ua = x_client = x_app = ""
+        has_anthropic_headers = False
+        if isinstance(headers, Mapping):
+            for key, value in headers.items():
+                name = str(key).lower()
+                if name == "user-agent":
+                    ua = str(value)
+                elif name == "x-client-name":
+                    x_client = str(value)
+                elif name == "x-app":
+                    x_app = str(value)
+                elif name == "anthropic-version" or name == "anthropic-beta":
+                    has_anthropic_headers = True
+        if user_agent:
+            ua = str(user_agent)
+        return self._lookup(ua, x_client, x_app, has_anthropic_headers)
+
+    def cache_info(self) -> functools._CacheInfo:
+        return self._lookup.cache_info()
+
+    def _match(self, ua: str, x_client: str, x_app: str, has_anthropic_headers: bool) -> str:
+        best: tuple[int, str] | None = None
+        for match in self._pattern.finditer(f"{ua} {x_client} {x_app}"):
+            found = self._groups[match.lastindex]  # type: ignore[index]
+            if best is None or found < best:
+                best = found
+        if best is not None:
+            return best[1]
+        if has_anthropic_headers and x_app.lower() in _CLAUDE_CODE_X_APPS:
+            return "claude_code"
+        return "unknown"
+
+
+_NO_FLAGS = re.compile("").flags
+# A backslash, itself unescaped, followed by a group number.
+_BACKREFERENCE_RE = re.compile(r"(?<!\\)(?:\\\\)*\\[1-9]")
+
+
+def _compile_signature(agent: str, pattern: str) -> re.Pattern[str]:
+    """Check that ``pattern`` means the same once joined with the other signatures."""
+    try:
+        compiled = re.compile(pattern)
+    except re.error as exc:
+        raise ValueError(f"invalid signature for agent {agent!r}: {exc}") from None
+    if compiled.flags != _NO_FLAGS:
+        raise ValueError(
+            f"invalid signature for agent {agent!r}: global flags such as (?i) are not"
+            " supported; signatures always ignore case"
+        )
+    if _BACKREFERENCE_RE.search(pattern) or "(?P=" in pattern:
+        raise ValueError(f"invalid signature for agent {agent!r}: backreferences are not supported")
+    return compiled
+
+
+_default_agents = AgentMatcher()
+
 _ANTHROPIC_HOSTS = {"api.anthropic.com"}
 _OPENAI_HOSTS = {"api.openai.com"}
 _GOOGLE_HOSTS = {"generativelanguage.googleapis.com"}
@@ -33,6 +126,7 @@ _ANTHROPIC_PATH_RE = re.compile(r"^/v1/messages")
 _OPENAI_CHAT_PATH_RE = re.compile(r"^/v1/chat/completions")
 _OPENAI_RESPONSES_PATH_RE = re.compile(r"^/v1/responses")
 _GOOGLE_PATH_RE = re.compile(r"^/v1beta/models/.+:(generateContent|streamGenerateContent)")
+_GOOGLE_MODEL_RE = re.compile(r"/models/([^/:]+):")
 _MCP_METHODS = {
     "initialize",
     "initialized",
@@ -50,32 +144,8 @@ _MCP_METHODS = {
 
 
 def detect_agent(headers: dict | None, user_agent: str | None = None) -> str:
-    normalized_headers = (
-        {str(key).lower(): str(value) for key, value in headers.items()}
-        if isinstance(headers, dict)
-        else {}
-    )
-
-    ua = str(user_agent) if user_agent else normalized_headers.get("user-agent", "")
-    x_client = normalized_headers.get("x-client-name", "")
-    x_app = normalized_headers.get("x-app", "")
-
-    combined = f"{ua} {x_client} {x_app}"
-    for agent_name, patterns in _AGENT_PATTERNS.items():
-        for pattern in patterns:
-            if pattern.search(combined):
-                return agent_name
-
-    has_anthropic_headers = (
-        "anthropic-version" in normalized_headers or "anthropic-beta" in normalized_headers
-    )
-    if has_anthropic_headers:
-        if any(p.search(combined) for p in _AGENT_PATTERNS["claude_code"]):
-            return "claude_code"
-        if x_app.lower() in {"cli", "claude-code"}:
-            return "claude_code"
-
-    return "unknown"
+    """The agent that sent a request, by the built-in signatures; see :class:`AgentMatcher`."""
+    return _default_agents.detect(headers, user_agent)
 
 
 def detect_protocol(
@@ -115,6 +185,60 @@ def detect_protocol(
     return ("unknown", None)
 
 
+# Characters of a request body read by peek_json.
+PEEK_CHARS = 4096
+
+_WHITESPACE_RE = re.compile(r"[ \t\n\r]*")
+_decoder = json.JSONDecoder()
+
+
+def peek_json(text: str, limit: int = PEEK_CHARS) -> dict[str, Any] | None:
+    """Top-level members of a JSON object, read from its first ``limit`` characters.
+
+    Enough for :func:`detect_protocol` and :func:`detect_model` without
+    decoding a body of megabytes: members are decoded in order until one
+    runs past the prefix, which is kept with the value ``None`` so its key
+    is still known, and the rest are not looked at. ``None`` when the text
+    does not start like an object.
+    """
+    head = text[:limit]
+    pos = _WHITESPACE_RE.match(head).end()  # type: ignore[union-attr]
+    if head[pos : pos + 1] != "{":
+        return None
+    members: dict[str, Any] = {}
+    pos += 1
+    while True:
+        pos = _WHITESPACE_RE.match(head, pos).end()  # type: ignore[union-attr]
+        try:
+            key, pos = _decoder.raw_decode(head, pos)
+        except json.JSONDecodeError:
+            break
+        pos = _WHITESPACE_RE.match(head, pos).end()  # type: ignore[union-attr]
+        if not isinstance(key, str) or head[pos : pos + 1] != ":":
+            break
+        pos = _WHITESPACE_RE.match(head, pos + 1).end()  # type: ignore[union-attr]
+        try:
+            members[key], pos = _decoder.raw_decode(head, pos)
+        except json.JSONDecodeError:
+            members[key] = None
+            break
+        pos = _WHITESPACE_RE.match(head, pos).end()  # type: ignore[union-attr]
+        if head[pos : pos + 1] != ",":
+            break
+        pos += 1
+    return members
+
+
+def detect_model(path: str, request_body: dict | None) -> str | None:
+    """Model named in an LLM request: the body's ``model``, or the Google path segment."""
+    if isinstance(request_body, dict):
+        model = request_body.get("model")
+        if isinstance(model, str) and model:
+            return model
+    match = _GOOGLE_MODEL_RE.search(path.split("?", 1)[0])
+    return match.group(1) if match else None
+
+
 def is_sse_response(content_type: str | None) -> bool:
     if not content_type:
         return False
@@ -124,8 +248,8 @@ def is_sse_response(content_type: str | None) -> bool:
 
 def _is_mcp_message(body: dict) -> bool:
     if body.get("jsonrpc") == "2.0":
-        method = body.get("method", "")
-        if method in _MCP_METHODS or "/" in method:
+        method = body.get("method")
+        if isinstance(method, str) and (method in _MCP_METHODS or "/" in method):
             return True
         if "id" in body and ("result" in body or "error" in body):
             return True
@@ -0,0 +1,187 @@
+"""Typed columns pulled out of finished LLM and MCP flows by the protocol parsers.
+
+:func:`enrich_flow` runs the parser for a flow's ``protocol_type`` over its
+response body, or takes the reassembled message of a streamed response, and
+returns the values it found for :data:`ENRICHED_COLUMNS`. Token counts are as the
+provider reports them: Anthropic counts cached prompt tokens apart from
+``input_tokens``, OpenAI and Google include them.
+
+:func:`enrich_request` finishes what the proxy hook leaves undone for request
+bodies too large to parse there: the protocol, model and conversation.
+"""
+
+from __future__ import annotations
+
+from collections.abc import Callable, Iterable
+from typing import Any
+
+from agentprobe.parser.anthropic import parse_anthropic_response
+from agentprobe.parser.detector import detect_model, detect_protocol
+from agentprobe.parser.google import parse_google_response
+from agentprobe.parser.mcp import parse_mcp_message
+from agentprobe.parser.openai import parse_openai_response, parse_openai_responses_response
+from agentprobe.parser.reassembly import reassemble
+from agentprobe.parser.session import conversation_fingerprint, conversation_id
+from agentprobe.serialization import loads
+
+ENRICHED_COLUMNS = (
+    "model",
+    "input_tokens",
+    "output_tokens",
+    "cache_read_tokens",
+    "cache_creation_tokens",
+    "tool_call_count",
+    "stop_reason",
+    "mcp_method",
+)
+
+
+def enrich_flow(
+    protocol_type: str,
+    request_body: str | None,
+    response_body: str | None,
+    sse_data: Iterable[str | None] = (),
+    message: dict[str, Any] | None = None,
+) -> dict[str, Any]:
+    """Column values found in one flow; columns with nothing to report are left out.
+
+    ``message`` is the response already reassembled from the stream (see
+    :mod:`agentprobe.parser.reassembly`); without it a stream is
+    reassembled from ``sse_data`` here.
+    """
+    if protocol_type == "mcp":
+        request = _json(request_body)
+        method = parse_mcp_message(request).get("method") if request is not None else None
+        return {"mcp_method": method} if isinstance(method, str) and method else {}
+    if protocol_type not in _COLUMNS:
+        return {}
+    if message is None:
+        sse_data = list(sse_data)
+        if sse_data:
+            message = reassemble(protocol_type, sse_data)
+        else:
+            body = _json(response_body)
+            message = _parse_body(protocol_type, body) if body is not None else None
+    if message is None:
+        return {}
+    return message_columns(protocol_type, message)
+
+
+def enrich_request(
+    protocol_type: str,
+    host: str,
+    request_body: str | None,
+    session_id: str | None = None,
+    conversation: str | None = None,
+) -> dict[str, Any]:
+    """Columns of a request that only its whole body tells.
+
+    The proxy hook detects the protocol and model of large bodies from the
+    host, path and first few KB (see :func:`~agentprobe.parser.detector.peek_json`)
+    and leaves them without a conversation. Such requests, those with an
+    ``unknown`` protocol or no ``conversation``, are parsed here; the rest
+    return nothing. A model named by the response takes precedence over
+    the one found here.
+    """
+    if protocol_type != "unknown" and conversation is not None:
+        return {}
+    body = _json(request_body)
+    if body is None:
+        return {}
+    fields: dict[str, Any] = {}
+    if protocol_type == "unknown":
+        detected, provider = detect_protocol(host, "", body)
+        if detected != "unknown":
+            protocol_type = fields["protocol_type"] = detected
+            fields["api_provider"] = provider
+    model = detect_model("", body)
+    if model is not None:
+        fields["model"] = model
+    if session_id is not None and conversation is None:
+        fingerprint = conversation_fingerprint(protocol_type, body)
+        if fingerprint is not None:
+            fields["conversation_id"] = conversation_id(session_id, fingerprint)
+    return fields
+
+
+def message_columns(protocol_type: str, message: dict[str, Any]) -> dict[str, Any]:
+    """The columns found in a parsed LLM response of ``protocol_type``."""
+    columns = _COLUMNS.get(protocol_type)
+    if columns is None:
+        return {}
+    fields = columns(message)
+    return {name: value for name, value in fields.items() if value is not None and value != ""}
+
+
+def _parse_body(protocol_type: str, body: dict) -> dict[str, Any] | None:
+    # Error bodies and other JSON that is not a finished response count as nothing.
+    if protocol_type == "anthropic":
+        return parse_anthropic_response(body) if body.get("type") == "message" else None
+    if protocol_type == "google":
+        return parse_google_response(body) if "candidates" in body else None
+    if body.get("object") == "response":
+        return parse_openai_responses_response(body)
+    if body.get("object") == "chat.completion":
+        return parse_openai_response(body)
+    return None
+
+
+def _anthropic(message: dict[str, Any]) -> dict[str, Any]:
+    return {
+        "model": message["model"],
+        "input_tokens": message["input_tokens"],
+        "output_tokens": message["output_tokens"],
+        "cache_read_tokens": message["cache_read_tokens"],
+        "cache_creation_tokens": message["cache_creation_tokens"],
+        "tool_call_count": message["tool_call_count"],
+        "stop_reason": message["stop_reason"],
+    }
+
+
+def _openai(message: dict[str, Any]) -> dict[str, Any]:
+    if "finish_reason" in message:
+        return {
+            "model": message["model"],
+            "input_tokens": message["prompt_tokens"],
+            "output_tokens": message["completion_tokens"],
+            "cache_read_tokens": message["cached_tokens"],
+            "tool_call_count": message["tool_call_count"],
+            "stop_reason": message["finish_reason"],
+        }
+    # Responses API
+    return {
+        "model": message["model"],
+        "input_tokens": message["input_tokens"],
+        "output_tokens": message["output_tokens"],
+        "cache_read_tokens": message["cached_tokens"],
+        "tool_call_count": message["tool_call_count"],
+        "stop_reason": message["incomplete_reason"] or message["status"],
+    }
+
+
+def _google(message: dict[str, Any]) -> dict[str, Any]:
+    return {
+        "model": message["model_version"],
+        "input_tokens": message["prompt_token_count"],
+        "output_tokens": message["candidates_token_count"],
+        "cache_read_tokens": message["cached_content_token_count"],
+        "tool_call_count": message["function_call_count"],
+        "stop_reason": message["finish_reason"],
+    }
+
+
+_COLUMNS: dict[str, Callable[[dict[str, Any]], dict[str, Any]]] = {
+    "anthropic": _anthropic,
+    "openai": _openai,
+    "google": _google,
+}
+
+
+def _json(text: str | None) -> dict | None:
+    if not text:
+        return None
+    try:
+        value = loads(text)
+    except ValueError:
+        return None
+    return value if isinstance(value, dict) else None
@@ -44,10 +44,12 @@ def parse_google_response(body: dict) -> dict:
             text_parts.append(part["text"])
         if "functionCall" in part:
             fc = part["functionCall"]
-            function_calls.append({
-                "name": fc.get("name", ""),
-                "args": fc.get("args", {}),
-            })
+            function_calls.append(
+                {
+                    "name": fc.get("name", ""),
+                    "args": fc.get("args", {}),
+                }
+            )
 
     usage = body.get("usageMetadata", {})
 
@@ -61,7 +63,9 @@ def parse_google_response(body: dict) -> dict:
         "prompt_token_count": usage.get("promptTokenCount", 0),
         "candidates_token_count": usage.get("candidatesTokenCount", 0),
         "total_token_count": usage.get("totalTokenCount", 0),
+        "cached_content_token_count": usage.get("cachedContentTokenCount", 0),
         "candidate_count": len(candidates),
+        "model_version": body.get("modelVersion", ""),
     }
 
 
@@ -86,10 +90,12 @@ def parse_google_sse_event(data: dict) -> dict:
             text_parts.append(part["text"])
         if "functionCall" in part:
             fc = part["functionCall"]
-            function_calls.append({
-                "name": fc.get("name", ""),
-                "args": fc.get("args", {}),
-            })
+            function_calls.append(
+                {
+                    "name": fc.get("name", ""),
+                    "args": fc.get("args", {}),
+                }
+            )
 
     if text_parts:
         result["text"] = "".join(text_parts)
@@ -107,6 +113,10 @@ def parse_google_sse_event(data: dict) -> dict:
         result["prompt_token_count"] = usage.get("promptTokenCount", 0)
         result["candidates_token_count"] = usage.get("candidatesTokenCount", 0)
         result["total_token_count"] = usage.get("totalTokenCount", 0)
+        result["cached_content_token_count"] = usage.get("cachedContentTokenCount", 0)
+
+    if data.get("modelVersion"):
+        result["model_version"] = data["modelVersion"]
 
     return result
 
@@ -126,10 +136,12 @@ def _extract_tool_declarations(tools: list) -> list[dict]:
             continue
         for decl in tool_group.get("functionDeclarations", []):
             if isinstance(decl, dict):
-                decls.append({
-                    "name": decl.get("name", ""),
-                    "description": decl.get("description", ""),
-                })
+                decls.append(
+                    {
+                        "name": decl.get("name", ""),
+                        "description": decl.get("description", ""),
+                    }
+                )
     return decls
 
 
@@ -154,11 +166,13 @@ def _summarize_contents(contents: list) -> list[dict]:
                 part_types.append("functionResponse")
             elif "inlineData" in part:
                 part_types.append("inlineData")
-        summary.append({
-            "role": role,
-            "part_types": part_types,
-            "text_length": text_len,
-        })
+        summary.append(
+            {
+                "role": role,
+                "part_types": part_types,
+                "text_length": text_len,
+            }
+        )
     return summary
 
 
@@ -4,18 +4,14 @@ from __future__ import annotations
 def parse_openai_request(body: dict) -> dict:
     messages = body.get("messages", [])
     tools = body.get("tools", [])
-    tool_names = [
-        t.get("function", {}).get("name", "")
-        for t in tools
-        if isinstance(t, dict)
-    ]
+    tool_names = [t.get("function", {}).get("name", "") for t in tools if isinstance(t, dict)]
 
     system_msgs = [
-        m for m in messages
-        if isinstance(m, dict) and m.get("role") in ("system", "developer")
+        m for m in messages if isinstance(m, dict) and m.get("role") in ("system", "developer")
     ]
     system_length = sum(
-        len(m.get("content", "")) if isinstance(m.get("content"), str)
+        len(m.get("content", ""))
+        if isinstance(m.get("content"), str)
         else sum(
             len(p.get("text", ""))
             for p in (m.get("content") or [])
@@ -78,6 +74,45 @@ def parse_openai_response(body: dict) -> dict:
     }
 
 
+def parse_openai_responses_response(body: dict) -> dict:
+    output = body.get("output", [])
+    text_parts: list[str] = []
+    tool_calls: list[dict] = []
+
+    for item in output:
+        if not isinstance(item, dict):
+            continue
+        if item.get("type") == "message":
+            for part in item.get("content", []):
+                if isinstance(part, dict) and part.get("type") == "output_text":
+                    text_parts.append(part.get("text", ""))
+        elif item.get("type") == "function_call":
+            tool_calls.append(
+                {
+                    "id": item.get("call_id", ""),
+                    "name": item.get("name", ""),
+                    "arguments": item.get("arguments", ""),
+                }
+            )
+
+    usage = body.get("usage") or {}
+    incomplete = body.get("incomplete_details") or {}
+
+    return {
+        "id": body.get("id", ""),
+        "model": body.get("model", ""),
+        "status": body.get("status", ""),
+        "incomplete_reason": incomplete.get("reason", ""),
+        "text": "\n".join(text_parts),
+        "text_length": sum(len(t) for t in text_parts),
+        "tool_calls": tool_calls,
+        "tool_call_count": len(tool_calls),
+        "input_tokens": usage.get("input_tokens", 0),
+        "output_tokens": usage.get("output_tokens", 0),
+        "cached_tokens": (usage.get("input_tokens_details") or {}).get("cached_tokens", 0),
+    }
+
+
 def parse_openai_sse_event(data: dict) -> dict:
     if not data:
         return {"event_type": "empty"}
@@ -131,6 +166,8 @@ def _parse_chat_chunk(data: dict) -> dict:
     if usage:
         result["prompt_tokens"] = usage.get("prompt_tokens", 0)
         result["completion_tokens"] = usage.get("completion_tokens", 0)
+        details = usage.get("prompt_tokens_details") or {}
+        result["cached_tokens"] = details.get("cached_tokens", 0)
 
     return result
 
@@ -167,9 +204,11 @@ def _parse_responses_event(data: dict) -> dict:
         resp = data.get("response", {})
         usage = resp.get("usage", {})
         result["id"] = resp.get("id", "")
+        result["model"] = resp.get("model", "")
         result["status"] = resp.get("status", "")
         result["input_tokens"] = usage.get("input_tokens", 0)
         result["output_tokens"] = usage.get("output_tokens", 0)
+        result["cached_tokens"] = (usage.get("input_tokens_details") or {}).get("cached_tokens", 0)
 
     return result
 
@@ -183,7 +222,9 @@ def _summarize_messages(messages: list) -> list[dict]:
         content = msg.get("content")
         if content is None:
             has_tc = bool(msg.get("tool_calls"))
-            summary.append({"role": role, "type": "tool_call_only" if has_tc else "empty", "length": 0})
+            summary.append(
+                {"role": role, "type": "tool_call_only" if has_tc else "empty", "length": 0}
+            )
         elif isinstance(content, str):
             summary.append({"role": role, "type": "text", "length": len(content)})
         elif isinstance(content, list):
@@ -0,0 +1,348 @@
+"""Incremental reassembly of streamed LLM responses into their final message.
+
+A reassembler is fed the events of one stream as :class:`SSEParser` yields
+them and keeps only what the final message needs: text and tool argument
+fragments are collected in lists and joined once at the end, so the work
+is linear in the bytes streamed however finely they were split.
+
+:meth:`StreamReassembler.finish` rebuilds the body the provider would have
+sent without streaming and returns it through the matching
+``parse_*_response``, so a streamed flow reads exactly like a plain one.
+"""
+
+from __future__ import annotations
+
+import logging
+from abc import ABC, abstractmethod
+from collections.abc import Iterable, Mapping
+from typing import Any
+
+from agentprobe.parser.anthropic import parse_anthropic_response
+from agentprobe.parser.google import parse_google_response
+from agentprobe.parser.openai import parse_openai_response, parse_openai_responses_response
+from agentprobe.serialization import loads
+
+log = logging.getLogger(__name__)
+
+
+class StreamReassembler(ABC):
+    """Consumes parsed SSE events and produces the finished response.
+
+    Events whose data is not a JSON object (``[DONE]``, keep-alives) are
+    skipped. A stream that breaks the provider's format stops being
+    reassembled rather than failing the capture; :meth:`finish` then
+    returns ``None``, as it does when no event was recognised at all.
+    """
+
+    def __init__(self) -> None:
+        self._seen = False
+        self._broken = False
+        # Events so far that carried part of the output: text, thinking or tool arguments.
+        self._content = 0
+
+    def feed(self, events: Iterable[Mapping[str, Any]]) -> int:
+        """Take in the next events; return how many of them carried output."""
+        if self._broken:
+            return 0
+        before = self._content
+        for event in events:
+            data = event.get("data")
+            if not data or data[0] != "{":
+                continue
+            try:
+                payload = loads(data)
+                if isinstance(payload, dict):
+                    self._seen |= self._event(event.get("event"), payload)
+            except Exception:
+                log.debug("stopped reassembling a malformed stream", exc_info=True)
+                self._broken = True
+                break
+        return self._content - before
+
+    def finish(self) -> dict[str, Any] | None:
+        if self._broken or not self._seen:
+            return None
+        return self._finish()
+
+    @abstractmethod
+    def _event(self, event_type: str | None, data: dict[str, Any]) -> bool:
+        """Take in one event; return whether it belonged to this provider's stream."""
+
+    @abstractmethod
+    def _finish(self) -> dict[str, Any]:
+        """The finished response, once events were seen and none broke the stream."""
+
+
+class AnthropicReassembler(StreamReassembler):
+    """Messages API streams: content blocks, ``input_json_delta`` and usage."""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._message: dict[str, Any] = {}
+        self._usage: dict[str, Any] = {}
+        self._stop_reason: str | None = None
+        # Block index -> the block as started, plus its delta fragments.
+        self._blocks: dict[int, tuple[dict[str, Any], list[str]]] = {}
+
+    def _event(self, event_type: str | None, data: dict[str, Any]) -> bool:
+        kind = data.get("type") or event_type
+        if kind == "content_block_delta":
+            index = data.get("index", 0)
+            block = self._blocks.get(index)
+            if block is None:
+                block = self._blocks[index] = ({"type": "text"}, [])
+            delta = data.get("delta") or {}
+            fragment = delta.get(_DELTA_FIELDS.get(delta.get("type", ""), "text"))
+            if isinstance(fragment, str):
+                block[1].append(fragment)
+                self._content += 1
+        elif kind == "content_block_start":
+            self._blocks[data.get("index", len(self._blocks))] = (
+                dict(data.get("content_block") or {}),
+                [],
+            )
+        elif kind == "message_start":
+            self._message = data.get("message") or {}
+            self._usage.update(self._message.get("usage") or {})
+        elif kind == "message_delta":
+            self._stop_reason = (data.get("delta") or {}).get("stop_reason") or self._stop_reason
+            self._usage.update(data.get("usage") or {})
+        else:
+            return kind in ("content_block_stop", "message_stop", "ping", "error")
+        return True
+
+    def _finish(self) -> dict[str, Any]:
+        content = []
+        for index in sorted(self._blocks):
+            block, fragments = self._blocks[index]
+            joined = "".join(fragments)
+            block_type = block.get("type")
+            if block_type in ("tool_use", "server_tool_use"):
+                block = {**block, "input": _json_or(joined, block.get("input", {}))}
+            elif block_type == "thinking":
+                block = {**block, "thinking": block.get("thinking", "") + joined}
+            elif block_type == "text":
+                block = {**block, "text": block.get("text", "") + joined}
+            content.append(block)
+        return parse_anthropic_response(
+            {
+                **self._message,
+                "content": content,
+                "stop_reason": self._stop_reason,
+                "usage": self._usage,
+            }
+        )
+
+
+# The field of each content_block_delta type that carries its fragment.
+_DELTA_FIELDS = {
+    "text_delta": "text",
+    "input_json_delta": "partial_json",
+    "thinking_delta": "thinking",
+}
+
+
+class OpenAIReassembler(StreamReassembler):
+    """Chat Completions chunks or Responses API events, whichever the stream holds."""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._responses = False
+        # Chat Completions
+        self._chunk: dict[str, Any] = {}
+        self._usage: dict[str, Any] | None = None
+        self._choices: dict[int, _ChatChoice] = {}
+        # Responses API
+        self._response: dict[str, Any] = {}
+        self._final: dict[str, Any] | None = None
+        self._items: dict[int, tuple[dict[str, Any], list[str]]] = {}
+
+    def _event(self, event_type: str | None, data: dict[str, Any]) -> bool:
+        if data.get("object") == "chat.completion.chunk":
+            self._chat_chunk(data)
+            return True
+        kind = data.get("type")
+        if not isinstance(kind, str) or not kind.startswith("response."):
+            return False
+        self._responses = True
+        if kind in ("response.output_text.delta", "response.function_call_arguments.delta"):
+            item = self._items.get(data.get("output_index", 0))
+            if item is not None and isinstance(data.get("delta"), str):
+                item[1].append(data["delta"])
+                self._content += 1
+        elif kind == "response.output_item.added":
+            self._items[data.get("output_index", len(self._items))] = (
+                dict(data.get("item") or {}),
+                [],
+            )
+        elif kind == "response.output_item.done":
+            self._items[data.get("output_index", len(self._items))] = (
+                dict(data.get("item") or {}),
+                [],
+            )
+        elif kind in ("response.completed", "response.incomplete", "response.failed"):
+            self._final = data.get("response")
+        elif kind in ("response.created", "response.in_progress"):
+            self._response = data.get("response") or {}
+        return True
+
+    def _chat_chunk(self, data: dict[str, Any]) -> None:
+        if not self._chunk:
+            self._chunk = {k: data[k] for k in ("id", "model", "system_fingerprint") if k in data}
+        if data.get("usage"):
+            self._usage = data["usage"]
+        for raw in data.get("choices") or ():
+            index = raw.get("index", 0)
+            choice = self._choices.get(index)
+            if choice is None:
+                choice = self._choices[index] = _ChatChoice()
+            self._content += choice.add(raw)
+
+    def _finish(self) -> dict[str, Any]:
+        if self._responses:
+            if self._final is not None:
+                return parse_openai_responses_response(self._final)
+            output = []
+            for index in sorted(self._items):
+                item, fragments = self._items[index]
+                joined = "".join(fragments)
+                if item.get("type") == "function_call" and joined:
+                    item = {**item, "arguments": joined}
+                elif item.get("type") == "message" and joined:
+                    item = {**item, "content": [{"type": "output_text", "text": joined}]}
+                output.append(item)
+            return parse_openai_responses_response({**self._response, "output": output})
+        body: dict[str, Any] = {
+            **self._chunk,
+            "object": "chat.completion",
+            "choices": [self._choices[i].finish(i) for i in sorted(self._choices)],
+        }
+        if self._usage is not None:
+            body["usage"] = self._usage
+        return parse_openai_response(body)
+
+
+class _ChatChoice:
+    __slots__ = ("role", "content", "finish_reason", "tool_calls")
+
+    def __init__(self) -> None:
+        self.role = "assistant"
+        self.content: list[str] = []
+        self.finish_reason: str | None = None
+        # Call index -> id, name and argument fragments.
+        self.tool_calls: dict[int, tuple[list[str], list[str], list[str]]] = {}
+
+    def add(self, raw: dict[str, Any]) -> bool:
+        """Take in one choice of a chunk; return whether it carried output."""
+        delta = raw.get("delta") or {}
+        if delta.get("role"):
+            self.role = delta["role"]
+        content = delta.get("content")
+        if isinstance(content, str):
+            self.content.append(content)
+        tool_calls = delta.get("tool_calls") or ()
+        for call in tool_calls:
+            parts = self.tool_calls.get(call.get("index", 0))
+            if parts is None:
+                parts = self.tool_calls[call.get("index", 0)] = ([], [], [])
+            function = call.get("function") or {}
+            for fragments, value in zip(
+                parts, (call.get("id"), function.get("name"), function.get("arguments"))
+            ):
+                if value:
+                    fragments.append(value)
+        if raw.get("finish_reason"):
+            self.finish_reason = raw["finish_reason"]
+        return bool(content) or bool(tool_calls)
+
+    def finish(self, index: int) -> dict[str, Any]:
+        message: dict[str, Any] = {
+            "role": self.role,
+            "content": "".join(self.content) if self.content else None,
+        }
+        if self.tool_calls:
+            message["tool_calls"] = [
+                {
+                    "id": "".join(call_id),
+                    "type": "function",
+                    "function": {"name": "".join(name), "arguments": "".join(arguments)},
+                }
+                for call_id, name, arguments in (
+                    self.tool_calls[i] for i in sorted(self.tool_calls)
+                )
+            ]
+        return {"index": index, "message": message, "finish_reason": self.finish_reason}
+
+
+class GoogleReassembler(StreamReassembler):
+    """``streamGenerateContent`` chunks; each carries the running usage totals."""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._text: list[str] = []
+        self._calls: list[dict[str, Any]] = []
+        self._last: dict[str, Any] = {}
+        self._candidate: dict[str, Any] = {}
+
+    def _event(self, event_type: str | None, data: dict[str, Any]) -> bool:
+        candidates = data.get("candidates")
+        if candidates is None and "usageMetadata" not in data:
+            return False
+        for key in ("usageMetadata", "modelVersion", "responseId"):
+            if key in data:
+                self._last[key] = data[key]
+        if candidates:
+            candidate = candidates[0]
+            for key in ("finishReason", "safetyRatings"):
+                if key in candidate:
+                    self._candidate[key] = candidate[key]
+            parts = (candidate.get("content") or {}).get("parts") or ()
+            for part in parts:
+                if isinstance(part.get("text"), str):
+                    self._text.append(part["text"])
+                if "functionCall" in part:
+                    self._calls.append({"functionCall": part["functionCall"]})
+            self._content += bool(parts)
+        return True
+
+    def _finish(self) -> dict[str, Any]:
+        parts: list[dict[str, Any]] = [{"text": "".join(self._text)}] if self._text else []
+        parts.extend(self._calls)
+        return parse_google_response(
+            {
+                **self._last,
+                "candidates": [{**self._candidate, "content": {"role": "model", "parts": parts}}],
+            }
+        )
+
+
+_REASSEMBLERS: dict[str, type[StreamReassembler]] = {
+    "anthropic": AnthropicReassembler,
+    "openai": OpenAIReassembler,
+    "google": GoogleReassembler,
+}
+
+
+def reassembler_for(protocol_type: str) -> StreamReassembler | None:
+    """A fresh reassembler for a stream of ``protocol_type``, if it has one."""
+    cls = _REASSEMBLERS.get(protocol_type)
+    return cls() if cls is not None else None
+
+
+def reassemble(protocol_type: str, sse_data: Iterable[str | None]) -> dict[str, Any] | None:
+    """The finished response of a stored stream, given each event's data."""
+    reassembler = reassembler_for(protocol_type)
+    if reassembler is None:
+        return None
+    reassembler.feed({"data": data} for data in sse_data if data)
+    return reassembler.finish()
+
+
+def _json_or(text: str, default: Any) -> Any:
+    if not text:
+        return default
+    try:
+        return loads(text)
+    except ValueError:
+        # Cut off mid-stream; keep what arrived.
+        return text
@@ -1,9 +1,21 @@
+"""Sessions and conversations of captured requests.
+
+Every turn of an LLM conversation resends its system prompt and first user
+message, so a hash of the two, the conversation's fingerprint, recognises
+later turns however long the history grows (see
+:func:`conversation_fingerprint`). A session is a run of activity by one
+agent: a request joins the session its conversation already belongs to,
+else the session last active for its agent and host, unless that has been
+idle for the session window.
+"""
+
 from __future__ import annotations
 
 import hashlib
+import heapq
 import time
 from dataclasses import dataclass, field
-
+from typing import Any
 
 _SESSION_WINDOW_SECONDS = 1800  # 30 minutes
 
@@ -18,12 +30,29 @@ class SessionInfo:
     request_count: int = 0
     protocol: str = ""
     api_provider: str | None = None
+    # Fingerprint -> conversation id, for the conversations seen in this session.
+    conversations: dict[str, str] = field(default_factory=dict)
 
 
 @dataclass
 class SessionTracker:
+    """Assigns requests to sessions and conversations, and forgets idle sessions.
+
+    Every session has one entry in an expiry heap, keyed by the time it
+    would expire if it saw no more requests. Requests do not touch the
+    heap; :meth:`expire_sessions` pops the entries that are due and puts
+    back those whose session was active since, so it costs time in the
+    number of sessions expired or refreshed rather than the number kept.
+    """
+
+    window: float = _SESSION_WINDOW_SECONDS
     _sessions: dict[str, SessionInfo] = field(default_factory=dict)
-    _agent_host_index: dict[str, list[str]] = field(default_factory=dict)
+    # agent:host -> the session last active there.
+    _latest: dict[str, str] = field(default_factory=dict)
+    # (agent, conversation fingerprint) -> the session it belongs to.
+    _conversations: dict[tuple[str, str], str] = field(default_factory=dict)
+    # (expiry time, session id), one entry per session.
+    _expiry: list[tuple[float, str]] = field(default_factory=list)
 
     def track(
         self,
@@ -32,78 +61,163 @@ class SessionTracker:
         protocol: str = "",
         api_provider: str | None = None,
         timestamp: float | None = None,
+        fingerprint: str | None = None,
     ) -> SessionInfo:
         now = timestamp if timestamp is not None else time.time()
+        self.expire_sessions(now)
         index_key = f"{agent}:{host}"
 
-        candidate_ids = self._agent_host_index.get(index_key, [])
-        for sid in reversed(candidate_ids):
-            session = self._sessions.get(sid)
-            if session and (now - session.last_active) < _SESSION_WINDOW_SECONDS:
-                session.last_active = now
-                session.request_count += 1
-                if protocol and not session.protocol:
-                    session.protocol = protocol
-                if api_provider and not session.api_provider:
-                    session.api_provider = api_provider
-                return session
-
-        session_id = _generate_session_id(agent, host, now)
-        new_session = SessionInfo(
-            session_id=session_id,
-            agent=agent,
-            host=host,
-            started_at=now,
-            last_active=now,
-            request_count=1,
-            protocol=protocol,
-            api_provider=api_provider,
-        )
-        self._sessions[session_id] = new_session
-        if index_key not in self._agent_host_index:
-            self._agent_host_index[index_key] = []
-        self._agent_host_index[index_key].append(session_id)
-        return new_session
+        session = None
+        if fingerprint is not None:
+            session = self._sessions.get(self._conversations.get((agent, fingerprint), ""))
+        if session is None:
+            session = self._sessions.get(self._latest.get(index_key, ""))
+
+        if session is None:
+            session = SessionInfo(
+                session_id=_generate_session_id(agent, host, now),
+                agent=agent,
+                host=host,
+                started_at=now,
+                last_active=now,
+                request_count=1,
+                protocol=protocol,
+                api_provider=api_provider,
+            )
+            self._sessions[session.session_id] = session
+            heapq.heappush(self._expiry, (now + self.window, session.session_id))
+        else:
+            session.last_active = max(session.last_active, now)
+            session.request_count += 1
+            if protocol and not session.protocol:
+                session.protocol = protocol
+            if api_provider and not session.api_provider:
+                session.api_provider = api_provider
+
+        self._latest[index_key] = session.session_id
+        if fingerprint is not None and fingerprint not in session.conversations:
+            session.conversations[fingerprint] = conversation_id(session.session_id, fingerprint)
+            self._conversations[(agent, fingerprint)] = session.session_id
+        return session
+
+    def assign(
+        self,
+        agent: str,
+        host: str,
+        protocol: str = "",
+        api_provider: str | None = None,
+        body: dict[str, Any] | None = None,
+        timestamp: float | None = None,
+    ) -> tuple[str, str | None]:
+        """Track one request; return its session id and conversation id, if it has one."""
+        fingerprint = conversation_fingerprint(protocol, body) if body is not None else None
+        session = self.track(agent, host, protocol, api_provider, timestamp, fingerprint)
+        conversation = session.conversations.get(fingerprint) if fingerprint else None
+        return session.session_id, conversation
 
     def get_session(self, session_id: str) -> SessionInfo | None:
         return self._sessions.get(session_id)
 
     def get_active_sessions(self, timestamp: float | None = None) -> list[SessionInfo]:
         now = timestamp if timestamp is not None else time.time()
-        return [
-            s for s in self._sessions.values()
-            if (now - s.last_active) < _SESSION_WINDOW_SECONDS
-        ]
+        return [s for s in self._sessions.values() if (now - s.last_active) < self.window]
 
     def get_sessions_for_agent(self, agent: str) -> list[SessionInfo]:
-        return [
-            s for s in self._sessions.values()
-            if s.agent == agent
-        ]
+        return [s for s in self._sessions.values() if s.agent == agent]
 
     def expire_sessions(self, timestamp: float | None = None) -> int:
         now = timestamp if timestamp is not None else time.time()
-        expired_ids: list[str] = []
-        for sid, session in self._sessions.items():
-            if (now - session.last_active) >= _SESSION_WINDOW_SECONDS:
-                expired_ids.append(sid)
-
-        for sid in expired_ids:
-            session = self._sessions.pop(sid)
+        expiry = self._expiry
+        expired = 0
+        while expiry and expiry[0][0] <= now:
+            sid = expiry[0][1]
+            session = self._sessions[sid]
+            due = session.last_active + self.window
+            if due > now:
+                heapq.heapreplace(expiry, (due, sid))
+                continue
+            heapq.heappop(expiry)
+            del self._sessions[sid]
             index_key = f"{session.agent}:{session.host}"
-            id_list = self._agent_host_index.get(index_key, [])
-            if sid in id_list:
-                id_list.remove(sid)
-            if not id_list and index_key in self._agent_host_index:
-                del self._agent_host_index[index_key]
-
-        return len(expired_ids)
+            if self._latest.get(index_key) == sid:
+                del self._latest[index_key]
+            for fingerprint in session.conversations:
+                if self._conversations.get((session.agent, fingerprint)) == sid:
+                    del self._conversations[(session.agent, fingerprint)]
+            expired += 1
+        return expired
 
     @property
     def session_count(self) -> int:
         return len(self._sessions)
 
 
+def conversation_fingerprint(protocol: str, body: dict[str, Any]) -> str | None:
+    """Hash of the system prompt and first user message of an LLM request body.
+
+    Only the text counts, so cache markers and other annotations that
+    clients move from turn to turn do not change it. ``None`` for bodies
+    without a user message.
+    """
+    if protocol == "anthropic":
+        system = _text(body.get("system"))
+        first = _first_user(body.get("messages"))
+    elif protocol == "google":
+        system = _text(body.get("systemInstruction") or body.get("system_instruction"))
+        first = _first_user(body.get("contents"))
+    elif protocol == "openai":
+        if "input" in body:
+            # Responses API
+            system = _text(body.get("instructions"))
+            items = body["input"]
+            first = _text(items) if isinstance(items, str) else _first_user(items)
+        else:
+            messages = body.get("messages")
+            system = "\n".join(
+                _text(m.get("content"))
+                for m in messages or ()
+                if isinstance(m, dict) and m.get("role") in ("system", "developer")
+            )
+            first = _first_user(messages)
+    else:
+        return None
+    if first is None:
+        return None
+    raw = f"{protocol}\0{system}\0{first}"
+    return hashlib.sha256(raw.encode()).hexdigest()[:16]
+
+
+def _first_user(messages: Any) -> str | None:
+    if not isinstance(messages, list):
+        return None
+    for message in messages:
+        if isinstance(message, dict) and message.get("role") == "user":
+            return _text(message.get("content", message.get("parts")))
+    return None
+
+
+def _text(node: Any) -> str:
+    if isinstance(node, str):
+        return node
+    if isinstance(node, list):
+        return "\n".join(_text(item) for item in node)
+    if isinstance(node, dict):
+        if isinstance(node.get("text"), str):
+            return node["text"]
+        return _text(node.get("content", node.get("parts")))
+    return ""
+
+
 def _generate_session_id(agent: str, host: str, timestamp: float) -> str:
     raw = f"{agent}:{host}:{timestamp}"
     return hashlib.sha256(raw.encode()).hexdigest()[:16]
+
+
+def conversation_id(session_id: str, fingerprint: str) -> str:
+    """Id of the conversation with ``fingerprint`` in a session.
+
+    Per session, so one opening prompt reused in a later session is a new
+    conversation.
+    """
+    raw = f"{session_id}:{fingerprint}"
+    return hashlib.sha256(raw.encode()).hexdigest()[:16]
@@ -0,0 +1,136 @@
+"""Searchable text pulled out of LLM and MCP request/response bodies.
+
+The walk is structural rather than per provider: Anthropic, OpenAI (chat and
+responses), Gemini and MCP payloads all keep their prose under a small set
+of keys (``text``, ``content``, ``system`` ...) and describe tools as objects
+with a ``name`` next to a schema or arguments.
+"""
+
+from __future__ import annotations
+
+from collections.abc import Iterable
+from typing import Any
+
+from agentprobe.serialization import loads
+
+# Cap per indexed column, so one huge prompt cannot dominate the index.
+MAX_COLUMN_CHARS = 256 * 1024
+
+_TEXT_KEYS = frozenset(
+    {
+        "text",
+        "content",
+        "system",
+        "instructions",
+        "prompt",
+        "input",
+        "thinking",
+        "output_text",
+        "delta",
+        "partial_json",
+        "arguments",
+    }
+)
+
+# A dict with a ``name`` and one of these keys describes a tool or a call to one.
+_TOOL_KEYS = frozenset(
+    {
+        "input_schema",
+        "inputSchema",
+        "parameters",
+        "input",
+        "arguments",
+        "args",
+    }
+)
+_TOOL_TYPES = frozenset({"tool_use", "server_tool_use", "function", "function_call"})
+
+
+class _Collector:
+    __slots__ = ("texts", "tools", "size")
+
+    def __init__(self) -> None:
+        self.texts: list[str] = []
+        self.tools: dict[str, None] = {}
+        self.size = 0
+
+    def walk(self, root: Any) -> None:
+        stack = [root]
+        while stack and self.size < MAX_COLUMN_CHARS:
+            node = stack.pop()
+            if isinstance(node, dict):
+                name = node.get("name")
+                if (
+                    isinstance(name, str)
+                    and name
+                    and (node.get("type") in _TOOL_TYPES or not _TOOL_KEYS.isdisjoint(node))
+                ):
+                    self.tools[name] = None
+                if node.get("method") == "tools/call":
+                    params = node.get("params")
+                    if isinstance(params, dict) and isinstance(params.get("name"), str):
+                        self.tools[params["name"]] = None
+                children = []
+                for key, value in node.items():
+                    if isinstance(value, str):
+                        if key in _TEXT_KEYS and value:
+                            self.texts.append(value)
+                            self.size += len(value)
+                    elif isinstance(value, (dict, list)):
+                        children.append(value)
+                # Reversed so the stack pops children in document order.
+                stack.extend(reversed(children))
+            elif isinstance(node, list):
+                stack.extend(reversed(node))
+
+    def text(self, sep: str) -> str:
+        return sep.join(self.texts)[:MAX_COLUMN_CHARS]
+
+
+def _load(text: str | None) -> Any:
+    if not text:
+        return None
+    try:
+        return loads(text)
+    except ValueError:
+        return None
+
+
+def extract_search_text(
+    request_body: str | None,
+    response_body: str | None,
+    sse_data: Iterable[str | None] = (),
+) -> tuple[str, str, str]:
+    """Return the ``(prompt, tools, response)`` text to index for one flow.
+
+    ``prompt`` holds system and message text from the request, ``tools`` the
+    names of declared, called and MCP tools on either side, and ``response``
+    the completion text, reassembled from ``sse_data`` for streams. Bodies
+    that are not JSON are indexed verbatim.
+    """
+    prompt = _Collector()
+    request = _load(request_body)
+    if request is None:
+        if request_body:
+            prompt.texts.append(request_body)
+    else:
+        prompt.walk(request)
+
+    response = _Collector()
+    streamed = False
+    for data in sse_data:
+        streamed = True
+        event = _load(data)
+        if event is not None:
+            response.walk(event)
+    if not streamed:
+        payload = _load(response_body)
+        if payload is None:
+            if response_body:
+                response.texts.append(response_body)
+        else:
+            response.walk(payload)
+
+    tools = " ".join({**prompt.tools, **response.tools})
+    # Stream deltas are fragments of one text; whole bodies are separate fields.
+    return prompt.text("\n"), tools, response.text("" if streamed else "\n")
@@ -9,30 +9,101 @@ from typing import TYPE_CHECKING
 
 from mitmproxy import http
 
-from agentprobe.parser.detector import detect_agent, detect_protocol, is_sse_response
+from agentprobe.parser.detector import (
+    detect_agent,
+    detect_model,
+    detect_protocol,
+    is_sse_response,
+    peek_json,
+)
+from agentprobe.parser.enrich import message_columns
+from agentprobe.parser.reassembly import StreamReassembler, reassembler_for
 from agentprobe.proxy.sse import SSEParser
-from agentprobe.storage.models import CapturedRequest, SSEEvent
+from agentprobe.proxy.timing import StreamTiming
+from agentprobe.storage.records import CaptureRecord, SSEBatch
 
 if TYPE_CHECKING:
     from agentprobe.api.websocket import WebSocketHub
-    from agentprobe.storage.database import Database
+    from agentprobe.parser.detector import AgentMatcher
+    from agentprobe.parser.session import SessionTracker
+    from agentprobe.proxy.bridge import LoopBridge
+    from agentprobe.storage.enrichment import EnrichmentWorker
+    from agentprobe.storage.journal import FlowJournal
+    from agentprobe.storage.writer import CaptureWriter
 
 log = logging.getLogger(__name__)
 
-_seq = itertools.count(1)
+CAPTURE_MODES = ("incremental", "finalize")
 
 
 class AgentProbeAddon:
-    def __init__(self, db: Database, hub: WebSocketHub) -> None:
-        self._db = db
+    """mitmproxy addon that records flows and pushes summaries to the UI.
+
+    In ``incremental`` mode a row is inserted on the request hook and updated
+    on the response. In ``finalize`` mode in-flight flows live only in
+    ``_FlowState`` and the finished request is written once; an optional
+    ``journal`` keeps them recoverable if the proxy dies mid-flow.
+
+    The writer and the hub live on the web event loop; every call into them
+    goes through ``bridge``. Finished flows are handed to ``enrichment``,
+    when given, to be parsed into typed columns there. ``sessions``, when
+    given, assigns each request its session and conversation ids.
+    ``agents`` detects the sending agent, by default from the built-in
+    signatures only.
+
+    Request bodies longer than ``parse_limit`` characters are not parsed
+    in the request hook, which holds up the request: their protocol and
+    model come from the host, path and first few KB, and their
+    conversation is left to ``enrichment``.
+
+    Streams are timed by output rather than bytes: each chunk that carries
+    output is timestamped, and a wait of ``stall_threshold`` seconds or
+    more between two of them counts as a stall.
+    """
+
+    def __init__(
+        self,
+        writer: CaptureWriter,
+        hub: WebSocketHub,
+        bridge: LoopBridge,
+        capture_mode: str = "incremental",
+        journal: FlowJournal | None = None,
+        sse_push_interval: float = 0.1,
+        sse_push_max_events: int = 200,
+        enrichment: EnrichmentWorker | None = None,
+        stall_threshold: float = 2.0,
+        sessions: SessionTracker | None = None,
+        agents: AgentMatcher | None = None,
+        parse_limit: int = 64 * 1024,
+    ) -> None:
+        if capture_mode not in CAPTURE_MODES:
+            raise ValueError(f"unknown capture mode: {capture_mode!r}")
+        self._writer = writer
         self._hub = hub
+        self._bridge = bridge
+        self._capture_mode = capture_mode
+        self._journal = journal
+        self._sse_push_interval = sse_push_interval
+        self._sse_push_max_events = sse_push_max_events
+        self._enrichment = enrichment
+        self._stall_threshold = stall_threshold
+        self._sessions = sessions
+        self._detect_agent = agents.detect if agents is not None else detect_agent
+        self._parse_limit = parse_limit
         self._pending: dict[int, _FlowState] = {}
+        self._seq = itertools.count(1)
 
-    def request(self, flow: http.HTTPFlow) -> None:
+    def resume_sequence(self, last: int) -> None:
+        """Continue numbering after ``last`` so sequences stay unique across runs."""
+        self._seq = itertools.count(last + 1)
+
+    async def request(self, flow: http.HTTPFlow) -> None:
         try:
-            self._handle_request(flow)
+            await self._handle_request(flow)
         except Exception:
-            log.exception("addon request hook failed for %s %s", flow.request.method, flow.request.url)
+            log.exception(
+                "addon request hook failed for %s %s", flow.request.method, flow.request.url
+            )
 
     def responseheaders(self, flow: http.HTTPFlow) -> None:
         try:
@@ -44,25 +115,41 @@ class AgentProbeAddon:
                 if state:
                     state.is_sse = True
                     state.sse_parser = SSEParser()
+                    state.sse = SSEBatch()
+                    state.sse_started = time.monotonic()
+                    state.reassembler = reassembler_for(state.captured.protocol_type)
+                    state.timing = StreamTiming()
                 flow.response.stream = self._make_stream_callback(flow)
         except Exception:
             log.exception("addon responseheaders hook failed")
 
-    def response(self, flow: http.HTTPFlow) -> None:
+    async def response(self, flow: http.HTTPFlow) -> None:
+        try:
+            await self._handle_response(flow)
+        except Exception:
+            log.exception(
+                "addon response hook failed for %s %s", flow.request.method, flow.request.url
+            )
+
+    async def error(self, flow: http.HTTPFlow) -> None:
+        # Aborted connections never reach the response hook; keep what we have.
         try:
-            self._handle_response(flow)
+            await self._handle_response(flow)
         except Exception:
-            log.exception("addon response hook failed for %s %s", flow.request.method, flow.request.url)
+            log.exception("addon error hook failed for %s", flow.request.url)
 
-    def _handle_request(self, flow: http.HTTPFlow) -> None:
+    async def _handle_request(self, flow: http.HTTPFlow) -> None:
         headers = dict(flow.request.headers)
         body_text = _safe_get_text(flow.request)
-        body_dict = _try_parse_json(body_text)
-        agent = detect_agent(headers)
-        protocol_type, api_provider = detect_protocol(flow.request.host, flow.request.path, body_dict)
+        parsed = len(body_text) <= self._parse_limit
+        body_dict = _try_parse_json(body_text) if parsed else peek_json(body_text)
+        agent = self._detect_agent(headers)
+        protocol_type, api_provider = detect_protocol(
+            flow.request.host, flow.request.path, body_dict
+        )
 
-        captured = CapturedRequest(
-            sequence=next(_seq),
+        captured = CaptureRecord(
+            sequence=next(self._seq),
             agent_type=agent,
             method=flow.request.method,
             url=flow.request.url,
@@ -70,78 +157,97 @@ class AgentProbeAddon:
             path=flow.request.path,
             request_headers=headers,
             request_body=body_text,
-            request_size=len(body_text.encode()) if body_text else 0,
+            request_size=len(flow.request.raw_content or b""),
             protocol_type=protocol_type,
             api_provider=api_provider,
+            model=detect_model(flow.request.path, body_dict),
             is_streaming=False,
         )
+        if self._sessions is not None:
+            captured.session_id, captured.conversation_id = self._sessions.assign(
+                agent,
+                flow.request.host,
+                protocol_type,
+                api_provider,
+                body_dict if parsed else None,
+            )
 
         state = _FlowState(captured=captured, start_time=time.monotonic())
         self._pending[id(flow)] = state
 
-        _run_async(self._db.save_request(captured))
-        _run_async(self._hub.broadcast({
-            "type": "new_request",
-            "data": captured.to_summary().model_dump(mode="json"),
-        }))
+        if self._capture_mode == "incremental":
+            await self._bridge.call(self._writer.save_request(captured))
+        elif self._journal is not None:
+            self._journal.begin(captured)
+        self._bridge.submit(
+            self._hub.broadcast(
+                {
+                    "type": "new_request",
+                    "data": captured.summary_dict(),
+                }
+            )
+        )
 
-    def _handle_response(self, flow: http.HTTPFlow) -> None:
+    async def _handle_response(self, flow: http.HTTPFlow) -> None:
         state = self._pending.pop(id(flow), None)
         if state is None:
             return
 
         captured = state.captured
-        elapsed = (time.monotonic() - state.start_time) * 1000
-        update_fields: dict = {}
+        now = time.monotonic()
+        elapsed = (now - state.start_time) * 1000
+        # A flow without a response completes too, so that it is rolled up
+        # and counted as an error.
+        captured.duration_ms = elapsed
+        captured.ttfb_ms = state.ttfb_ms
+        update_fields: dict = {"duration_ms": elapsed, "ttfb_ms": state.ttfb_ms}
 
         if flow.response is not None:
             captured.status_code = flow.response.status_code
             captured.response_headers = dict(flow.response.headers)
-            captured.duration_ms = elapsed
-            captured.ttfb_ms = state.ttfb_ms
 
             if state.is_sse:
                 captured.is_streaming = True
-                if state.sse_parser:
+                if state.sse_parser and state.sse is not None:
                     remaining = state.sse_parser.flush()
-                    state.sse_events.extend(remaining)
-                captured.sse_events = state.sse_events
-                captured.response_body = _format_sse_events(state.sse_events)
-                captured.response_size = len(captured.response_body.encode()) if captured.response_body else 0
+                    self._queue_sse_push(state, remaining)
+                    state.sse.append(remaining, now - state.sse_started)
+                    self._time_events(state, remaining, now)
+                    if state.reassembler is not None:
+                        captured.response_message = state.reassembler.finish()
+                self._flush_sse_push(state)
+                if state.timing is not None:
+                    self._finish_timing(state)
+                captured.sse = state.sse
+                # The event-stream text is rebuilt from the events by storage.
+                captured.response_size = state.stream_bytes
             else:
                 resp_text = _safe_get_text(flow.response)
                 captured.response_body = resp_text
-                captured.response_size = len(resp_text.encode()) if resp_text else 0
+                captured.response_size = len(flow.response.raw_content or b"")
 
-            update_fields = {
-                "status_code": captured.status_code,
-                "response_headers": captured.response_headers,
-                "response_body": captured.response_body,
-                "response_size": captured.response_size,
-                "duration_ms": captured.duration_ms,
-                "ttfb_ms": captured.ttfb_ms,
-                "is_streaming": captured.is_streaming,
-                "sse_events": captured.sse_events,
-            }
+            update_fields = captured.response_fields()
 
-        _run_async(self._db.update_request(captured.id, update_fields))
+        if self._capture_mode == "incremental":
+            await self._bridge.call(self._writer.update_request(captured.id, update_fields))
+        else:
+            # The writer ends the journal entry once the row has committed.
+            await self._bridge.call(self._writer.save_request(captured))
 
         # Save SSE events to separate sse_events table (batch)
-        if captured.sse_events:
-            sse_event_models = [
-                SSEEvent(
-                    request_id=captured.id,
-                    event_index=idx,
-                    event_type=raw.get("event", "message"),
-                    data=raw.get("data", ""),
-                )
-                for idx, raw in enumerate(captured.sse_events)
-            ]
-            _run_async(self._db.save_sse_events(sse_event_models))
-        _run_async(self._hub.broadcast({
-            "type": "request_complete",
-            "data": captured.to_summary().model_dump(mode="json"),
-        }))
+        if captured.sse:
+            await self._bridge.call(self._writer.save_sse_batch(captured.id, captured.sse))
+        self._bridge.submit(self._writer.index_request(captured))
+        if self._enrichment is not None:
+            self._bridge.submit(self._enrichment.submit(captured))
+        self._bridge.submit(
+            self._hub.broadcast(
+                {
+                    "type": "request_complete",
+                    "data": captured.summary_dict(),
+                }
+            )
+        )
 
     def _make_stream_callback(self, flow: http.HTTPFlow):
         def stream_callback(data: bytes) -> bytes:
@@ -150,23 +256,111 @@ class AgentProbeAddon:
                 return data
             if state.ttfb_ms is None:
                 state.ttfb_ms = (time.monotonic() - state.start_time) * 1000
-            if state.sse_parser and data:
+            state.stream_bytes += len(data)
+            if state.sse_parser and state.sse is not None and data:
                 events = state.sse_parser.feed(data)
-                state.sse_events.extend(events)
+                if events:
+                    now = time.monotonic()
+                    self._queue_sse_push(state, events)
+                    state.sse.append(events, now - state.sse_started)
+                    self._time_events(state, events, now)
             return data
+
         return stream_callback
 
+    def _time_events(self, state: _FlowState, events: list[dict], now: float) -> None:
+        # Streams the reassembler does not know count every event as output.
+        if state.reassembler is not None:
+            count = state.reassembler.feed(events)
+        else:
+            count = len(events)
+        if state.timing is not None:
+            state.timing.add(now - state.start_time, count)
+
+    def _finish_timing(self, state: _FlowState) -> None:
+        captured = state.captured
+        output_tokens = None
+        if captured.response_message is not None:
+            output_tokens = message_columns(captured.protocol_type, captured.response_message).get(
+                "output_tokens"
+            )
+        metrics = state.timing.metrics(output_tokens, self._stall_threshold)
+        for column, value in metrics.items():
+            setattr(captured, column, value)
+
+    def _queue_sse_push(self, state: _FlowState, events: list[dict]) -> None:
+        """Buffer freshly parsed events for the next live push to the UI.
+
+        Events are coalesced into one message per ``sse_push_interval`` per
+        stream, so a fast token stream costs subscribers a handful of
+        messages per second instead of one per delta.
+        """
+        if not events or not self._hub.wants_sse(state.captured.id):
+            return
+        if not state.push_pending:
+            state.push_index = len(state.sse) if state.sse is not None else 0
+        state.push_pending.extend(events)
+        if state.push_handle is None:
+            try:
+                loop = asyncio.get_running_loop()
+            except RuntimeError:
+                self._flush_sse_push(state)
+                return
+            state.push_handle = loop.call_later(
+                self._sse_push_interval, self._flush_sse_push, state
+            )
+
+    def _flush_sse_push(self, state: _FlowState) -> None:
+        if state.push_handle is not None:
+            state.push_handle.cancel()
+            state.push_handle = None
+        events = state.push_pending
+        if not events:
+            return
+        state.push_pending = []
+        start_index = state.push_index
+        # A slice too large for one message keeps its newest events; the UI
+        # can fetch the skipped ones from /api/requests/{id}/sse-events.
+        dropped = max(0, len(events) - self._sse_push_max_events)
+        if dropped:
+            events = events[dropped:]
+            start_index += dropped
+        self._bridge.submit(
+            self._hub.broadcast_sse_events(state.captured.id, start_index, events, dropped)
+        )
 
-class _FlowState:
-    __slots__ = ("captured", "start_time", "is_sse", "sse_parser", "sse_events", "ttfb_ms")
 
-    def __init__(self, captured: CapturedRequest, start_time: float) -> None:
+class _FlowState:
+    __slots__ = (
+        "captured",
+        "start_time",
+        "is_sse",
+        "sse_parser",
+        "sse",
+        "sse_started",
+        "ttfb_ms",
+        "stream_bytes",
+        "push_pending",
+        "push_index",
+        "push_handle",
+        "reassembler",
+        "timing",
+    )
+
+    def __init__(self, captured: CaptureRecord, start_time: float) -> None:
         self.captured = captured
         self.start_time = start_time
         self.is_sse = False
         self.sse_parser: SSEParser | None = None
-        self.sse_events: list[dict] = []
+        self.sse: SSEBatch | None = None
+        self.sse_started = start_time
         self.ttfb_ms: float | None = None
+        self.stream_bytes = 0
+        self.push_pending: list[dict] = []
+        self.push_index = 0
+        self.push_handle: asyncio.TimerHandle | None = None
+        self.reassembler: StreamReassembler | None = None
+        self.timing: StreamTiming | None = None
 
 
 def _safe_get_text(msg: http.Request | http.Response) -> str:
@@ -184,25 +378,3 @@ def _try_parse_json(text: str) -> dict | None:
         return result if isinstance(result, dict) else None
     except (json.JSONDecodeError, ValueError):
         return None
-
-
-def _format_sse_events(events: list[dict]) -> str:
-    parts: list[str] = []
-    for ev in events:
-        if "event" in ev:
-            parts.append(f"event: {ev['event']}")
-        if "data" in ev:
-            parts.append(f"data: {ev['data']}")
-        parts.append("")
-    return "\n".join(parts)
-
-
-def _run_async(coro) -> None:  # noqa: ANN001
-    try:
-        loop = asyncio.get_running_loop()
-        loop.create_task(coro)
-    except RuntimeError:
-        try:
-            asyncio.run(coro)
-        except Exception:
-            log.debug("failed to schedule async task", exc_info=True)
@@ -0,0 +1,109 @@
+"""Hand-off of work from the proxy event loop to the web event loop."""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import threading
+from collections.abc import Coroutine
+from concurrent.futures import Future
+from typing import Any, TypeVar
+
+log = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class LoopBridge:
+    """Runs coroutines on the event loop that owns storage and WebSockets.
+
+    mitmproxy runs on the main thread's loop while uvicorn runs on its own
+    thread and loop. The database connection, the capture writer and every
+    WebSocket belong to the web loop; the addon reaches them only through
+    this bridge, which schedules coroutines there with
+    ``run_coroutine_threadsafe`` and counts how each one ended.
+    """
+
+    def __init__(self) -> None:
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._ready = threading.Event()
+        self._lock = threading.Lock()
+        self._scheduled = 0
+        self._completed = 0
+        self._failed = 0
+        self._rejected = 0
+
+    def bind(self, loop: asyncio.AbstractEventLoop) -> None:
+        self._loop = loop
+        self._ready.set()
+
+    def unbind(self) -> None:
+        self._ready.clear()
+        self._loop = None
+
+    def wait_ready(self, timeout: float | None = None) -> bool:
+        return self._ready.wait(timeout)
+
+    def submit(self, coro: Coroutine[Any, Any, Any]) -> None:
+        """Schedule ``coro`` on the web loop without waiting for it."""
+        future = self._schedule(coro)
+        if future is not None:
+            future.add_done_callback(self._on_done)
+
+    async def call(self, coro: Coroutine[Any, Any, T]) -> T:
+        """Run ``coro`` on the web loop and await its result from any loop."""
+        loop = self._loop
+        if loop is not None and _running_loop() is loop:
+            return await coro
+        future = self._schedule(coro)
+        if future is None:
+            raise RuntimeError("web event loop is not running")
+        future.add_done_callback(self._on_done)
+        return await asyncio.wrap_future(future)
+
+    def run(self, coro: Coroutine[Any, Any, T], timeout: float | None = None) -> T:
+        """Run ``coro`` on the web loop, blocking the calling thread."""
+        future = self._schedule(coro)
+        if future is None:
+            raise RuntimeError("web event loop is not running")
+        future.add_done_callback(self._on_done)
+        return future.result(timeout)
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {
+                "scheduled": self._scheduled,
+                "completed": self._completed,
+                "failed": self._failed,
+                "rejected": self._rejected,
+                "pending": self._scheduled - self._completed - self._failed,
+            }
+
+    def _schedule(self, coro: Coroutine[Any, Any, T]) -> Future[T] | None:
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            coro.close()
+            with self._lock:
+                self._rejected += 1
+            log.warning("dropped background task: web event loop is not running")
+            return None
+        with self._lock:
+            self._scheduled += 1
+        return asyncio.run_coroutine_threadsafe(coro, loop)
+
+    def _on_done(self, future: Future[Any]) -> None:
+        failed = future.cancelled() or future.exception() is not None
+        with self._lock:
+            if failed:
+                self._failed += 1
+            else:
+                self._completed += 1
+        if failed and not future.cancelled():
+            log.warning("background task failed", exc_info=future.exception())
+
+
+def _running_loop() -> asyncio.AbstractEventLoop | None:
+    try:
+        return asyncio.get_running_loop()
+    except RuntimeError:
+        return None
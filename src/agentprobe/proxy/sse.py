@@ -1,72 +1,133 @@
 from __future__ import annotations
 
+import re
+
+# Any of the three line endings the event-stream format allows.
+_EOL_RE = re.compile(rb"\r\n|\r|\n")
+_CR = 0x0D
+_BOM = b"\xef\xbb\xbf"
+
 
 class SSEParser:
+    """Incremental ``text/event-stream`` parser working on raw bytes.
+
+    Chunks are appended to a byte buffer and scanned from a cursor, so every
+    byte is looked at once no matter how the stream is chunked. Only complete
+    lines are decoded; line terminators never occur inside a multi-byte UTF-8
+    sequence, so characters split across chunks decode intact.
+    """
 
     def __init__(self) -> None:
-        self._buffer: str = ""
+        self._buffer = bytearray()
+        self._scan_from = 0
+        self._started = False
+        self._event: dict = {}
+        self._data_lines: list[str] = []
 
     def feed(self, chunk: bytes) -> list[dict]:
         # Returns list of dicts with keys: event, data, id, retry
-        try:
-            text = chunk.decode("utf-8", errors="replace")
-        except Exception:
+        if not chunk:
             return []
+        buf = self._buffer
+        buf += chunk
+        if not self._started:
+            if len(buf) < len(_BOM) and _BOM.startswith(buf):
+                return []
+            if buf.startswith(_BOM):
+                del buf[: len(_BOM)]
+            self._started = True
 
-        self._buffer += text
         events: list[dict] = []
-
-        while "\n\n" in self._buffer:
-            block, self._buffer = self._buffer.split("\n\n", 1)
-            event = self._parse_block(block)
-            if event:
+        end = len(buf)
+        pos = 0
+        search_from = self._scan_from
+        while True:
+            match = _EOL_RE.search(buf, search_from)
+            if match is None:
+                break
+            # A trailing CR may be the first half of a CRLF split across chunks.
+            if match.end() == end and buf[end - 1] == _CR:
+                break
+            event = self._process_line(buf, pos, match.start())
+            if event is not None:
                 events.append(event)
+            pos = search_from = match.end()
 
+        if pos:
+            del buf[:pos]
+        # Everything left is one partial line; only its unscanned tail (and a
+        # possibly dangling CR) needs to be searched again.
+        self._scan_from = max(len(buf) - 1, 0)
         return events
 
     def flush(self) -> list[dict]:
+        events: list[dict] = []
+        buf = self._buffer
+        if buf:
+            pos = 0
+            for match in _EOL_RE.finditer(buf):
+                event = self._process_line(buf, pos, match.start())
+                if event is not None:
+                    events.append(event)
+                pos = match.end()
+            if pos < len(buf):
+                self._process_line(buf, pos, len(buf))
+        event = self._dispatch()
+        if event is not None:
+            events.append(event)
+        self._buffer = bytearray()
+        self._scan_from = 0
+        return events
 
-        if not self._buffer.strip():
-            self._buffer = ""
-            return []
-        event = self._parse_block(self._buffer)
-        self._buffer = ""
-        return [event] if event else []
-
-    @staticmethod
-    def _parse_block(block: str) -> dict | None:
-        event: dict = {}
-        data_lines: list[str] = []
-
-        for line in block.split("\n"):
-            line = line.rstrip("\r")
-
-            if not line or line.startswith(":"):
-                continue
-
-            if ":" in line:
-                field, _, value = line.partition(":")
-                value = value.lstrip(" ")
-            else:
-                field = line
-                value = ""
-
-            field = field.strip()
-
-            if field == "data":
-                data_lines.append(value)
-            elif field == "event":
-                event["event"] = value
-            elif field == "id":
-                event["id"] = value
-            elif field == "retry":
-                event["retry"] = value
-
-        if data_lines:
-            event["data"] = "\n".join(data_lines)
-
-        return event if event else None
+    def _process_line(self, buf: bytearray, start: int, stop: int) -> dict | None:
+        if start == stop:
+            return self._dispatch()
+        if buf[start] == 0x3A:  # ":" starts a comment
+            return None
+
+        colon = buf.find(b":", start, stop)
+        if colon == -1:
+            field = buf[start:stop].decode("utf-8", errors="replace")
+            value = ""
+        else:
+            field = buf[start:colon].decode("utf-8", errors="replace")
+            value_start = colon + 1
+            if value_start < stop and buf[value_start] == 0x20:
+                value_start += 1
+            value = buf[value_start:stop].decode("utf-8", errors="replace")
+
+        if field == "data":
+            self._data_lines.append(value)
+        elif field in ("event", "id", "retry"):
+            self._event[field] = value
+        return None
+
+    def _dispatch(self) -> dict | None:
+        event = self._event
+        if self._data_lines:
+            event["data"] = "\n".join(self._data_lines)
+            self._data_lines = []
+        if not event:
+            return None
+        self._event = {}
+        return event
 
     def reset(self) -> None:
 
-        self._buffer = ""
+        self._buffer = bytearray()
+        self._scan_from = 0
+        self._started = False
+        self._event = {}
+        self._data_lines = []
+
+
+def format_sse_events(events: list[dict]) -> str:
+    """Render parsed events back into ``text/event-stream`` text."""
+    parts: list[str] = []
+    for ev in events:
+        if "event" in ev:
+            parts.append(f"event: {ev['event']}")
+        if "data" in ev:
+            parts.append(f"data: {ev['data']}")
+        parts.append("")
+    return "\n".join(parts)
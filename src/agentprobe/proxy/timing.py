@@ -0,0 +1,69 @@
+from __future__ import annotations
+
+from array import array
+from typing import Any
+
+
+class StreamTiming:
+    """Arrival times of the chunks of one stream that carried output.
+
+    The stream callback adds one entry per chunk whose events held text,
+    thinking or tool arguments: the monotonic seconds since the request
+    started and how many such events the chunk held. That is two appends
+    per chunk; everything else is derived once, by :meth:`metrics`.
+    """
+
+    __slots__ = ("offsets", "counts")
+
+    def __init__(self) -> None:
+        self.offsets = array("d")
+        self.counts = array("I")
+
+    def __len__(self) -> int:
+        return len(self.offsets)
+
+    def add(self, offset: float, count: int) -> None:
+        if count:
+            self.offsets.append(offset)
+            self.counts.append(count)
+
+    def metrics(self, output_tokens: int | None, stall_threshold: float) -> dict[str, Any]:
+        """The stream's columns, see :data:`STREAM_TIMING_COLUMNS`.
+
+        ``ttft_ms`` is the time to the first output, not the first byte.
+        A gap between consecutive output chunks of ``stall_threshold``
+        seconds or more is a stall. ``tokens_per_sec`` divides the output
+        tokens by the time from the first output chunk to the last.
+        """
+        offsets = self.offsets
+        if not offsets:
+            return dict.fromkeys(STREAM_TIMING_COLUMNS)
+        max_gap = 0.0
+        stalls = 0
+        previous = offsets[0]
+        for offset in offsets:
+            gap = offset - previous
+            if gap > max_gap:
+                max_gap = gap
+            if gap >= stall_threshold:
+                stalls += 1
+            previous = offset
+        span = offsets[-1] - offsets[0]
+        return {
+            "ttft_ms": offsets[0] * 1000,
+            "max_gap_ms": max_gap * 1000 if len(offsets) > 1 else None,
+            "stall_count": stalls,
+            "tokens_per_sec": output_tokens / span if output_tokens and span > 0 else None,
+            "stream_timing": self.to_dict(),
+        }
+
+    def to_dict(self) -> dict[str, list]:
+        """The arrays as stored: offsets in milliseconds, to a tenth."""
+        return {
+            "offsets_ms": [round(offset * 1000, 1) for offset in self.offsets],
+            "events": self.counts.tolist(),
+        }
+
+
+# Columns of a streamed request filled in from its StreamTiming.
+STREAM_TIMING_COLUMNS = ("ttft_ms", "max_gap_ms", "stall_count", "tokens_per_sec", "stream_timing")
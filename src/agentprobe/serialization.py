@@ -0,0 +1,73 @@
+"""JSON encoding shared by storage, the REST API and the WebSocket hub.
+
+orjson is used when it is installed (``pip install agentprobe[fast]``), then
+msgspec, then the standard library. Every backend produces compact UTF-8 JSON
+and renders UTC datetimes with a ``Z`` suffix, the same as Pydantic's
+``model_dump(mode="json")``. Malformed input makes ``loads`` raise
+``ValueError`` whichever backend is active.
+"""
+
+from __future__ import annotations
+
+import json
+from datetime import datetime
+from typing import Any
+
+
+def _default(obj: Any) -> Any:
+    if isinstance(obj, datetime):
+        text = obj.isoformat()
+        return text[:-6] + "Z" if text.endswith("+00:00") else text
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+try:
+    import orjson
+except ImportError:
+    orjson = None  # type: ignore[assignment]
+
+if orjson is not None:
+    BACKEND = "orjson"
+    _ORJSON_OPTIONS = orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS
+
+    def dumps(obj: Any) -> bytes:
+        return orjson.dumps(obj, default=_default, option=_ORJSON_OPTIONS)
+
+    def loads(data: str | bytes) -> Any:
+        return orjson.loads(data)
+
+else:
+    try:
+        import msgspec
+    except ImportError:
+        msgspec = None  # type: ignore[assignment]
+
+    if msgspec is not None:
+        BACKEND = "msgspec"
+        _encoder = msgspec.json.Encoder(enc_hook=_default)
+        _decoder = msgspec.json.Decoder()
+
+        def dumps(obj: Any) -> bytes:
+            return _encoder.encode(obj)
+
+        def loads(data: str | bytes) -> Any:
+            try:
+                return _decoder.decode(data)
+            except msgspec.DecodeError as exc:
+                raise ValueError(str(exc)) from exc
+
+    else:
+        BACKEND = "json"
+        _stdlib_encoder = json.JSONEncoder(
+            ensure_ascii=False, separators=(",", ":"), default=_default
+        )
+
+        def dumps(obj: Any) -> bytes:
+            return _stdlib_encoder.encode(obj).encode()
+
+        def loads(data: str | bytes) -> Any:
+            return json.loads(data)
+
+
+def dumps_str(obj: Any) -> str:
+    return dumps(obj).decode()
@@ -0,0 +1,147 @@
+"""Content-addressed files for bodies too large to keep inline in SQLite."""
+
+from __future__ import annotations
+
+import hashlib
+import logging
+import mmap
+import os
+import shutil
+import tempfile
+from pathlib import Path
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None  # type: ignore[assignment]
+
+log = logging.getLogger(__name__)
+
+_ZSTD_SUFFIX = ".zst"
+
+# Longest zstd frame header; it ends with the frame's uncompressed size.
+_ZSTD_FRAME_HEADER_MAX = 18
+
+
+class BlobStore:
+    """Stores byte strings as files named by their SHA-256 digest.
+
+    The digest is the reference kept in the database, so identical bodies,
+    such as the system prompt an agent resends on every turn, are written
+    once. Files live in two-level fan-out directories under ``root``. With
+    ``compress`` (needs the ``zstandard`` package, ``pip install
+    agentprobe[zstd]``) new blobs are written zstd-compressed; both forms
+    are always readable.
+    """
+
+    def __init__(self, root: str | Path, compress: bool = False) -> None:
+        if compress and zstandard is None:
+            log.warning("zstandard is not installed; storing blobs uncompressed")
+            compress = False
+        self._root = Path(root)
+        self._compress = compress
+
+    def put(self, data: bytes) -> str:
+        ref = hashlib.sha256(data).hexdigest()
+        if self._find(ref) is not None:
+            return ref
+        path = self._path(ref)
+        if self._compress:
+            data = zstandard.ZstdCompressor().compress(data)
+            path = path.with_name(path.name + _ZSTD_SUFFIX)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Write under a temporary name first so a crash never leaves a
+        # truncated file behind a valid digest.
+        fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as fh:
+                fh.write(data)
+            os.replace(tmp, path)
+        except BaseException:
+            Path(tmp).unlink(missing_ok=True)
+            raise
+        return ref
+
+    def get(self, ref: str) -> bytes:
+        path = self._require(ref)
+        data = path.read_bytes()
+        if path.suffix == _ZSTD_SUFFIX:
+            return _decompress(data)
+        return data
+
+    def read_range(self, ref: str, start: int, stop: int) -> bytes:
+        """Return bytes ``start:stop`` of a blob.
+
+        Uncompressed blobs are memory-mapped, so only the requested pages
+        are read; compressed blobs are decompressed first.
+        """
+        path = self._require(ref)
+        if path.suffix == _ZSTD_SUFFIX:
+            return _decompress(path.read_bytes())[start:stop]
+        with open(path, "rb") as fh:
+            if os.fstat(fh.fileno()).st_size == 0:
+                return b""
+            with mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                return mapped[start:stop]
+
+    def size(self, ref: str) -> int:
+        """Uncompressed size of a blob, without reading a compressed one whole."""
+        path = self._require(ref)
+        if path.suffix == _ZSTD_SUFFIX:
+            return _content_size(path)
+        return path.stat().st_size
+
+    def exists(self, ref: str) -> bool:
+        return self._find(ref) is not None
+
+    def delete(self, ref: str) -> None:
+        path = self._find(ref)
+        if path is not None:
+            path.unlink(missing_ok=True)
+
+    def clear(self) -> None:
+        if self._root.exists():
+            shutil.rmtree(self._root)
+
+    def _path(self, ref: str) -> Path:
+        return self._root / ref[:2] / ref[2:4] / ref
+
+    def _find(self, ref: str) -> Path | None:
+        path = self._path(ref)
+        if path.exists():
+            return path
+        compressed = path.with_name(path.name + _ZSTD_SUFFIX)
+        if compressed.exists():
+            return compressed
+        return None
+
+    def _require(self, ref: str) -> Path:
+        path = self._find(ref)
+        if path is None:
+            raise FileNotFoundError(f"blob {ref} is missing")
+        return path
+
+
+def _decompress(data: bytes) -> bytes:
+    if zstandard is None:
+        raise RuntimeError("zstandard is required to read compressed blobs")
+    return zstandard.ZstdDecompressor().decompress(data)
+
+
+def _content_size(path: Path) -> int:
+    if zstandard is None:
+        raise RuntimeError("zstandard is required to read compressed blobs")
+    with open(path, "rb") as fh:
+        header = fh.read(_ZSTD_FRAME_HEADER_MAX)
+    try:
+        size = zstandard.frame_content_size(header)
+    except zstandard.ZstdError:
+        size = -1
+    if size >= 0:
+        return size
+    # A frame written without its size: count it in chunks instead.
+    size = 0
+    with open(path, "rb") as fh, zstandard.ZstdDecompressor().stream_reader(fh) as reader:
+        while chunk := reader.read(1024 * 1024):
+            size += len(chunk)
+    return size
@@ -0,0 +1,141 @@
+"""Compression of the body, header and stream columns of ``requests``.
+
+A compressed value is stored as a BLOB whose first byte names the codec.
+TEXT values, written with compression off or before it was turned on, read
+back unchanged, so both kinds can sit side by side in one column and the
+setting can change between runs.
+"""
+
+from __future__ import annotations
+
+import logging
+import zlib
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None  # type: ignore[assignment]
+
+log = logging.getLogger(__name__)
+
+COMPRESSION_METHODS = ("none", "zlib", "zstd")
+
+# Columns of ``requests`` that hold compressible text.
+COMPRESSED_COLUMNS = (
+    "request_headers",
+    "request_body",
+    "request_body_delta",
+    "response_headers",
+    "response_body",
+    "sse_events",
+    "response_message",
+)
+
+_ZLIB = 1
+_ZSTD = 2
+
+# Shorter values rarely shrink enough to pay for the tag byte and frame header.
+_MIN_SIZE = 128
+# Bytes of each value kept as a dictionary training sample.
+_SAMPLE_SIZE = 16 * 1024
+
+
+class ColumnCodec:
+    """Compresses column values on write and decompresses them on read.
+
+    ``"zstd"`` (needs the ``zstandard`` package, ``pip install
+    agentprobe[zstd]``) trains a dictionary on the first
+    ``dictionary_samples`` values, which suits the small, repetitive JSON of
+    LLM traffic far better than compressing each value on its own; later
+    values are compressed with it. zstd writes the dictionary id into every
+    frame, so values compressed before or with any dictionary listed in
+    :attr:`dictionaries` stay readable. Without ``zstandard`` it falls back
+    to zlib. Every codec can read what the others wrote, except that zstd
+    values need ``zstandard`` installed.
+    """
+
+    def __init__(
+        self,
+        method: str = "zstd",
+        dictionary_size: int = 64 * 1024,
+        dictionary_samples: int = 1000,
+    ) -> None:
+        if method not in COMPRESSION_METHODS:
+            raise ValueError(f"unknown compression method: {method!r}")
+        if method == "zstd" and zstandard is None:
+            log.warning("zstandard is not installed; compressing columns with zlib")
+            method = "zlib"
+        self._method = method
+        self._dictionary_size = dictionary_size
+        self._dictionary_samples = dictionary_samples
+        self._samples: list[bytes] | None = [] if method == "zstd" else None
+        self._compressor = zstandard.ZstdCompressor() if method == "zstd" else None
+        # dict_id -> raw dictionary, and those not yet saved to the database.
+        self.dictionaries: dict[int, bytes] = {}
+        self.unsaved: list[tuple[int, bytes]] = []
+
+    @property
+    def method(self) -> str:
+        return self._method
+
+    def load_dictionary(self, dict_id: int, data: bytes) -> None:
+        """Register a saved dictionary and, with zstd, compress with it from now on."""
+        self.dictionaries[dict_id] = data
+        if self._method == "zstd":
+            self._use_dictionary(data)
+
+    def compress(self, value: str | None) -> str | bytes | None:
+        if value is None or self._method == "none" or len(value) < _MIN_SIZE:
+            return value
+        data = value.encode()
+        if self._method == "zlib":
+            packed = bytes((_ZLIB,)) + zlib.compress(data)
+        else:
+            if self._samples is not None:
+                self._sample(data)
+            packed = bytes((_ZSTD,)) + self._compressor.compress(data)
+        return packed if len(packed) < len(data) else value
+
+    def decompress(self, value: str | bytes | None) -> str | None:
+        if value is None or isinstance(value, str):
+            return value
+        tag, payload = value[0], value[1:]
+        if tag == _ZLIB:
+            data = zlib.decompress(payload)
+        elif tag == _ZSTD:
+            data = self._zstd_decompress(payload)
+        else:
+            raise ValueError(f"unknown column codec tag {tag}")
+        return data.decode("utf-8", errors="replace")
+
+    def _zstd_decompress(self, payload: bytes) -> bytes:
+        if zstandard is None:
+            raise RuntimeError("zstandard is required to read zstd-compressed columns")
+        dict_id = zstandard.get_frame_parameters(payload).dict_id
+        if not dict_id:
+            return zstandard.ZstdDecompressor().decompress(payload)
+        data = self.dictionaries.get(dict_id)
+        if data is None:
+            raise ValueError(f"compression dictionary {dict_id} is missing")
+        dictionary = zstandard.ZstdCompressionDict(data)
+        return zstandard.ZstdDecompressor(dict_data=dictionary).decompress(payload)
+
+    def _sample(self, data: bytes) -> None:
+        samples = self._samples
+        samples.append(data[:_SAMPLE_SIZE])
+        if len(samples) < self._dictionary_samples:
+            return
+        self._samples = None
+        try:
+            dictionary = zstandard.train_dictionary(self._dictionary_size, samples)
+        except zstandard.ZstdError as exc:
+            log.info("could not train a compression dictionary: %s", exc)
+            return
+        data = dictionary.as_bytes()
+        self.dictionaries[dictionary.dict_id()] = data
+        self.unsaved.append((dictionary.dict_id(), data))
+        self._use_dictionary(data)
+
+    def _use_dictionary(self, data: bytes) -> None:
+        self._samples = None
+        self._compressor = zstandard.ZstdCompressor(dict_data=zstandard.ZstdCompressionDict(data))
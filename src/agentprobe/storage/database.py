@@ -1,34 +1,201 @@
 from __future__ import annotations
 
-import json
-from datetime import datetime
+import asyncio
+import logging
+import time
+from collections.abc import AsyncIterator, Mapping, Sequence
+from contextlib import asynccontextmanager
+from datetime import UTC, datetime, timedelta
 from pathlib import Path
 from typing import Any
 
 import aiosqlite
 
+from agentprobe.proxy.sse import format_sse_events
+from agentprobe.serialization import dumps_str, loads
+from agentprobe.storage.blobs import BlobStore
+from agentprobe.storage.compression import COMPRESSED_COLUMNS, ColumnCodec
+from agentprobe.storage.delta import DeltaEncoder, apply_delta
 from agentprobe.storage.models import CapturedRequest, RequestSummary, SSEEvent
 from agentprobe.storage.queries import (
+    BACKFILL_SSE_ROWS,
+    CHECK_STATS_COUNTERS,
+    COMPACT_INLINE_SSE,
     DELETE_ALL_REQUESTS,
+    DELETE_ALL_ROLLUPS,
+    DELETE_ALL_SEARCH_DOCS,
+    DELETE_ALL_SESSION_STATS,
     DELETE_ALL_SSE_EVENTS,
+    DELETE_EMPTY_SESSION_STATS,
+    INSERT_COMPRESSION_DICTIONARY,
     INSERT_REQUEST,
+    INSERT_SEARCH_DOC,
     INSERT_SSE_EVENT,
+    MIGRATIONS,
+    PRUNE_ROLLUPS,
+    REBASE_REQUEST_BODY,
+    REBUILD_STATS_COUNTERS,
     SCHEMA_STATEMENTS,
+    SELECT_BLOB_REFS,
+    SELECT_BODY_COLUMNS,
+    SELECT_COMPRESSED_INLINE_SSE,
+    SELECT_COMPRESSION_DICTIONARIES,
+    SELECT_MAX_SEQUENCE,
+    SELECT_META,
+    SELECT_OLDEST_REQUESTS,
+    SELECT_REQUEST_BODY,
+    SELECT_REQUEST_BOUNDS,
     SELECT_REQUEST_BY_ID,
+    SELECT_REQUEST_EXISTS,
+    SELECT_RETENTION_TOTALS,
+    SELECT_ROLLUP_BACKFILL,
     SELECT_SSE_EVENTS_BY_REQUEST,
-    STATS_QUERY,
+    SELECT_STATS_COUNTERS,
+    STATS_DIMENSIONS,
+    STATS_SOURCE_COLUMNS,
+    UPSERT_META,
+    UPSERT_ROLLUP,
+    UPSERT_SESSION_STATS,
+    UPSERT_STATS_COUNTER,
+    build_delete_queries,
+    build_export_query,
     build_list_query,
+    build_page_query,
+    build_referenced_blobs_query,
+    build_rollup_keys_query,
+    build_rollup_range_query,
+    build_search_query,
+    build_sessions_query,
+    build_stats_source_query,
     build_update_query,
 )
+from agentprobe.storage.records import CaptureRecord, SSEBatch, sse_event_id
+from agentprobe.storage.rollups import DEFAULT_ROLLUP_RETENTION, Rollup, RollupDelta
+from agentprobe.storage.sessions import SessionDelta
+from agentprobe.storage.stats import TOTAL_COLUMNS, StatsDelta, source_row, summarize_stats
+
+log = logging.getLogger(__name__)
+
+SSE_STORAGE_FORMATS = ("rows", "inline")
+BODY_STORAGE_FORMATS = ("full", "delta")
+
+# (request_id, prompt, tools, response) text for the full-text index.
+SearchDocument = tuple[str, str, str, str]
+
+BODY_PARTS = ("request", "response")
+
+# Update fields stored as JSON text.
+_JSON_COLUMNS = (
+    "request_headers",
+    "response_headers",
+    "sse_events",
+    "response_message",
+    "stream_timing",
+)
+
+# Delta chains are cut by keyframes long before this; a longer one is corrupt.
+_MAX_DELTA_CHAIN = 4096
+# Rows read per step when rolling up earlier requests.
+_ROLLUP_BACKFILL_CHUNK = 5000
+# Rollup keys looked up per statement; each takes four bound parameters.
+_ROLLUP_KEYS_PER_QUERY = 500
+_ROLLUP_PRUNE_INTERVAL = 3600.0
 
 
 class Database:
-    def __init__(self) -> None:
+    """SQLite capture store.
+
+    ``sse_storage`` selects how streamed responses are kept. With ``"rows"``
+    the ``sse_events`` table is the only copy and ``get_request`` rebuilds the
+    ``sse_events`` list and event-stream ``response_body`` on read. With
+    ``"inline"`` (the default) both are also written into the ``requests``
+    row. Opening an existing database with ``"rows"`` for the first time
+    backfills its stream rows and then drops the inline copies, which cannot
+    be undone.
+
+    With a ``blobs`` store, request and response bodies larger than
+    ``blob_threshold`` bytes are written there and the row keeps only their
+    digest in ``request_body_ref``/``response_body_ref``. Summary and page
+    reads never touch them; ``get_request`` loads them off the event loop.
+
+    ``body_storage="delta"`` stores an LLM request body that repeats an
+    earlier turn of its conversation as a delta against that request (see
+    :mod:`agentprobe.storage.delta`) in ``request_body_delta``. Every read
+    that returns the body rebuilds it, byte for byte.
+
+    ``compression`` (``"none"``, ``"zlib"`` or ``"zstd"``) compresses the
+    body, header and inline stream columns with a
+    :class:`~agentprobe.storage.compression.ColumnCodec`. Size columns keep
+    the uncompressed sizes, and only reads that return a full request or
+    body decompress anything.
+
+    Aggregate stats come from the ``stats_counters`` table, which every
+    write method updates in its own transaction, so :meth:`get_stats` never
+    scans the requests. :attr:`changes` counts committed write
+    transactions, for pushing fresh stats to clients.
+
+    Completed flows are also rolled up per minute, hour and day (see
+    :mod:`agentprobe.storage.rollups`) in the same transactions. Rollups
+    older than ``rollup_retention`` seconds for their resolution are
+    pruned about once an hour; deleting requests leaves them alone.
+
+    Write transactions share one connection, so they are serialized by a
+    lock; :meth:`delete_requests` and :meth:`reclaim_space` take it too and
+    can run from a background task next to the capture writer.
+
+    Writes take the capture-path records from :mod:`agentprobe.storage.records`;
+    reads return the Pydantic models served by the API.
+    """
+
+    def __init__(
+        self,
+        sse_storage: str = "inline",
+        blobs: BlobStore | None = None,
+        blob_threshold: int = 64 * 1024,
+        body_storage: str = "full",
+        keyframe_interval: int = 32,
+        compression: str = "none",
+        rollup_retention: Mapping[str, float] | None = None,
+    ) -> None:
+        if sse_storage not in SSE_STORAGE_FORMATS:
+            raise ValueError(f"unknown SSE storage format: {sse_storage!r}")
+        if body_storage not in BODY_STORAGE_FORMATS:
+            raise ValueError(f"unknown body storage format: {body_storage!r}")
         self._db: aiosqlite.Connection | None = None
+        self._path: Path | None = None
+        self._sse_storage = sse_storage
+        self._blobs = blobs
+        self._blob_threshold = blob_threshold
+        self._deltas = DeltaEncoder(keyframe_interval) if body_storage == "delta" else None
+        self._codec = ColumnCodec(compression)
+        self._write_lock = asyncio.Lock()
+        self._last_write = time.monotonic()
+        self._changes = 0
+        self._rollup_retention = dict(
+            DEFAULT_ROLLUP_RETENTION if rollup_retention is None else rollup_retention
+        )
+        self._next_rollup_prune = 0.0
+
+    async def init(self, db_path: str | Path, read_only: bool = False) -> None:
+        """Open ``db_path``, creating and migrating it unless ``read_only``.
 
-    async def init(self, db_path: str | Path) -> None:
-        self._db = await aiosqlite.connect(str(db_path))
+        A read-only database must already be at the current schema version.
+        """
+        self._path = Path(db_path).resolve()
+        if read_only:
+            self._db = await aiosqlite.connect(f"{self._path.as_uri()}?mode=ro", uri=True)
+            self._db.row_factory = aiosqlite.Row
+            cursor = await self._db.execute("PRAGMA user_version")
+            if (await cursor.fetchone())[0] != len(MIGRATIONS):
+                await self.close()
+                raise RuntimeError(f"{self._path} needs migrating before it can be read")
+            await self._load_dictionaries()
+            return
+        self._db = await aiosqlite.connect(str(self._path))
         self._db.row_factory = aiosqlite.Row
+        # Only takes effect on a new, empty database; older ones keep reusing
+        # free pages but never shrink without a full VACUUM.
+        await self._db.execute("PRAGMA auto_vacuum=INCREMENTAL")
         await self._db.execute("PRAGMA journal_mode=WAL")
         await self._db.execute("PRAGMA foreign_keys=ON")
         await self._init_schema()
@@ -38,6 +205,106 @@ class Database:
         for stmt in SCHEMA_STATEMENTS:
             await db.execute(stmt)
         await db.commit()
+        await self._migrate()
+        await self._check_stats_counters()
+        await self._backfill_rollups()
+        await self._load_dictionaries()
+        await self._apply_sse_storage()
+
+    async def _check_stats_counters(self) -> None:
+        # Writes keep the counters exact; this catches databases whose rows
+        # were changed by other means, such as an older agentprobe.
+        db = self._get_db()
+        cursor = await db.execute(CHECK_STATS_COUNTERS)
+        if (await cursor.fetchone())[0]:
+            return
+        log.warning("stats counters disagree with the requests table, recounting")
+        for stmt in REBUILD_STATS_COUNTERS:
+            await db.execute(stmt)
+        await db.commit()
+
+    async def _backfill_rollups(self) -> None:
+        # Roll up flows captured before the rollups table existed, once.
+        if await self._get_meta("rollups") is not None:
+            return
+        db = self._get_db()
+        after = count = 0
+        while True:
+            cursor = await db.execute(
+                SELECT_ROLLUP_BACKFILL, {"after": after, "limit": _ROLLUP_BACKFILL_CHUNK}
+            )
+            rows = await cursor.fetchall()
+            if not rows:
+                break
+            rollups = RollupDelta()
+            for row in rows:
+                rollups.add(row)
+            await self._store_rollups(db, rollups)
+            after = rows[-1]["rowid"]
+            count += len(rows)
+        await db.execute(UPSERT_META, {"key": "rollups", "value": "1"})
+        await db.commit()
+        if count:
+            log.info("rolled up %d earlier requests", count)
+
+    async def _load_dictionaries(self) -> None:
+        cursor = await self._get_db().execute(SELECT_COMPRESSION_DICTIONARIES)
+        for dict_id, data in await cursor.fetchall():
+            self._codec.load_dictionary(dict_id, data)
+
+    async def _migrate(self) -> None:
+        db = self._get_db()
+        cursor = await db.execute("PRAGMA user_version")
+        version = (await cursor.fetchone())[0]
+        for number, statements in enumerate(MIGRATIONS[version:], start=version + 1):
+            for stmt in statements:
+                await db.execute(stmt)
+            await db.execute(f"PRAGMA user_version = {number}")
+            await db.commit()
+
+    async def _apply_sse_storage(self) -> None:
+        # Migrating to rows makes sure every inline stream has its rows before
+        # dropping the inline copies; migrating back needs nothing because
+        # reads rebuild whatever is missing.
+        previous = await self._get_meta("sse_storage")
+        if previous == self._sse_storage:
+            return
+        db = self._get_db()
+        if self._sse_storage == "rows":
+            await db.execute(BACKFILL_SSE_ROWS)
+            await self._backfill_compressed_sse()
+            await db.execute(COMPACT_INLINE_SSE)
+        await db.execute(UPSERT_META, {"key": "sse_storage", "value": self._sse_storage})
+        await db.commit()
+
+    async def _backfill_compressed_sse(self) -> None:
+        db = self._get_db()
+        cursor = await db.execute(SELECT_COMPRESSED_INLINE_SSE)
+        for request_id, timestamp, sse_events in await cursor.fetchall():
+            events = loads(self._codec.decompress(sse_events))
+            await db.executemany(
+                INSERT_SSE_EVENT,
+                [
+                    {
+                        "id": sse_event_id(request_id, index),
+                        "request_id": request_id,
+                        "event_index": index,
+                        "event_type": event.get("event", "message"),
+                        "data": event.get("data", ""),
+                        "timestamp": timestamp,
+                    }
+                    for index, event in enumerate(events)
+                ],
+            )
+
+    async def _get_meta(self, key: str) -> str | None:
+        cursor = await self._get_db().execute(SELECT_META, {"key": key})
+        row = await cursor.fetchone()
+        return row[0] if row else None
+
+    @property
+    def blobs(self) -> BlobStore | None:
+        return self._blobs
 
     def _get_db(self) -> aiosqlite.Connection:
         if self._db is None:
@@ -49,8 +316,20 @@ class Database:
             await self._db.close()
             self._db = None
 
-    def _serialize_request(self, req: CapturedRequest) -> dict[str, Any]:
-        return {
+    def _serialize_request(self, req: CaptureRecord) -> dict[str, Any]:
+        response_body, sse_events = self._stream_columns(
+            req.is_streaming, req.response_body, req.sse
+        )
+        request_body = req.request_body
+        request_body_delta = request_body_base = None
+        if self._deltas is not None:
+            encoded = self._deltas.encode(req.id, request_body)
+            if encoded is not None:
+                request_body_base, request_body_delta = encoded
+                request_body = None
+        request_body, request_body_ref = self._spill(request_body)
+        response_body, response_body_ref = self._spill(response_body)
+        params = {
             "id": req.id,
             "sequence": req.sequence,
             "timestamp": req.timestamp.isoformat(),
@@ -60,30 +339,166 @@ class Database:
             "url": req.url,
             "host": req.host,
             "path": req.path,
-            "request_headers": json.dumps(req.request_headers),
-            "request_body": req.request_body,
+            "request_headers": dumps_str(req.request_headers),
+            "request_body": request_body,
             "request_size": req.request_size,
             "status_code": req.status_code,
-            "response_headers": json.dumps(req.response_headers) if req.response_headers is not None else None,
-            "response_body": req.response_body,
+            "response_headers": dumps_str(req.response_headers)
+            if req.response_headers is not None
+            else None,
+            "response_body": response_body,
             "response_size": req.response_size,
-            "sse_events": json.dumps(req.sse_events) if req.sse_events is not None else None,
+            "sse_events": dumps_str(sse_events) if sse_events is not None else None,
+            "response_message": (
+                dumps_str(req.response_message) if req.response_message is not None else None
+            ),
             "duration_ms": req.duration_ms,
             "ttfb_ms": req.ttfb_ms,
+            "ttft_ms": req.ttft_ms,
+            "max_gap_ms": req.max_gap_ms,
+            "stall_count": req.stall_count,
+            "tokens_per_sec": req.tokens_per_sec,
+            "stream_timing": (
+                dumps_str(req.stream_timing) if req.stream_timing is not None else None
+            ),
             "protocol_type": req.protocol_type,
             "api_provider": req.api_provider,
+            "model": req.model,
             "session_id": req.session_id,
             "conversation_id": req.conversation_id,
             "is_streaming": 1 if req.is_streaming else 0,
+            "request_body_ref": request_body_ref,
+            "response_body_ref": response_body_ref,
+            "request_body_delta": request_body_delta,
+            "request_body_base": request_body_base,
         }
+        return self._compress_columns(params)
+
+    def _compress_columns(self, params: dict[str, Any]) -> dict[str, Any]:
+        codec = self._codec
+        for column in COMPRESSED_COLUMNS:
+            if column in params:
+                params[column] = codec.compress(params[column])
+        return params
+
+    def _decompress_columns(self, data: dict[str, Any]) -> dict[str, Any]:
+        codec = self._codec
+        for column in COMPRESSED_COLUMNS:
+            if column in data:
+                data[column] = codec.decompress(data[column])
+        return data
+
+    def _spill(self, body: str | None) -> tuple[str | None, str | None]:
+        """Return the inline body and blob ref columns for ``body``."""
+        # A str never encodes to fewer bytes than it has characters.
+        if self._blobs is None or body is None or len(body) * 4 <= self._blob_threshold:
+            return body, None
+        data = body.encode()
+        if len(data) <= self._blob_threshold:
+            return body, None
+        return None, self._blobs.put(data)
+
+    async def _read_blob(self, ref: str) -> str | None:
+        if self._blobs is None:
+            log.warning("request body %s is in the blob store, which is not configured", ref)
+            return None
+        try:
+            blob = await asyncio.to_thread(self._blobs.get, ref)
+        except FileNotFoundError:
+            log.warning("request body blob %s is missing", ref)
+            return None
+        return blob.decode("utf-8", errors="replace")
+
+    async def _rebuild_request_body(
+        self, db: aiosqlite.Connection, delta: str | bytes
+    ) -> str | None:
+        """Follow a delta chain back to its keyframe and replay it.
+
+        A chain that loops or runs past ``_MAX_DELTA_CHAIN`` steps, which no
+        encoder writes, is reported as a missing body.
+        """
+        chain = []
+        seen = set()
+        ref = None
+        body: str | bytes | None = None
+        while delta is not None:
+            step = loads(self._codec.decompress(delta))
+            if step["base"] in seen or len(chain) >= _MAX_DELTA_CHAIN:
+                log.warning("request body delta chain through %s is broken", step["base"])
+                return None
+            seen.add(step["base"])
+            chain.append(step)
+            cursor = await db.execute(SELECT_REQUEST_BODY, {"id": step["base"]})
+            row = await cursor.fetchone()
+            if row is None:
+                log.warning("request body base %s is missing", step["base"])
+                return None
+            body, ref, delta = row
+        body = self._codec.decompress(body)
+        if ref is not None:
+            body = await self._read_blob(ref)
+        if body is None:
+            return None
+        return await asyncio.to_thread(_replay_deltas, body, chain)
+
+    def _prepare_writes(
+        self, requests: list[CaptureRecord], updates: list[tuple[str, dict[str, Any]]]
+    ) -> tuple[list[dict[str, Any]], list[tuple[str, dict[str, object]]]]:
+        inserts = [self._serialize_request(r) for r in requests]
+        statements = [
+            build_update_query(self._serialize_fields(fields), request_id)
+            for request_id, fields in updates
+        ]
+        return inserts, statements
+
+    def _stream_columns(
+        self, is_streaming: bool, response_body: str | None, sse: SSEBatch | None
+    ) -> tuple[str | None, list[dict] | None]:
+        """Return the ``response_body`` and ``sse_events`` column values to store."""
+        if not is_streaming or sse is None:
+            return response_body, None
+        if self._sse_storage == "rows":
+            return None, None
+        sse_events = sse.to_dicts()
+        if response_body is None:
+            response_body = format_sse_events(sse_events)
+        return response_body, sse_events
+
+    def _serialize_fields(self, fields: dict[str, Any]) -> dict[str, Any]:
+        if "sse_events" in fields:
+            response_body, sse_events = self._stream_columns(
+                bool(fields.get("is_streaming")),
+                fields.get("response_body"),
+                fields["sse_events"],
+            )
+            fields = {**fields, "response_body": response_body, "sse_events": sse_events}
+        for part in BODY_PARTS:
+            key = f"{part}_body"
+            if key in fields:
+                body, ref = self._spill(fields[key])
+                fields = {**fields, key: body, f"{key}_ref": ref}
+        serialized: dict[str, Any] = {}
+        for key, value in fields.items():
+            if key in _JSON_COLUMNS and value is not None:
+                serialized[key] = dumps_str(value)
+            elif key == "is_streaming":
+                serialized[key] = 1 if value else 0
+            elif key == "timestamp" and isinstance(value, datetime):
+                serialized[key] = value.isoformat()
+            else:
+                serialized[key] = value
+        return self._compress_columns(serialized)
 
     def _deserialize_request(self, row: aiosqlite.Row) -> CapturedRequest:
-        data = dict(row)
-        data["request_headers"] = json.loads(data["request_headers"])
+        data = self._decompress_columns(dict(row))
+        data["request_headers"] = loads(data["request_headers"])
         if data["response_headers"] is not None:
-            data["response_headers"] = json.loads(data["response_headers"])
+            data["response_headers"] = loads(data["response_headers"])
         if data["sse_events"] is not None:
-            data["sse_events"] = json.loads(data["sse_events"])
+            data["sse_events"] = loads(data["sse_events"])
+        for column in ("response_message", "stream_timing"):
+            if data[column] is not None:
+                data[column] = loads(data[column])
         data["is_streaming"] = bool(data["is_streaming"])
         data["timestamp"] = datetime.fromisoformat(data["timestamp"])
         return CapturedRequest.model_validate(data)
@@ -94,63 +509,222 @@ class Database:
         data["timestamp"] = datetime.fromisoformat(data["timestamp"])
         return RequestSummary.model_validate(data)
 
+    def _summary_dict(self, row: aiosqlite.Row) -> dict[str, Any]:
+        data = dict(row)
+        data["is_streaming"] = bool(data["is_streaming"])
+        timestamp = data["timestamp"]
+        if timestamp.endswith("+00:00"):
+            data["timestamp"] = timestamp[:-6] + "Z"
+        return data
+
+    def _export_dict(self, row: aiosqlite.Row) -> dict[str, Any]:
+        data = self._decompress_columns(dict(row))
+        sse_rows = data.pop("sse_rows")
+        data["request_headers"] = loads(data["request_headers"])
+        if data["response_headers"] is not None:
+            data["response_headers"] = loads(data["response_headers"])
+        if data["sse_events"] is not None:
+            data["sse_events"] = loads(data["sse_events"])
+        elif sse_rows is not None:
+            data["sse_events"] = loads(sse_rows)
+            data["response_body"] = format_sse_events(data["sse_events"])
+        for column in ("response_message", "stream_timing"):
+            if data[column] is not None:
+                data[column] = loads(data[column])
+        data["is_streaming"] = bool(data["is_streaming"])
+        timestamp = data["timestamp"]
+        if timestamp.endswith("+00:00"):
+            data["timestamp"] = timestamp[:-6] + "Z"
+        return data
+
     def _deserialize_sse_event(self, row: aiosqlite.Row) -> SSEEvent:
         data = dict(row)
         data["timestamp"] = datetime.fromisoformat(data["timestamp"])
         return SSEEvent.model_validate(data)
 
-    async def save_request(self, request: CapturedRequest) -> None:
-        db = self._get_db()
-        params = self._serialize_request(request)
-        await db.execute(INSERT_REQUEST, params)
-        await db.commit()
+    async def save_request(self, request: CaptureRecord) -> None:
+        await self.write_batch([request], [], [])
 
-    async def save_sse_event(self, event: SSEEvent) -> None:
-        db = self._get_db()
-        params = {
-            "id": event.id,
-            "request_id": event.request_id,
-            "event_index": event.event_index,
-            "event_type": event.event_type,
-            "data": event.data,
-            "timestamp": event.timestamp.isoformat(),
-        }
-        await db.execute(INSERT_SSE_EVENT, params)
-        await db.commit()
-
-    async def save_sse_events(self, events: list[SSEEvent]) -> None:
-        if not events:
+    async def save_sse_batch(self, request_id: str, batch: SSEBatch) -> None:
+        if not batch:
             return
         db = self._get_db()
-        params_list = [
-            {
-                "id": event.id,
-                "request_id": event.request_id,
-                "event_index": event.event_index,
-                "event_type": event.event_type,
-                "data": event.data,
-                "timestamp": event.timestamp.isoformat(),
-            }
-            for event in events
-        ]
-        await db.executemany(INSERT_SSE_EVENT, params_list)
-        await db.commit()
+        async with self._write_lock:
+            await db.executemany(INSERT_SSE_EVENT, batch.rows(request_id))
+            await self._commit()
 
     async def update_request(self, request_id: str, fields: dict[str, Any]) -> None:
+        await self.write_batch([], [(request_id, fields)], [])
+
+    async def _commit(self) -> None:
+        await self._get_db().commit()
+        self._changes += 1
+        self._last_write = time.monotonic()
+
+    @property
+    def changes(self) -> int:
+        """Write transactions committed since :meth:`init`."""
+        return self._changes
+
+    @property
+    def idle_seconds(self) -> float:
+        """Seconds since the last committed write."""
+        return time.monotonic() - self._last_write
+
+    async def _save_dictionaries(self) -> int:
+        """Insert newly trained compression dictionaries ahead of the rows using them.
+
+        Returns how many were inserted; drop them from ``unsaved`` only after
+        the transaction commits.
+        """
+        dictionaries = list(self._codec.unsaved)
+        if dictionaries:
+            await self._get_db().executemany(INSERT_COMPRESSION_DICTIONARY, dictionaries)
+        return len(dictionaries)
+
+    async def write_batch(
+        self,
+        requests: list[CaptureRecord],
+        updates: list[tuple[str, dict[str, Any]]],
+        sse_batches: list[tuple[str, SSEBatch]],
+        search_docs: Sequence[SearchDocument] = (),
+    ) -> None:
+        """Apply inserts, updates, SSE rows and search documents in one transaction.
+
+        The order keeps updates and SSE rows behind the insert of the request
+        they belong to, whether that insert is in this batch or an earlier one.
+        """
+        async with self._write_lock:
+            await self._write_batch(requests, updates, sse_batches, search_docs)
+
+    async def _write_batch(
+        self,
+        requests: list[CaptureRecord],
+        updates: list[tuple[str, dict[str, Any]]],
+        sse_batches: list[tuple[str, SSEBatch]],
+        search_docs: Sequence[SearchDocument],
+    ) -> None:
         db = self._get_db()
-        serialized: dict[str, Any] = {}
-        for key, value in fields.items():
-            if key in ("request_headers", "response_headers", "sse_events") and value is not None:
-                serialized[key] = json.dumps(value)
-            elif key == "is_streaming":
-                serialized[key] = 1 if value else 0
-            elif key == "timestamp" and isinstance(value, datetime):
-                serialized[key] = value.isoformat()
+        try:
+            if (requests or updates) and (
+                self._blobs is not None or self._deltas is not None or self._codec.method != "none"
+            ):
+                # Spilling bodies to the blob store is file I/O, and delta encoding
+                # and compression are CPU-bound; keep all of them off the loop.
+                inserts, statements = await asyncio.to_thread(
+                    self._prepare_writes, requests, updates
+                )
             else:
-                serialized[key] = value
-        sql, params = build_update_query(serialized, request_id)
-        await db.execute(sql, params)
-        await db.commit()
+                inserts, statements = self._prepare_writes(requests, updates)
+            saved = await self._save_dictionaries()
+            stats, rollups, sessions = await self._count_writes(db, inserts, updates)
+            if inserts:
+                await db.executemany(INSERT_REQUEST, inserts)
+            for sql, params in statements:
+                await db.execute(sql, params)
+            if stats:
+                await db.executemany(UPSERT_STATS_COUNTER, stats.params())
+            if sessions:
+                await db.executemany(UPSERT_SESSION_STATS, sessions.params())
+            if rollups:
+                await self._store_rollups(db, rollups)
+            await self._prune_rollups(db)
+            for request_id, batch in sse_batches:
+                if batch:
+                    await db.executemany(INSERT_SSE_EVENT, batch.rows(request_id))
+            if search_docs:
+                await db.executemany(
+                    INSERT_SEARCH_DOC,
+                    [
+                        {"request_id": r, "prompt": p, "tools": t, "response": s}
+                        for r, p, t, s in search_docs
+                    ],
+                )
+            await self._commit()
+        except Exception:
+            await db.rollback()
+            if self._deltas is not None:
+                self._deltas.rollback()
+            raise
+        if self._deltas is not None:
+            self._deltas.commit()
+        del self._codec.unsaved[:saved]
+
+    async def _count_writes(
+        self,
+        db: aiosqlite.Connection,
+        inserts: list[dict[str, Any]],
+        updates: list[tuple[str, dict[str, Any]]],
+    ) -> tuple[StatsDelta, RollupDelta, SessionDelta]:
+        """Counter, rollup and session changes of a batch, read before its statements run.
+
+        A flow is rolled up when it completes: when it is inserted or
+        updated with a ``duration_ms``.
+        """
+        stats = StatsDelta()
+        rollups = RollupDelta()
+        sessions = SessionDelta()
+        rows: dict[str, dict[str, Any]] = {}
+        for params in inserts:
+            row = rows[params["id"]] = source_row(params)
+            stats.add(row)
+            sessions.add(row)
+            if row["duration_ms"] is not None:
+                rollups.add(row)
+        counted = [
+            (request_id, fields)
+            for request_id, fields in updates
+            if any(column in fields for column in STATS_SOURCE_COLUMNS)
+        ]
+        earlier = sorted({request_id for request_id, _ in counted} - rows.keys())
+        if earlier:
+            cursor = await db.execute(*build_stats_source_query(earlier))
+            for row in await cursor.fetchall():
+                rows[row["id"]] = dict(row)
+        for request_id, fields in counted:
+            old = rows.get(request_id)
+            # Updates of rows that do not exist change nothing.
+            if old is None:
+                continue
+            new = {**old, **{c: fields[c] for c in STATS_SOURCE_COLUMNS if c in fields}}
+            stats.replace(old, new)
+            sessions.replace(old, new)
+            if old["duration_ms"] is None and new["duration_ms"] is not None:
+                rollups.add(new)
+            rows[request_id] = new
+        return stats, rollups, sessions
+
+    async def _store_rollups(self, db: aiosqlite.Connection, rollups: RollupDelta) -> None:
+        """Merge the batch's rollups into the stored ones."""
+        merged = rollups.rollups()
+        keys = list(merged)
+        for start in range(0, len(keys), _ROLLUP_KEYS_PER_QUERY):
+            chunk = keys[start : start + _ROLLUP_KEYS_PER_QUERY]
+            cursor = await db.execute(*build_rollup_keys_query(chunk))
+            for row in await cursor.fetchall():
+                key = (row["resolution"], row["dimension"], row["key"], row["bucket"])
+                merged[key].merge(Rollup.from_row(row))
+        await db.executemany(
+            UPSERT_ROLLUP,
+            [
+                {
+                    "resolution": resolution,
+                    "dimension": dimension,
+                    "key": key,
+                    "bucket": bucket,
+                    **rollup.params(),
+                }
+                for (resolution, dimension, key, bucket), rollup in merged.items()
+            ],
+        )
+
+    async def _prune_rollups(self, db: aiosqlite.Connection) -> None:
+        if time.monotonic() < self._next_rollup_prune:
+            return
+        self._next_rollup_prune = time.monotonic() + _ROLLUP_PRUNE_INTERVAL
+        now = time.time()
+        for resolution, seconds in self._rollup_retention.items():
+            await db.execute(PRUNE_ROLLUPS, {"resolution": resolution, "before": now - seconds})
 
     async def get_request(self, request_id: str) -> CapturedRequest | None:
         db = self._get_db()
@@ -158,7 +732,22 @@ class Database:
         row = await cursor.fetchone()
         if row is None:
             return None
-        return self._deserialize_request(row)
+        request = self._deserialize_request(row)
+        if row["request_body_delta"] is not None:
+            request.request_body = await self._rebuild_request_body(db, row["request_body_delta"])
+        if request.request_body_ref is not None:
+            request.request_body = await self._read_blob(request.request_body_ref)
+        if request.response_body_ref is not None:
+            request.response_body = await self._read_blob(request.response_body_ref)
+        if request.is_streaming and request.sse_events is None:
+            events = await self.get_sse_events(request_id)
+            request.sse_events = [{"event": e.event_type, "data": e.data} for e in events]
+            request.response_body = format_sse_events(request.sse_events)
+        return request
+
+    async def request_exists(self, request_id: str) -> bool:
+        cursor = await self._get_db().execute(SELECT_REQUEST_EXISTS, {"id": request_id})
+        return await cursor.fetchone() is not None
 
     async def list_requests(
         self,
@@ -168,11 +757,124 @@ class Database:
         offset: int = 0,
     ) -> list[RequestSummary]:
         db = self._get_db()
-        sql, params = build_list_query(filters=filters, order_by=order_by, limit=limit, offset=offset)
+        sql, params = build_list_query(
+            filters=filters, order_by=order_by, limit=limit, offset=offset
+        )
         cursor = await db.execute(sql, params)
         rows = await cursor.fetchall()
         return [self._deserialize_summary(row) for row in rows]
 
+    async def list_summary_page(
+        self,
+        filters: dict[str, Any] | None = None,
+        after: tuple[int, int] | None = None,
+        limit: int = 100,
+    ) -> tuple[list[dict[str, Any]], tuple[int, int] | None]:
+        """Return one newest-first page of summaries and the key of the next one.
+
+        ``after`` is the key returned with the previous page; the returned
+        key is ``None`` once there are no older rows.
+        """
+        rows = await self.page_rows(filters, after, limit + 1)
+        next_key = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_key = (rows[-1]["sequence"], rows[-1]["rowid"])
+        for row in rows:
+            del row["rowid"]
+        return rows, next_key
+
+    async def page_rows(
+        self,
+        filters: dict[str, Any] | None = None,
+        after: tuple[int, int] | None = None,
+        limit: int = 100,
+    ) -> list[dict[str, Any]]:
+        """Up to ``limit`` summaries older than ``after``, newest first, each with its ``rowid``."""
+        sql, params = build_page_query(filters=filters, after=after, limit=limit)
+        cursor = await self._get_db().execute(sql, params)
+        return [self._summary_dict(row) for row in await cursor.fetchall()]
+
+    async def search_summaries(
+        self,
+        match: str,
+        filters: dict[str, Any] | None = None,
+        limit: int = 100,
+        with_rank: bool = False,
+    ) -> list[dict[str, Any]]:
+        """Summaries matching an FTS5 expression, best first, each with a ``snippet``.
+
+        ``with_rank`` keeps the bm25 ``rank`` (lower is better) in each summary.
+        """
+        db = self._get_db()
+        sql, params = build_search_query(match, filters=filters, limit=limit)
+        cursor = await db.execute(sql, params)
+        summaries = [self._summary_dict(row) for row in await cursor.fetchall()]
+        if not with_rank:
+            for summary in summaries:
+                del summary["rank"]
+        return summaries
+
+    async def iter_request_dicts(
+        self, filters: dict[str, Any] | None = None, chunk_size: int = 64
+    ) -> AsyncIterator[dict[str, Any]]:
+        """Yield every matching full request, oldest first, as a plain dict.
+
+        Reads through a separate read-only connection, so a long export sees
+        one consistent snapshot and never queues behind or ahead of capture
+        writes. Only ``chunk_size`` rows are held at a time.
+        """
+        if self._path is None:
+            raise RuntimeError("Database not initialized. Call init() first.")
+        sql, params = build_export_query(filters)
+        uri = f"{self._path.as_uri()}?mode=ro"
+        async with aiosqlite.connect(uri, uri=True) as conn:
+            conn.row_factory = aiosqlite.Row
+            async with conn.execute(sql, params) as cursor:
+                while rows := await cursor.fetchmany(chunk_size):
+                    for row in rows:
+                        data = self._export_dict(row)
+                        delta = data.pop("request_body_delta")
+                        if delta is not None:
+                            data["request_body"] = await self._rebuild_request_body(conn, delta)
+                        for part in BODY_PARTS:
+                            ref = data[f"{part}_body_ref"]
+                            if ref is not None:
+                                data[f"{part}_body"] = await self._read_blob(ref)
+                        yield data
+
+    async def get_body_columns(self, request_id: str, part: str) -> dict[str, Any] | None:
+        """Return the raw ``body``, blob ``ref`` and ``headers`` of one side of a request.
+
+        The body of a stream stored as rows is rebuilt here, since it has no
+        column of its own.
+        """
+        if part not in BODY_PARTS:
+            raise ValueError(f"unknown body part: {part!r}")
+        cursor = await self._get_db().execute(SELECT_BODY_COLUMNS, {"id": request_id})
+        row = await cursor.fetchone()
+        if row is None:
+            return None
+        row = self._decompress_columns(dict(row))
+        headers = row[f"{part}_headers"]
+        body = row[f"{part}_body"]
+        ref = row[f"{part}_body_ref"]
+        if part == "request" and row["request_body_delta"] is not None:
+            body = await self._rebuild_request_body(self._get_db(), row["request_body_delta"])
+        elif part == "response" and row["is_streaming"] and body is None and ref is None:
+            events = await self.get_sse_events(request_id)
+            body = format_sse_events([{"event": e.event_type, "data": e.data} for e in events])
+        return {
+            "body": body,
+            "ref": ref,
+            "headers": loads(headers) if headers is not None else {},
+        }
+
+    async def max_sequence(self) -> int:
+        cursor = await self._get_db().execute(SELECT_MAX_SEQUENCE)
+        row = await cursor.fetchone()
+        return row[0] or 0
+
     async def get_sse_events(self, request_id: str) -> list[SSEEvent]:
         db = self._get_db()
         cursor = await db.execute(SELECT_SSE_EVENTS_BY_REQUEST, {"request_id": request_id})
@@ -181,31 +883,204 @@ class Database:
 
     async def clear_all(self) -> None:
         db = self._get_db()
-        await db.execute(DELETE_ALL_SSE_EVENTS)
-        await db.execute(DELETE_ALL_REQUESTS)
-        await db.commit()
+        async with self._write_lock:
+            await db.execute(DELETE_ALL_SSE_EVENTS)
+            await db.execute(DELETE_ALL_SEARCH_DOCS)
+            await db.execute(DELETE_ALL_REQUESTS)
+            await db.execute(DELETE_ALL_ROLLUPS)
+            await db.execute(DELETE_ALL_SESSION_STATS)
+            for stmt in REBUILD_STATS_COUNTERS:
+                await db.execute(stmt)
+            await self._commit()
+            if self._deltas is not None:
+                self._deltas.forget()
+            if self._blobs is not None:
+                await asyncio.to_thread(self._blobs.clear)
+
+    async def prune_candidates(
+        self,
+        max_requests: int | None = None,
+        max_age: float | None = None,
+        max_bytes: int | None = None,
+        limit: int = 200,
+    ) -> list[str]:
+        """Ids of the oldest requests that break a retention limit, at most ``limit``.
+
+        ``max_age`` is in seconds. ``max_bytes`` bounds the captured request
+        plus response bytes, as counted by ``request_size``/``response_size``.
+        """
+        db = self._get_db()
+        cursor = await db.execute(SELECT_RETENTION_TOTALS)
+        count, total_bytes = await cursor.fetchone()
+        excess_rows = count - max_requests if max_requests is not None else 0
+        excess_bytes = total_bytes - max_bytes if max_bytes is not None else 0
+        cutoff = None
+        if max_age is not None:
+            cutoff = (datetime.now(UTC) - timedelta(seconds=max_age)).isoformat()
+        if excess_rows <= 0 and excess_bytes <= 0 and cutoff is None:
+            return []
+        cursor = await db.execute(SELECT_OLDEST_REQUESTS, {"limit": limit})
+        ids = []
+        for request_id, timestamp, size in await cursor.fetchall():
+            if excess_rows > 0 or excess_bytes > 0 or (cutoff is not None and timestamp < cutoff):
+                ids.append(request_id)
+                excess_rows -= 1
+                excess_bytes -= size
+            else:
+                break
+        return ids
+
+    async def delete_requests(self, ids: list[str]) -> dict[str, int]:
+        """Delete requests with their SSE rows, search documents and unshared blobs.
+
+        Requests outside ``ids`` whose body is a delta on one of them get
+        their full body written back first. Returns how many rows were
+        ``deleted`` and ``rebased`` and how many ``blobs`` were removed.
+        """
+        result = {"deleted": 0, "rebased": 0, "blobs": 0}
+        if not ids:
+            return result
+        db = self._get_db()
+        queries = build_delete_queries(ids)
+        async with self._write_lock:
+            try:
+                cursor = await db.execute(*queries["dependents"])
+                for request_id, delta in await cursor.fetchall():
+                    body = await self._rebuild_request_body(db, delta)
+                    body, ref = await asyncio.to_thread(self._spill, body)
+                    params = {
+                        "id": request_id,
+                        "request_body": self._codec.compress(body),
+                        "request_body_ref": ref,
+                    }
+                    await db.execute(REBASE_REQUEST_BODY, params)
+                    result["rebased"] += 1
+                cursor = await db.execute(*queries["refs"])
+                refs = {ref for row in await cursor.fetchall() for ref in row if ref is not None}
+                stats = StatsDelta()
+                sessions = SessionDelta()
+                cursor = await db.execute(*build_stats_source_query(ids))
+                for row in await cursor.fetchall():
+                    stats.add(row, -1)
+                    sessions.add(row, -1)
+                await db.execute(*queries["search"])
+                cursor = await db.execute(*queries["requests"])
+                result["deleted"] = cursor.rowcount
+                if stats:
+                    await db.executemany(UPSERT_STATS_COUNTER, stats.params())
+                if sessions:
+                    await db.executemany(UPSERT_SESSION_STATS, sessions.params())
+                    await db.execute(DELETE_EMPTY_SESSION_STATS)
+                orphans = sorted(refs - await self.referenced_blobs(sorted(refs)))
+                await self._commit()
+            except Exception:
+                await db.rollback()
+                raise
+            if self._deltas is not None:
+                self._deltas.forget(set(ids))
+            if orphans and self._blobs is not None:
+                await asyncio.to_thread(_delete_blobs, self._blobs, orphans)
+                result["blobs"] = len(orphans)
+        return result
+
+    async def reclaim_space(self) -> int:
+        """Return free pages to the filesystem and truncate the WAL.
+
+        Returns the number of bytes by which the database and WAL files
+        shrank. Incremental vacuum only frees pages in databases created
+        with ``auto_vacuum=INCREMENTAL``, which :meth:`init` sets for new ones.
+        """
+        if self._path is None:
+            raise RuntimeError("Database not initialized. Call init() first.")
+        db = self._get_db()
+        async with self._write_lock:
+            before = _file_sizes(self._path)
+            # The pragma frees one page per step; executescript runs it to the end.
+            await db.executescript("PRAGMA incremental_vacuum;")
+            await db.execute_fetchall("PRAGMA wal_checkpoint(TRUNCATE)")
+            return before - _file_sizes(self._path)
 
     async def get_stats(self) -> dict[str, Any]:
+        return summarize_stats([await self.stats_parts()])
+
+    async def stats_parts(self) -> dict[str, Any]:
+        """Counters that :meth:`get_stats` derives its figures from.
+
+        Unlike the figures themselves, these can be summed across databases
+        with :func:`summarize_stats`. Also carries the sequence and
+        timestamp bounds.
+        """
         db = self._get_db()
-        cursor = await db.execute(STATS_QUERY)
-        row = await cursor.fetchone()
-        if row is None:
-            return {
-                "total_requests": 0,
-                "unique_hosts": 0,
-                "unique_agents": 0,
-                "total_request_bytes": 0,
-                "total_response_bytes": 0,
-                "avg_duration_ms": None,
-                "streaming_count": 0,
-            }
-        data = dict(row)
-        return {
-            "total_requests": data["total_requests"] or 0,
-            "unique_hosts": data["unique_hosts"] or 0,
-            "unique_agents": data["unique_agents"] or 0,
-            "total_request_bytes": data["total_request_bytes"] or 0,
-            "total_response_bytes": data["total_response_bytes"] or 0,
-            "avg_duration_ms": data["avg_duration_ms"],
-            "streaming_count": data["streaming_count"] or 0,
-        }
+        cursor = await db.execute(SELECT_REQUEST_BOUNDS)
+        parts: dict[str, Any] = dict(await cursor.fetchone())
+        parts.update(dict.fromkeys(TOTAL_COLUMNS, 0))
+        parts["counts"] = {dimension: {} for dimension in STATS_DIMENSIONS}
+        cursor = await db.execute(SELECT_STATS_COUNTERS)
+        for row in await cursor.fetchall():
+            if row["dimension"] == "total":
+                parts.update({name: row[column] for name, column in TOTAL_COLUMNS.items()})
+            elif row["key"]:
+                parts["counts"][row["dimension"]][row["key"]] = row["requests"]
+        return parts
+
+    async def get_rollups(
+        self,
+        resolution: str,
+        dimension: str,
+        key: str | None,
+        start: int,
+        end: int,
+    ) -> list[tuple[str, int, Rollup]]:
+        """``(key, bucket, rollup)`` for buckets starting in ``[start, end)`` epoch seconds."""
+        cursor = await self._get_db().execute(
+            *build_rollup_range_query(resolution, dimension, key, start, end)
+        )
+        return [
+            (row["key"], row["bucket"], Rollup.from_row(row)) for row in await cursor.fetchall()
+        ]
+
+    async def get_sessions(
+        self, limit: int = 100, agent_type: str | None = None, ids: list[str] | None = None
+    ) -> list[dict[str, Any]]:
+        """``session_stats`` rows, most recently active first."""
+        cursor = await self._get_db().execute(*build_sessions_query(limit, agent_type, ids))
+        return [dict(row) for row in await cursor.fetchall()]
+
+    async def blob_refs(self) -> set[str]:
+        cursor = await self._get_db().execute(SELECT_BLOB_REFS)
+        return {row[0] for row in await cursor.fetchall()}
+
+    @asynccontextmanager
+    async def write_locked(self) -> AsyncIterator[None]:
+        """Hold off this database's writes, e.g. while deleting blobs it might store again."""
+        async with self._write_lock:
+            yield
+
+    async def referenced_blobs(self, refs: list[str]) -> set[str]:
+        """Those of ``refs`` that some request in this database points at."""
+        if not refs:
+            return set()
+        cursor = await self._get_db().execute(*build_referenced_blobs_query(refs))
+        return {row[0] for row in await cursor.fetchall()}
+
+
+def _replay_deltas(body: str, chain: list[dict[str, Any]]) -> str:
+    obj = loads(body)
+    for step in reversed(chain):
+        obj = apply_delta(obj, step)
+    return dumps_str(obj)
+
+
+def _delete_blobs(store: BlobStore, refs: list[str]) -> None:
+    for ref in refs:
+        store.delete(ref)
+
+
+def _file_sizes(path: Path) -> int:
+    size = 0
+    for candidate in (path, path.with_name(path.name + "-wal")):
+        try:
+            size += candidate.stat().st_size
+        except FileNotFoundError:
+            pass
+    return size
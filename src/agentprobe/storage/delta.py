@@ -0,0 +1,179 @@
+"""Delta encoding of LLM request bodies across conversation turns.
+
+Coding agents resend the whole conversation on every call, so turn ``n``
+repeats the system prompt, the tool definitions and the ``n - 1`` earlier
+turns verbatim. :class:`DeltaEncoder` stores such a body as a reference to an
+earlier request whose message list is a prefix of this one, plus the appended
+messages and whichever other top-level fields changed.
+
+The message list is the one the provider parsers read: ``messages`` for
+Anthropic and OpenAI chat, ``input`` for the OpenAI Responses API and
+``contents`` for Gemini.
+"""
+
+from __future__ import annotations
+
+import hashlib
+from collections import OrderedDict
+from typing import Any, NamedTuple
+
+from agentprobe.serialization import dumps, loads
+
+_MESSAGE_KEYS = ("messages", "input", "contents")
+
+# Below this size a delta cannot save enough to pay for reconstructing it.
+_MIN_BODY_SIZE = 1024
+
+
+class _Base(NamedTuple):
+    request_id: str
+    depth: int
+    fields: dict[str, bytes]
+
+
+class DeltaEncoder:
+    """Turns request bodies into deltas against earlier requests.
+
+    A body is only delta-encoded when re-encoding its parsed JSON gives back
+    exactly the same bytes, which holds for the compact JSON agents send;
+    anything else is stored in full, so reconstruction is lossless. Chains
+    are cut by a full keyframe every ``keyframe_interval`` turns to keep
+    reads short. Only the last ``memory`` requests can serve as a base, and
+    nothing is remembered across restarts.
+
+    Bodies encoded since the last :meth:`commit` are pending: they can serve
+    as bases within the same transaction, and become lasting bases when it
+    commits. :meth:`rollback` forgets them, so a row that never reached the
+    database is never a base, and a retried request never finds itself.
+    """
+
+    def __init__(self, keyframe_interval: int = 32, memory: int = 1024) -> None:
+        self._keyframe_interval = max(1, keyframe_interval)
+        self._memory = memory
+        # Chain hash of a request's whole message list -> that request.
+        self._bases: OrderedDict[bytes, _Base] = OrderedDict()
+        # Likewise for bodies encoded in the transaction under way.
+        self._pending: dict[bytes, _Base] = {}
+
+    def encode(self, request_id: str, body: str | None) -> tuple[str, str] | None:
+        """Return the base request id and the delta to store instead of ``body``.
+
+        Returns ``None`` when ``body`` should be stored in full.
+        """
+        if body is None or len(body) < _MIN_BODY_SIZE or not body.startswith("{"):
+            return None
+        try:
+            obj = loads(body)
+        except ValueError:
+            return None
+        key = _message_key(obj)
+        if key is None:
+            return None
+        encoded = body.encode()
+        if dumps(obj) != encoded:
+            return None
+
+        messages = obj[key]
+        hashes = _chain_hashes(messages)
+        fields = {name: _digest(value) for name, value in obj.items() if name != key}
+        # Longest earlier message list that is a prefix of this one.
+        base = None
+        keep = 0
+        for keep in range(len(messages), 0, -1):
+            chain_hash = hashes[keep - 1]
+            base = self._pending.get(chain_hash) or self._bases.get(chain_hash)
+            if base is not None and base.request_id != request_id:
+                break
+            base = None
+
+        delta: bytes | None = None
+        depth = 0
+        if base is not None and base.depth + 1 < self._keyframe_interval:
+            delta = dumps(
+                {
+                    "base": base.request_id,
+                    "key": key,
+                    "keep": keep,
+                    "append": messages[keep:],
+                    "keys": list(obj),
+                    "set": {
+                        name: obj[name]
+                        for name, digest in fields.items()
+                        if base.fields.get(name) != digest
+                    },
+                }
+            )
+            if len(delta) < len(encoded):
+                depth = base.depth + 1
+            else:
+                delta = None
+        if hashes:
+            self._pending[hashes[-1]] = _Base(request_id, depth, fields)
+        if delta is None:
+            return None
+        return base.request_id, delta.decode()
+
+    def commit(self) -> None:
+        """Keep the bodies encoded since the last call as bases; their rows have committed."""
+        for chain_hash, base in self._pending.items():
+            self._remember(chain_hash, base)
+        self._pending.clear()
+
+    def rollback(self) -> None:
+        """Forget the bodies encoded since the last commit; their rows were not written."""
+        self._pending.clear()
+
+    def forget(self, request_ids: set[str] | None = None) -> None:
+        """Stop using ``request_ids`` as bases, e.g. once they are deleted; all if ``None``."""
+        if request_ids is None:
+            self._bases.clear()
+            self._pending.clear()
+            return
+        for bases in (self._bases, self._pending):
+            for chain_hash, base in list(bases.items()):
+                if base.request_id in request_ids:
+                    del bases[chain_hash]
+
+    def _remember(self, chain_hash: bytes, base: _Base) -> None:
+        self._bases[chain_hash] = base
+        self._bases.move_to_end(chain_hash)
+        while len(self._bases) > self._memory:
+            self._bases.popitem(last=False)
+
+
+def apply_delta(base: dict[str, Any], delta: dict[str, Any]) -> dict[str, Any]:
+    """Rebuild a request body from the parsed body of its base and its delta."""
+    key = delta["key"]
+    changed = delta["set"]
+    body: dict[str, Any] = {}
+    for name in delta["keys"]:
+        if name == key:
+            body[name] = base[key][: delta["keep"]] + delta["append"]
+        elif name in changed:
+            body[name] = changed[name]
+        else:
+            body[name] = base[name]
+    return body
+
+
+def _message_key(obj: Any) -> str | None:
+    if not isinstance(obj, dict):
+        return None
+    for key in _MESSAGE_KEYS:
+        if isinstance(obj.get(key), list):
+            return key
+    return None
+
+
+def _chain_hashes(messages: list[Any]) -> list[bytes]:
+    """``hashes[i]`` identifies ``messages[: i + 1]``."""
+    hashes = []
+    digest = b""
+    for message in messages:
+        digest = hashlib.sha256(digest + dumps(message)).digest()
+        hashes.append(digest)
+    return hashes
+
+
+def _digest(value: Any) -> bytes:
+    return hashlib.sha256(dumps(value)).digest()
@@ -0,0 +1,208 @@
+"""Background stage that parses finished flows into typed request columns."""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Any
+
+from agentprobe.parser.enrich import enrich_flow, enrich_request
+
+if TYPE_CHECKING:
+    from agentprobe.storage.database import Database
+    from agentprobe.storage.partitions import PartitionedDatabase
+    from agentprobe.storage.records import CaptureRecord
+    from agentprobe.storage.writer import CaptureWriter
+
+log = logging.getLogger(__name__)
+
+# (request id, protocol_type, host, session id, conversation id, request body,
+#  response body, SSE data, reassembled message)
+_Flow = tuple[
+    str,
+    str,
+    str,
+    str | None,
+    str | None,
+    str | None,
+    str | None,
+    list[str | None],
+    dict[str, Any] | None,
+]
+
+
+class EnrichmentWorker:
+    """Runs the protocol parsers over finished flows, off the proxy hooks.
+
+    Flows handed to :meth:`submit` are queued and parsed by ``workers``
+    tasks, ``batch_size`` at a time, in a pool of as many threads. The
+    columns found (see :data:`agentprobe.parser.enrich.ENRICHED_COLUMNS`,
+    and :func:`~agentprobe.parser.enrich.enrich_request` for request bodies
+    the proxy hook did not parse) go back through ``writer`` as an update
+    that also sets ``enriched``.
+
+    Like search indexing, enrichment is best effort: a flow that finds the
+    queue full is skipped, counted, and left for :meth:`backfill`.
+    """
+
+    def __init__(
+        self,
+        writer: CaptureWriter,
+        workers: int = 2,
+        queue_size: int = 10000,
+        batch_size: int = 64,
+    ) -> None:
+        self._writer = writer
+        self._workers = max(1, workers)
+        self._batch_size = max(1, batch_size)
+        self._queue: asyncio.Queue[_Flow | None] = asyncio.Queue(maxsize=queue_size)
+        self._pool: ThreadPoolExecutor | None = None
+        self._tasks: list[asyncio.Task[None]] = []
+
+        self._enriched = 0
+        self._skipped = 0
+        self._failed = 0
+        self._total_ms = 0.0
+
+    def start(self) -> None:
+        if self._tasks:
+            return
+        self._pool = ThreadPoolExecutor(self._workers, thread_name_prefix="agentprobe-enrich")
+        loop = asyncio.get_running_loop()
+        self._tasks = [loop.create_task(self._run()) for _ in range(self._workers)]
+
+    async def close(self) -> None:
+        """Enrich everything still queued and stop the workers."""
+        if not self._tasks:
+            return
+        for _ in self._tasks:
+            await self._queue.put(None)
+        await asyncio.gather(*self._tasks)
+        self._tasks = []
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    async def submit(self, request: CaptureRecord) -> bool:
+        """Queue a finished request for enrichment if there is room."""
+        message = request.response_message
+        # A stream reassembled on the way in needs none of its events here.
+        sse_data = list(request.sse.data) if request.sse is not None and message is None else []
+        return self._offer(
+            (
+                request.id,
+                request.protocol_type,
+                request.host,
+                request.session_id,
+                request.conversation_id,
+                request.request_body,
+                request.response_body,
+                sse_data,
+                message,
+            )
+        )
+
+    async def backfill(self, db: Database | PartitionedDatabase, everything: bool = False) -> int:
+        """Enrich stored requests that were never enriched, or all of them.
+
+        Waits for room in the queue rather than skipping, and returns the
+        number of requests queued. Requests still in flight are left alone.
+        """
+        filters = None if everything else {"enriched": False}
+        queued = 0
+        async for data in db.iter_request_dicts(filters):
+            if data["duration_ms"] is None:
+                continue
+            message = data["response_message"]
+            events = (data["sse_events"] or ()) if message is None else ()
+            await self._queue.put(
+                (
+                    data["id"],
+                    data["protocol_type"],
+                    data["host"],
+                    data["session_id"],
+                    data["conversation_id"],
+                    data["request_body"],
+                    None if events else data["response_body"],
+                    [event.get("data") for event in events],
+                    message,
+                )
+            )
+            queued += 1
+        return queued
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "depth": self._queue.qsize(),
+            "capacity": self._queue.maxsize,
+            "workers": self._workers,
+            "enriched": self._enriched,
+            "skipped": self._skipped,
+            "failed": self._failed,
+            "avg_ms": self._total_ms / self._enriched if self._enriched else None,
+        }
+
+    def _offer(self, flow: _Flow) -> bool:
+        try:
+            self._queue.put_nowait(flow)
+        except asyncio.QueueFull:
+            self._skipped += 1
+            return False
+        return True
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            flow = await self._queue.get()
+            if flow is None:
+                break
+            batch = [flow]
+            while len(batch) < self._batch_size:
+                try:
+                    nxt = self._queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    break
+                if nxt is None:
+                    stopping = True
+                    break
+                batch.append(nxt)
+            started = time.perf_counter()
+            try:
+                results = await loop.run_in_executor(self._pool, _enrich_all, batch)
+            except Exception:
+                self._failed += len(batch)
+                log.exception("enrichment of %d requests failed", len(batch))
+                continue
+            for request_id, fields in results:
+                await self._writer.update_request(request_id, {**fields, "enriched": True})
+            self._enriched += len(batch)
+            self._total_ms += (time.perf_counter() - started) * 1000
+
+
+def _enrich_all(batch: list[_Flow]) -> list[tuple[str, dict[str, Any]]]:
+    results = []
+    for (
+        request_id,
+        protocol_type,
+        host,
+        session_id,
+        conversation,
+        request_body,
+        response_body,
+        sse_data,
+        message,
+    ) in batch:
+        try:
+            fields = enrich_request(protocol_type, host, request_body, session_id, conversation)
+            protocol_type = fields.get("protocol_type", protocol_type)
+            fields.update(
+                enrich_flow(protocol_type, request_body, response_body, sse_data, message)
+            )
+        except Exception:
+            log.warning("could not enrich request %s", request_id, exc_info=True)
+            fields = {}
+        results.append((request_id, fields))
+    return results
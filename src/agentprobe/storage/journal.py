@@ -0,0 +1,157 @@
+"""Append-only journal of in-flight flows for the ``finalize`` capture mode."""
+
+from __future__ import annotations
+
+import logging
+import os
+from collections.abc import Callable
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import IO, Any
+
+from agentprobe.serialization import dumps_str, loads
+from agentprobe.storage.records import CaptureRecord
+
+log = logging.getLogger(__name__)
+
+# Rewrite the journal with only the open flows once it grows past this size.
+_COMPACT_THRESHOLD = 64 * 1024 * 1024
+
+
+class FlowJournal:
+    """Records flows between their request hook and their single final write.
+
+    In ``finalize`` mode a flow only reaches SQLite once it completes, so a
+    proxy crash would lose every flow that was still in flight. The journal
+    appends a ``begin`` line when a request arrives and an ``end`` line once
+    the finished row has been committed (see ``CaptureWriter``'s
+    ``on_commit``), so a row still queued in the writer is not lost either.
+    :meth:`begin` is called on the proxy thread and :meth:`end` on the
+    writer's; both only hand their line to a single journal thread, which
+    encodes and writes them in order, so a large request body never blocks
+    the proxy. On the next start, :meth:`recover` returns the requests that
+    never ended so they can be stored as partial rows; they stay in the
+    journal until those rows commit and end them in turn. Lines are flushed
+    to the OS on every write, which survives a process crash but not a power
+    loss.
+    """
+
+    def __init__(self, path: str | Path) -> None:
+        self._path = Path(path)
+        self._fh: IO[str] | None = None
+        self._open: dict[str, str] = {}
+        self._size = 0
+        self._pool: ThreadPoolExecutor | None = None
+
+    def open(self) -> None:
+        self._path.parent.mkdir(parents=True, exist_ok=True)
+        self._fh = open(self._path, "a", encoding="utf-8")
+        self._size = self._fh.tell()
+        if self._size and not self._ends_with_newline():
+            # Start after a line torn by a crash rather than inside it.
+            self._fh.write("\n")
+            self._fh.flush()
+            self._size += 1
+        self._pool = ThreadPoolExecutor(1, thread_name_prefix="agentprobe-journal")
+
+    def close(self) -> None:
+        """Write out the lines handed over so far, then close the file."""
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+            self._pool = None
+        if self._fh is not None:
+            self._fh.close()
+            self._fh = None
+
+    def begin(self, request: CaptureRecord) -> None:
+        # A shallow copy: the response hook goes on filling in the record.
+        self._submit(self._write_begin, request.id, request.to_dict())
+
+    def end(self, request_id: str) -> None:
+        self._submit(self._write_end, request_id)
+
+    def recover(self) -> list[CaptureRecord]:
+        """Return requests that began but never ended.
+
+        Their entries stay open until :meth:`end` is called for them, so call
+        this before :meth:`open` and store the returned rows after it.
+        """
+        if not self._path.exists():
+            return []
+        begun: dict[str, tuple[str, dict]] = {}
+        with open(self._path, encoding="utf-8") as fh:
+            for line in fh:
+                try:
+                    entry = loads(line)
+                except ValueError:
+                    # A crash mid-write leaves a torn last line.
+                    continue
+                if entry.get("op") == "begin":
+                    begun[entry["request"]["id"]] = (line.rstrip("\n"), entry["request"])
+                elif entry.get("op") == "end":
+                    begun.pop(entry.get("id"), None)
+        recovered: list[CaptureRecord] = []
+        for request_id, (line, data) in begun.items():
+            try:
+                recovered.append(CaptureRecord.from_dict(data))
+            except (TypeError, ValueError):
+                log.warning("skipping unreadable journal entry %s", request_id)
+                continue
+            self._open[request_id] = line
+        return recovered
+
+    @property
+    def open_count(self) -> int:
+        return len(self._open)
+
+    def _submit(self, fn: Callable[..., None], *args: Any) -> None:
+        if self._pool is None:
+            raise RuntimeError("Journal not opened. Call open() first.")
+        future = self._pool.submit(fn, *args)
+        future.add_done_callback(_log_failure)
+
+    def _write_begin(self, request_id: str, data: dict[str, Any]) -> None:
+        line = dumps_str({"op": "begin", "request": data})
+        self._open[request_id] = line
+        self._append(line)
+
+    def _write_end(self, request_id: str) -> None:
+        if self._open.pop(request_id, None) is None:
+            return
+        if not self._open:
+            self._get_fh().truncate(0)
+            self._size = 0
+        elif self._size > _COMPACT_THRESHOLD:
+            self._rewrite()
+        else:
+            self._append(dumps_str({"op": "end", "id": request_id}))
+
+    def _ends_with_newline(self) -> bool:
+        with open(self._path, "rb") as fh:
+            fh.seek(-1, os.SEEK_END)
+            return fh.read(1) == b"\n"
+
+    def _append(self, line: str) -> None:
+        fh = self._get_fh()
+        fh.write(line + "\n")
+        fh.flush()
+        self._size += len(line) + 1
+
+    def _rewrite(self) -> None:
+        fh = self._get_fh()
+        fh.truncate(0)
+        self._size = 0
+        for line in self._open.values():
+            fh.write(line + "\n")
+            self._size += len(line) + 1
+        fh.flush()
+
+    def _get_fh(self) -> IO[str]:
+        if self._fh is None:
+            raise RuntimeError("Journal not opened. Call open() first.")
+        return self._fh
+
+
+def _log_failure(future: Future[None]) -> None:
+    if not future.cancelled() and future.exception() is not None:
+        log.error("journal write failed", exc_info=future.exception())
@@ -2,6 +2,7 @@ from __future__ import annotations
 
 import uuid
 from datetime import datetime, timezone
+from typing import Any
 
 from pydantic import BaseModel, Field
 
@@ -37,16 +38,40 @@ class CapturedRequest(BaseModel):
     response_size: int = 0
 
     sse_events: list[dict[str, str]] | None = None
+    # The final message of a streamed response, shaped like parse_*_response output.
+    response_message: dict[str, Any] | None = None
     duration_ms: float | None = None
     ttfb_ms: float | None = None
+    # Streams only: time to the first output rather than the first byte,
+    # the longest wait between outputs, waits over the stall threshold and
+    # output tokens per second; stream_timing holds the arrival times.
+    ttft_ms: float | None = None
+    max_gap_ms: float | None = None
+    stall_count: int | None = None
+    tokens_per_sec: float | None = None
+    stream_timing: dict[str, list] | None = None
 
     protocol_type: str = "http"
     api_provider: str | None = None
+    model: str | None = None
+
+    # Filled in after the flow by the enrichment worker.
+    input_tokens: int | None = None
+    output_tokens: int | None = None
+    cache_read_tokens: int | None = None
+    cache_creation_tokens: int | None = None
+    tool_call_count: int | None = None
+    stop_reason: str | None = None
+    mcp_method: str | None = None
 
     session_id: str | None = None
     conversation_id: str | None = None
     is_streaming: bool = False
 
+    # Digests of bodies kept in the blob store; also served by /body.
+    request_body_ref: str | None = None
+    response_body_ref: str | None = None
+
     def to_summary(self) -> RequestSummary:
         return RequestSummary(
             id=self.id,
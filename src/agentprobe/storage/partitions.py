@@ -0,0 +1,522 @@
+"""Capture storage split into per-day or per-N-rows SQLite files."""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import re
+from collections import Counter, OrderedDict
+from collections.abc import AsyncIterator, Sequence
+from contextlib import AsyncExitStack, asynccontextmanager
+from datetime import UTC, datetime, timedelta
+from pathlib import Path
+from typing import Any
+
+from agentprobe.storage.blobs import BlobStore
+from agentprobe.storage.database import BODY_PARTS, Database, SearchDocument
+from agentprobe.storage.models import CapturedRequest, SSEEvent
+from agentprobe.storage.records import CaptureRecord, SSEBatch, request_id_time
+from agentprobe.storage.rollups import Rollup
+from agentprobe.storage.sessions import merge_sessions
+from agentprobe.storage.stats import summarize_stats
+
+log = logging.getLogger(__name__)
+
+PARTITION_SCHEMES = ("day", "rows")
+
+# Partitions kept open for writing: the hot one and the one before it, which
+# still receives updates for flows that started before the rollover.
+_WRITABLE_PARTITIONS = 2
+
+# Request ids remembered with the partition they were inserted into, so
+# updates for in-flight flows need no lookup.
+_LOCATED_ID_MEMORY = 65536
+
+_DAY_FORMAT = "%Y%m%d"
+
+
+class PartitionedDatabase:
+    """Capture store spread over one SQLite file per day or per ``partition_rows`` requests.
+
+    Each partition is a complete :class:`Database` in ``directory``, named
+    ``day-YYYYMMDD.db`` or ``rows-NNNNNNNN.db``. Requests go to the partition
+    of their timestamp or sequence number; only the newest partitions are
+    open for writing, older ones are opened read-only when a query needs
+    them and at most ``open_partitions`` stay open. Page, search, stats and
+    export queries fan out over the partitions and merge their results, and
+    retention drops whole files (:meth:`drop_partitions`).
+
+    Other keyword arguments are passed to every partition's
+    :class:`Database`. ``blobs`` is shared by all partitions, so identical
+    bodies are still stored once.
+
+    Writes that span partitions are not atomic across them. Delta-encoded
+    request bodies only refer to requests in the same partition.
+    """
+
+    def __init__(
+        self,
+        partition_by: str = "day",
+        partition_rows: int = 100_000,
+        open_partitions: int = 8,
+        blobs: BlobStore | None = None,
+        **options: Any,
+    ) -> None:
+        if partition_by not in PARTITION_SCHEMES:
+            raise ValueError(f"unknown partition scheme: {partition_by!r}")
+        self._scheme = partition_by
+        self._partition_rows = max(1, partition_rows)
+        self._open_limit = max(1, open_partitions)
+        self._blobs = blobs
+        self._options = options
+        self._dir: Path | None = None
+        self._keys: list[str] = []  # oldest first
+        self._writable: OrderedDict[str, Database] = OrderedDict()
+        self._readable: OrderedDict[str, Database] = OrderedDict()
+        self._users: Counter[str] = Counter()
+        self._open_lock = asyncio.Lock()
+        self._located: OrderedDict[str, str] = OrderedDict()
+        # stats_parts of partitions not open for writing, which cannot change.
+        self._parts: dict[str, dict[str, Any]] = {}
+        self._changes = 0
+
+    async def init(self, directory: str | Path) -> None:
+        self._dir = Path(directory)
+        self._dir.mkdir(parents=True, exist_ok=True)
+        pattern = re.compile(rf"^{self._scheme}-(\d+)\.db$")
+        self._keys = sorted(
+            match.group(1)
+            for path in self._dir.iterdir()
+            if (match := pattern.match(path.name)) is not None
+        )
+
+    async def close(self) -> None:
+        for db in [*self._writable.values(), *self._readable.values()]:
+            await db.close()
+        self._writable.clear()
+        self._readable.clear()
+
+    @property
+    def blobs(self) -> BlobStore | None:
+        return self._blobs
+
+    @property
+    def partitions(self) -> list[str]:
+        """Partition keys, oldest first."""
+        return list(self._keys)
+
+    # -- partition handles ---------------------------------------------------
+
+    def _key_for(self, record: CaptureRecord) -> str:
+        if self._scheme == "day":
+            return record.timestamp.astimezone(UTC).strftime(_DAY_FORMAT)
+        return f"{record.sequence // self._partition_rows:08d}"
+
+    def _file(self, key: str) -> Path:
+        if self._dir is None:
+            raise RuntimeError("Database not initialized. Call init() first.")
+        return self._dir / f"{self._scheme}-{key}.db"
+
+    @asynccontextmanager
+    async def _use(self, key: str, write: bool = False) -> AsyncIterator[Database]:
+        """Borrow the partition ``key``; it is not closed while borrowed."""
+        async with self._open_lock:
+            db = await (self._open_writable(key) if write else self._open_readable(key))
+            self._users[key] += 1
+        try:
+            yield db
+        finally:
+            self._users[key] -= 1
+            await self._evict()
+
+    async def _open_writable(self, key: str) -> Database:
+        db = self._writable.get(key)
+        if db is not None:
+            self._writable.move_to_end(key)
+            return db
+        reader = self._readable.pop(key, None)
+        if reader is not None:
+            await reader.close()
+        db = Database(blobs=self._blobs, **self._options)
+        await db.init(self._file(key))
+        self._writable[key] = db
+        self._parts.pop(key, None)
+        if key not in self._keys:
+            self._keys = sorted([*self._keys, key])
+        return db
+
+    async def _open_readable(self, key: str) -> Database:
+        db = self._writable.get(key)
+        if db is not None:
+            return db
+        db = self._readable.get(key)
+        if db is not None:
+            self._readable.move_to_end(key)
+            return db
+        db = Database(blobs=self._blobs, **self._options)
+        try:
+            await db.init(self._file(key), read_only=True)
+        except RuntimeError:
+            # Written by an older version: migrate once, then reopen read-only.
+            migrated = Database(blobs=self._blobs, **self._options)
+            await migrated.init(self._file(key))
+            await migrated.close()
+            await db.init(self._file(key), read_only=True)
+        self._readable[key] = db
+        return db
+
+    async def _evict(self) -> None:
+        async with self._open_lock:
+            hot = self._keys[-1] if self._keys else None
+            for handles, limit in (
+                (self._writable, _WRITABLE_PARTITIONS),
+                (self._readable, self._open_limit),
+            ):
+                for key in list(handles):
+                    if len(handles) <= limit:
+                        break
+                    if self._users[key] or key == hot:
+                        continue
+                    await handles.pop(key).close()
+
+    async def _parts_of(self, key: str) -> dict[str, Any]:
+        parts = self._parts.get(key)
+        if parts is not None:
+            return parts
+        async with self._use(key) as db:
+            parts = await db.stats_parts()
+            if key not in self._writable:
+                self._parts[key] = parts
+        return parts
+
+    def _remember(self, request_id: str, key: str) -> None:
+        self._located[request_id] = key
+        if len(self._located) > _LOCATED_ID_MEMORY:
+            self._located.popitem(last=False)
+
+    async def _locate(self, request_id: str) -> str | None:
+        key = self._located.get(request_id)
+        if key is not None and key in self._keys:
+            return key
+        for key in self._candidate_keys(request_id):
+            async with self._use(key) as db:
+                if await db.request_exists(request_id):
+                    return key
+        return None
+
+    def _candidate_keys(self, request_id: str) -> list[str]:
+        """Partitions that may hold ``request_id``, likeliest first."""
+        keys = list(reversed(self._keys))
+        created = request_id_time(request_id) if self._scheme == "day" else None
+        if created is None:
+            return keys
+        likely = [(created + timedelta(days=d)).strftime(_DAY_FORMAT) for d in (0, -1, 1)]
+        first = [key for key in likely if key in keys]
+        return first + [key for key in keys if key not in first]
+
+    def _keys_for(self, filters: dict[str, Any] | None) -> list[str]:
+        """Partitions that can hold rows matching the ``since``/``until`` filters."""
+        keys = self._keys
+        if self._scheme != "day" or not filters:
+            return list(keys)
+        since = filters.get("since")
+        until = filters.get("until")
+        if since is not None:
+            first = datetime.fromisoformat(since).astimezone(UTC).strftime(_DAY_FORMAT)
+            keys = [key for key in keys if key >= first]
+        if until is not None:
+            last = datetime.fromisoformat(until).astimezone(UTC).strftime(_DAY_FORMAT)
+            keys = [key for key in keys if key <= last]
+        return list(keys)
+
+    # -- writes --------------------------------------------------------------
+
+    async def write_batch(
+        self,
+        requests: list[CaptureRecord],
+        updates: list[tuple[str, dict[str, Any]]],
+        sse_batches: list[tuple[str, SSEBatch]],
+        search_docs: Sequence[SearchDocument] = (),
+    ) -> None:
+        """Split a batch by partition and write each part in its own transaction.
+
+        Updates, SSE rows and search documents for requests that are in no
+        partition are dropped, as a single database would ignore them.
+        """
+        groups: dict[str, tuple[list, list, list, list]] = {}
+
+        def group(key: str) -> tuple[list, list, list, list]:
+            return groups.setdefault(key, ([], [], [], []))
+
+        inserted: dict[str, str] = {}
+        for record in requests:
+            key = inserted[record.id] = self._key_for(record)
+            self._remember(record.id, key)
+            group(key)[0].append(record)
+        for index, items in ((1, updates), (2, sse_batches), (3, search_docs)):
+            for item in items:
+                key = inserted.get(item[0]) or await self._locate(item[0])
+                if key is not None:
+                    group(key)[index].append(item)
+        for key in sorted(groups):
+            inserts, changes, streams, docs = groups[key]
+            async with self._use(key, write=True) as db:
+                await db.write_batch(inserts, changes, streams, docs)
+        self._changes += 1
+
+    async def save_request(self, request: CaptureRecord) -> None:
+        await self.write_batch([request], [], [])
+
+    async def update_request(self, request_id: str, fields: dict[str, Any]) -> None:
+        await self.write_batch([], [(request_id, fields)], [])
+
+    async def save_sse_batch(self, request_id: str, batch: SSEBatch) -> None:
+        await self.write_batch([], [], [(request_id, batch)])
+
+    # -- reads by id ---------------------------------------------------------
+
+    async def get_request(self, request_id: str) -> CapturedRequest | None:
+        key = await self._locate(request_id)
+        if key is None:
+            return None
+        async with self._use(key) as db:
+            return await db.get_request(request_id)
+
+    async def request_exists(self, request_id: str) -> bool:
+        return await self._locate(request_id) is not None
+
+    async def get_sse_events(self, request_id: str) -> list[SSEEvent]:
+        key = await self._locate(request_id)
+        if key is None:
+            return []
+        async with self._use(key) as db:
+            return await db.get_sse_events(request_id)
+
+    async def get_body_columns(self, request_id: str, part: str) -> dict[str, Any] | None:
+        if part not in BODY_PARTS:
+            raise ValueError(f"unknown body part: {part!r}")
+        key = await self._locate(request_id)
+        if key is None:
+            return None
+        async with self._use(key) as db:
+            return await db.get_body_columns(request_id, part)
+
+    # -- fan-out reads -------------------------------------------------------
+
+    async def list_summary_page(
+        self,
+        filters: dict[str, Any] | None = None,
+        after: tuple[int, int] | None = None,
+        limit: int = 100,
+    ) -> tuple[list[dict[str, Any]], tuple[int, int] | None]:
+        """Like :meth:`Database.list_summary_page`, merged over all partitions.
+
+        Partitions whose newest sequence cannot reach the page are skipped
+        without querying them.
+        """
+        rows: list[dict[str, Any]] = []
+        for key in reversed(self._keys_for(filters)):
+            if len(rows) > limit:
+                newest = (await self._parts_of(key))["max_sequence"]
+                if newest is None or newest < rows[limit]["sequence"]:
+                    continue
+            async with self._use(key) as db:
+                page = await db.page_rows(filters, after, limit + 1)
+            rows = sorted(
+                [*rows, *page], key=lambda row: (row["sequence"], row["rowid"]), reverse=True
+            )[: limit + 1]
+        next_key = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_key = (rows[-1]["sequence"], rows[-1]["rowid"])
+        for row in rows:
+            del row["rowid"]
+        return rows, next_key
+
+    async def search_summaries(
+        self,
+        match: str,
+        filters: dict[str, Any] | None = None,
+        limit: int = 100,
+    ) -> list[dict[str, Any]]:
+        """Best matches over all partitions, ranked by bm25 as in a single database."""
+        found: list[dict[str, Any]] = []
+        for key in reversed(self._keys_for(filters)):
+            async with self._use(key) as db:
+                found.extend(await db.search_summaries(match, filters, limit, with_rank=True))
+        found.sort(key=lambda summary: summary["rank"])
+        for summary in found[:limit]:
+            del summary["rank"]
+        return found[:limit]
+
+    async def iter_request_dicts(
+        self, filters: dict[str, Any] | None = None, chunk_size: int = 64
+    ) -> AsyncIterator[dict[str, Any]]:
+        """Yield every matching full request, partition by partition, oldest first."""
+        for key in self._keys_for(filters):
+            async with self._use(key) as db:
+                async for data in db.iter_request_dicts(filters, chunk_size):
+                    yield data
+
+    async def get_stats(self) -> dict[str, Any]:
+        return summarize_stats([await self._parts_of(key) for key in list(self._keys)])
+
+    async def get_rollups(
+        self,
+        resolution: str,
+        dimension: str,
+        key: str | None,
+        start: int,
+        end: int,
+    ) -> list[tuple[str, int, Rollup]]:
+        """Rollups of every partition; one bucket may appear once per partition."""
+        filters = {
+            "since": datetime.fromtimestamp(start, UTC).isoformat(),
+            "until": datetime.fromtimestamp(end - 1, UTC).isoformat(),
+        }
+        rows: list[tuple[str, int, Rollup]] = []
+        for part in self._keys_for(filters):
+            async with self._use(part) as db:
+                rows += await db.get_rollups(resolution, dimension, key, start, end)
+        return rows
+
+    async def get_sessions(
+        self, limit: int = 100, agent_type: str | None = None, ids: list[str] | None = None
+    ) -> list[dict[str, Any]]:
+        """Sessions of every partition, each merged over the partitions it spans.
+
+        The most recent ``limit`` of each partition are merged to pick the
+        sessions to return; those are then read back from every partition,
+        so their aggregates include the parts that fell outside a limit.
+        """
+        keys = list(self._keys)
+        if ids is None:
+            rows: list[dict[str, Any]] = []
+            for part in keys:
+                async with self._use(part) as db:
+                    rows += await db.get_sessions(limit, agent_type)
+            recent = sorted(merge_sessions(rows).values(), key=lambda r: r["last_seen"])
+            ids = [row["session_id"] for row in recent[-limit:]]
+            if not ids:
+                return []
+        rows = []
+        for part in keys:
+            async with self._use(part) as db:
+                rows += await db.get_sessions(len(ids), agent_type, ids)
+        merged = sorted(merge_sessions(rows).values(), key=lambda r: r["last_seen"], reverse=True)
+        return merged[:limit]
+
+    @property
+    def changes(self) -> int:
+        """Write batches committed since :meth:`init`."""
+        return self._changes
+
+    async def max_sequence(self) -> int:
+        for key in reversed(self._keys):
+            newest = (await self._parts_of(key))["max_sequence"]
+            if newest is not None:
+                return newest
+        return 0
+
+    # -- retention -----------------------------------------------------------
+
+    @property
+    def idle_seconds(self) -> float:
+        hot = self._writable.get(self._keys[-1]) if self._keys else None
+        return hot.idle_seconds if hot is not None else float("inf")
+
+    async def reclaim_space(self) -> int:
+        """Compact the hot partition; older ones are only ever dropped whole."""
+        if not self._keys or self._keys[-1] not in self._writable:
+            return 0
+        async with self._use(self._keys[-1], write=True) as db:
+            return await db.reclaim_space()
+
+    async def drop_partitions(
+        self,
+        max_requests: int | None = None,
+        max_age: float | None = None,
+        max_bytes: int | None = None,
+    ) -> dict[str, int]:
+        """Delete the oldest partition files that lie wholly beyond a retention limit.
+
+        The hot partition is never dropped, and neither is a partition in
+        use by a running query; both wait for a later call. Blobs that no
+        remaining partition refers to are deleted too. Returns how many
+        ``partitions``, requests (``deleted``) and ``blobs`` went.
+        """
+        result = {"partitions": 0, "deleted": 0, "blobs": 0}
+        parts = {key: await self._parts_of(key) for key in list(self._keys)}
+        rows = sum(p["total_requests"] for p in parts.values())
+        size = sum(p["total_request_bytes"] + p["total_response_bytes"] for p in parts.values())
+        cutoff = None
+        if max_age is not None:
+            cutoff = (datetime.now(UTC) - timedelta(seconds=max_age)).isoformat()
+        refs: set[str] = set()
+        for key in list(self._keys[:-1]):
+            p = parts[key]
+            p_size = p["total_request_bytes"] + p["total_response_bytes"]
+            expired = (
+                (cutoff is not None and (p["max_timestamp"] is None or p["max_timestamp"] < cutoff))
+                or (max_requests is not None and rows - p["total_requests"] >= max_requests)
+                or (max_bytes is not None and size - p_size >= max_bytes)
+            )
+            if not expired or self._users[key]:
+                break
+            async with self._use(key) as db:
+                refs |= await db.blob_refs()
+            await self._drop(key)
+            rows -= p["total_requests"]
+            size -= p_size
+            result["partitions"] += 1
+            result["deleted"] += p["total_requests"]
+        if refs and self._blobs is not None:
+            result["blobs"] = await self._delete_orphan_blobs(self._blobs, refs)
+        return result
+
+    async def _delete_orphan_blobs(self, blobs: BlobStore, refs: set[str]) -> int:
+        """Delete those of ``refs`` that no partition points at; returns how many.
+
+        A write whose body is already in the blob store commits a reference
+        without writing the file again, so the writable partitions are
+        checked, and the blobs deleted, while their writes are held off.
+        The open lock keeps any other partition from becoming writable
+        meanwhile.
+        """
+        async with self._open_lock, AsyncExitStack() as stack:
+            for key in list(self._keys):
+                if not refs:
+                    break
+                db = self._writable.get(key)
+                if db is not None:
+                    await stack.enter_async_context(db.write_locked())
+                else:
+                    db = await self._open_readable(key)
+                refs -= await db.referenced_blobs(sorted(refs))
+            for ref in refs:
+                await asyncio.to_thread(blobs.delete, ref)
+        await self._evict()
+        return len(refs)
+
+    async def _drop(self, key: str) -> None:
+        async with self._open_lock:
+            for handles in (self._writable, self._readable):
+                db = handles.pop(key, None)
+                if db is not None:
+                    await db.close()
+            self._keys.remove(key)
+            self._parts.pop(key, None)
+            for request_id in [rid for rid, k in self._located.items() if k == key]:
+                del self._located[request_id]
+            path = self._file(key)
+            for suffix in ("", "-wal", "-shm"):
+                path.with_name(path.name + suffix).unlink(missing_ok=True)
+        self._changes += 1
+        log.info("dropped capture partition %s", key)
+
+    async def clear_all(self) -> None:
+        for key in list(self._keys):
+            await self._drop(key)
+        self._located.clear()
+        if self._blobs is not None:
+            await asyncio.to_thread(self._blobs.clear)
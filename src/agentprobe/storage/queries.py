@@ -45,44 +45,393 @@ CREATE_REQUESTS_TIMESTAMP_IDX = (
     "CREATE INDEX IF NOT EXISTS idx_requests_timestamp ON requests(timestamp)"
 )
 
-CREATE_REQUESTS_HOST_IDX = (
-    "CREATE INDEX IF NOT EXISTS idx_requests_host ON requests(host)"
+CREATE_REQUESTS_SEQUENCE_IDX = (
+    "CREATE INDEX IF NOT EXISTS idx_requests_sequence ON requests(sequence)"
 )
 
-CREATE_REQUESTS_AGENT_IDX = (
-    "CREATE INDEX IF NOT EXISTS idx_requests_agent_type ON requests(agent_type)"
-)
+# Equality filters paired with the keyset column, so a filtered page is one
+# index range scan however deep the cursor is. SQLite appends the rowid to
+# every index, which covers the (sequence, rowid) tie-break as well.
+CREATE_REQUESTS_KEYSET_INDEXES = [
+    f"CREATE INDEX IF NOT EXISTS idx_requests_{column}_sequence ON requests({column}, sequence)"
+    for column in ("agent_type", "host", "protocol_type", "session_id")
+]
+
+# Single-column indexes made redundant by the composite ones above.
+DROP_SUPERSEDED_INDEXES = [
+    "DROP INDEX IF EXISTS idx_requests_host",
+    "DROP INDEX IF EXISTS idx_requests_agent_type",
+]
 
 CREATE_SSE_REQUEST_IDX = (
     "CREATE INDEX IF NOT EXISTS idx_sse_events_request_id ON sse_events(request_id)"
 )
 
+CREATE_META_TABLE = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+)
+"""
+
+# Full-text index over text extracted from bodies by agentprobe.parser.text.
+# It keeps its own copy of the text so snippet() can quote it.
+CREATE_REQUESTS_FTS_TABLE = """
+CREATE VIRTUAL TABLE IF NOT EXISTS requests_fts USING fts5(
+    request_id UNINDEXED,
+    prompt,
+    tools,
+    response,
+    tokenize = 'unicode61 remove_diacritics 2'
+)
+"""
+
 SCHEMA_STATEMENTS: list[str] = [
     CREATE_REQUESTS_TABLE,
     CREATE_SSE_EVENTS_TABLE,
     CREATE_REQUESTS_TIMESTAMP_IDX,
-    CREATE_REQUESTS_HOST_IDX,
-    CREATE_REQUESTS_AGENT_IDX,
+    CREATE_REQUESTS_SEQUENCE_IDX,
+    *CREATE_REQUESTS_KEYSET_INDEXES,
+    *DROP_SUPERSEDED_INDEXES,
     CREATE_SSE_REQUEST_IDX,
+    CREATE_META_TABLE,
+    CREATE_REQUESTS_FTS_TABLE,
+]
+
+# Request counts and sizes per value of each dimension, maintained by the
+# Database write methods in the same transaction as the rows they count.
+# Dimension ``total`` has a single row with key ''; NULL values count under ''.
+STATS_DIMENSIONS = {
+    "agent": "agent_type",
+    "host": "host",
+    "protocol": "protocol_type",
+    "provider": "api_provider",
+    "model": "model",
+}
+# Columns of requests that the counters, rollups and session aggregates depend on.
+STATS_SOURCE_COLUMNS = (
+    "request_size",
+    "response_size",
+    "duration_ms",
+    "is_streaming",
+    *STATS_DIMENSIONS.values(),
+    "timestamp",
+    "status_code",
+    "ttfb_ms",
+    "ttft_ms",
+    "stall_count",
+    "tokens_per_sec",
+    "session_id",
+    "input_tokens",
+    "output_tokens",
+    "tool_call_count",
+)
+
+CREATE_STATS_COUNTERS_TABLE = """
+CREATE TABLE stats_counters (
+    dimension TEXT NOT NULL,
+    key TEXT NOT NULL,
+    requests INTEGER NOT NULL DEFAULT 0,
+    request_bytes INTEGER NOT NULL DEFAULT 0,
+    response_bytes INTEGER NOT NULL DEFAULT 0,
+    duration_sum REAL NOT NULL DEFAULT 0,
+    duration_count INTEGER NOT NULL DEFAULT 0,
+    streaming INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (dimension, key)
+) WITHOUT ROWID
+"""
+
+_STATS_AGGREGATES = (
+    "COUNT(*), COALESCE(SUM(request_size), 0), COALESCE(SUM(response_size), 0), "
+    "COALESCE(SUM(duration_ms), 0), COUNT(duration_ms), COALESCE(SUM(is_streaming), 0)"
+)
+
+_STATS_COLUMNS = (
+    "dimension, key, requests, request_bytes, response_bytes, "
+    "duration_sum, duration_count, streaming"
+)
+
+# Recount every counter from the requests table.
+REBUILD_STATS_COUNTERS = [
+    "DELETE FROM stats_counters",
+    f"INSERT INTO stats_counters ({_STATS_COLUMNS}) "
+    f"SELECT 'total', '', {_STATS_AGGREGATES} FROM requests"
+    + "".join(
+        f" UNION ALL SELECT '{dimension}', COALESCE({column}, ''), {_STATS_AGGREGATES}"
+        f" FROM requests GROUP BY 2"
+        for dimension, column in STATS_DIMENSIONS.items()
+    ),
 ]
 
+# Whether the total counter agrees with the table; COUNT(*) reads an index only.
+CHECK_STATS_COUNTERS = """
+SELECT (SELECT requests FROM stats_counters WHERE dimension = 'total' AND key = '')
+    IS (SELECT COUNT(*) FROM requests)
+"""
+
+UPSERT_STATS_COUNTER = """
+INSERT INTO stats_counters (
+    dimension, key, requests, request_bytes, response_bytes,
+    duration_sum, duration_count, streaming
+) VALUES (
+    :dimension, :key, :requests, :request_bytes, :response_bytes,
+    :duration_sum, :duration_count, :streaming
+)
+ON CONFLICT (dimension, key) DO UPDATE SET
+    requests = requests + excluded.requests,
+    request_bytes = request_bytes + excluded.request_bytes,
+    response_bytes = response_bytes + excluded.response_bytes,
+    duration_sum = duration_sum + excluded.duration_sum,
+    duration_count = duration_count + excluded.duration_count,
+    streaming = streaming + excluded.streaming
+"""
+
+SELECT_STATS_COUNTERS = f"""
+SELECT {_STATS_COLUMNS} FROM stats_counters
+WHERE requests > 0 OR dimension = 'total'
+"""
+
+# Completed flows per time bucket, see agentprobe.storage.rollups. Sketches
+# are LatencySketch JSON; bucket is the bucket's start in epoch seconds.
+CREATE_ROLLUPS_TABLE = """
+CREATE TABLE rollups (
+    resolution TEXT NOT NULL,
+    dimension TEXT NOT NULL,
+    key TEXT NOT NULL,
+    bucket INTEGER NOT NULL,
+    requests INTEGER NOT NULL,
+    request_bytes INTEGER NOT NULL,
+    response_bytes INTEGER NOT NULL,
+    errors INTEGER NOT NULL,
+    duration_sketch TEXT NOT NULL,
+    ttfb_sketch TEXT NOT NULL,
+    PRIMARY KEY (resolution, dimension, key, bucket)
+) WITHOUT ROWID
+"""
+CREATE_ROLLUPS_BUCKET_IDX = "CREATE INDEX idx_rollups_bucket ON rollups(resolution, bucket)"
+
+UPSERT_ROLLUP = """
+INSERT OR REPLACE INTO rollups (
+    resolution, dimension, key, bucket, requests, request_bytes, response_bytes,
+    errors, duration_sketch, ttfb_sketch, streams, stalls, ttft_sketch, tokens_per_sec_sketch
+) VALUES (
+    :resolution, :dimension, :key, :bucket, :requests, :request_bytes, :response_bytes,
+    :errors, :duration_sketch, :ttfb_sketch, :streams, :stalls, :ttft_sketch,
+    :tokens_per_sec_sketch
+)
+"""
+PRUNE_ROLLUPS = "DELETE FROM rollups WHERE resolution = :resolution AND bucket < :before"
+DELETE_ALL_ROLLUPS = "DELETE FROM rollups"
+
+# Completed flows not yet rolled up when the rollups table was added.
+SELECT_ROLLUP_BACKFILL = f"""
+SELECT rowid, {", ".join(STATS_SOURCE_COLUMNS)} FROM requests
+WHERE rowid > :after AND duration_ms IS NOT NULL
+ORDER BY rowid LIMIT :limit
+"""
+
+# Per-session aggregates, see agentprobe.storage.sessions. first_seen and
+# last_seen bound every request counted; deleting requests leaves them.
+CREATE_SESSION_STATS_TABLE = """
+CREATE TABLE session_stats (
+    session_id TEXT PRIMARY KEY,
+    agent_type TEXT NOT NULL,
+    host TEXT NOT NULL,
+    first_seen TEXT NOT NULL,
+    last_seen TEXT NOT NULL,
+    requests INTEGER NOT NULL DEFAULT 0,
+    errors INTEGER NOT NULL DEFAULT 0,
+    request_bytes INTEGER NOT NULL DEFAULT 0,
+    response_bytes INTEGER NOT NULL DEFAULT 0,
+    duration_sum REAL NOT NULL DEFAULT 0,
+    duration_count INTEGER NOT NULL DEFAULT 0,
+    input_tokens INTEGER NOT NULL DEFAULT 0,
+    output_tokens INTEGER NOT NULL DEFAULT 0,
+    tool_calls INTEGER NOT NULL DEFAULT 0
+) WITHOUT ROWID
+"""
+CREATE_SESSION_STATS_LAST_SEEN_IDX = (
+    "CREATE INDEX idx_session_stats_last_seen ON session_stats(last_seen)"
+)
+
+_SESSION_COLUMNS = (
+    "session_id, agent_type, host, first_seen, last_seen, requests, errors, "
+    "request_bytes, response_bytes, duration_sum, duration_count, "
+    "input_tokens, output_tokens, tool_calls"
+)
+
+UPSERT_SESSION_STATS = f"""
+INSERT INTO session_stats ({_SESSION_COLUMNS}) VALUES (
+    :session_id, :agent_type, :host, :first_seen, :last_seen, :requests, :errors,
+    :request_bytes, :response_bytes, :duration_sum, :duration_count,
+    :input_tokens, :output_tokens, :tool_calls
+)
+ON CONFLICT (session_id) DO UPDATE SET
+    first_seen = MIN(first_seen, excluded.first_seen),
+    last_seen = MAX(last_seen, excluded.last_seen),
+    requests = requests + excluded.requests,
+    errors = errors + excluded.errors,
+    request_bytes = request_bytes + excluded.request_bytes,
+    response_bytes = response_bytes + excluded.response_bytes,
+    duration_sum = duration_sum + excluded.duration_sum,
+    duration_count = duration_count + excluded.duration_count,
+    input_tokens = input_tokens + excluded.input_tokens,
+    output_tokens = output_tokens + excluded.output_tokens,
+    tool_calls = tool_calls + excluded.tool_calls
+"""
+DELETE_EMPTY_SESSION_STATS = "DELETE FROM session_stats WHERE requests <= 0"
+DELETE_ALL_SESSION_STATS = "DELETE FROM session_stats"
+
+# Each bound is a separate index lookup; MIN and MAX in one SELECT would scan.
+SELECT_REQUEST_BOUNDS = """
+SELECT
+    (SELECT MIN(sequence) FROM requests) AS min_sequence,
+    (SELECT MAX(sequence) FROM requests) AS max_sequence,
+    (SELECT MAX(timestamp) FROM requests) AS max_timestamp
+"""
+
+# Schema changes applied in order on top of SCHEMA_STATEMENTS. PRAGMA
+# user_version records how many have been applied, so append new steps and
+# never edit or reorder existing ones.
+MIGRATIONS: list[list[str]] = [
+    # 1: bodies above the blob threshold live in the blob store.
+    [
+        "ALTER TABLE requests ADD COLUMN request_body_ref TEXT",
+        "ALTER TABLE requests ADD COLUMN response_body_ref TEXT",
+    ],
+    # 2: request bodies stored as a delta against an earlier request.
+    [
+        "ALTER TABLE requests ADD COLUMN request_body_delta TEXT",
+    ],
+    # 3: zstd dictionaries trained for column compression.
+    [
+        """CREATE TABLE compression_dictionaries (
+            dict_id INTEGER PRIMARY KEY,
+            data BLOB NOT NULL
+        )""",
+    ],
+    # 4: find delta dependents and blob references when rows are deleted.
+    [
+        "ALTER TABLE requests ADD COLUMN request_body_base TEXT",
+        "CREATE INDEX idx_requests_request_body_base ON requests(request_body_base) "
+        "WHERE request_body_base IS NOT NULL",
+        "CREATE INDEX idx_requests_request_body_ref ON requests(request_body_ref) "
+        "WHERE request_body_ref IS NOT NULL",
+        "CREATE INDEX idx_requests_response_body_ref ON requests(response_body_ref) "
+        "WHERE response_body_ref IS NOT NULL",
+        # Renumber existing search documents to the rowid of their request.
+        "CREATE TEMP TABLE fts_copy AS SELECT rowid AS doc, * FROM requests_fts",
+        "DELETE FROM requests_fts",
+        """INSERT INTO requests_fts (rowid, request_id, prompt, tools, response)
+        SELECT r.rowid, c.request_id, c.prompt, c.tools, c.response
+        FROM fts_copy AS c JOIN requests AS r ON r.id = c.request_id
+        WHERE c.doc IN (SELECT MAX(doc) FROM fts_copy GROUP BY request_id)""",
+        "DROP TABLE fts_copy",
+    ],
+    # 5: model column and incrementally maintained stats counters.
+    [
+        "ALTER TABLE requests ADD COLUMN model TEXT",
+        CREATE_STATS_COUNTERS_TABLE,
+        *REBUILD_STATS_COUNTERS,
+    ],
+    # 6: per-minute/hour/day rollups with latency sketches.
+    [
+        CREATE_ROLLUPS_TABLE,
+        CREATE_ROLLUPS_BUCKET_IDX,
+    ],
+    # 7: columns filled in by the enrichment worker, see agentprobe.parser.enrich.
+    [
+        "ALTER TABLE requests ADD COLUMN input_tokens INTEGER",
+        "ALTER TABLE requests ADD COLUMN output_tokens INTEGER",
+        "ALTER TABLE requests ADD COLUMN cache_read_tokens INTEGER",
+        "ALTER TABLE requests ADD COLUMN cache_creation_tokens INTEGER",
+        "ALTER TABLE requests ADD COLUMN tool_call_count INTEGER",
+        "ALTER TABLE requests ADD COLUMN stop_reason TEXT",
+        "ALTER TABLE requests ADD COLUMN mcp_method TEXT",
+        "ALTER TABLE requests ADD COLUMN enriched INTEGER NOT NULL DEFAULT 0",
+        "CREATE INDEX idx_requests_model_sequence ON requests(model, sequence)",
+        "CREATE INDEX idx_requests_mcp_method_sequence ON requests(mcp_method, sequence)",
+    ],
+    # 8: final message of a streamed response, reassembled while it streams.
+    [
+        "ALTER TABLE requests ADD COLUMN response_message TEXT",
+    ],
+    # 9: output timing of streams, per request and rolled up.
+    [
+        "ALTER TABLE requests ADD COLUMN ttft_ms REAL",
+        "ALTER TABLE requests ADD COLUMN max_gap_ms REAL",
+        "ALTER TABLE requests ADD COLUMN stall_count INTEGER",
+        "ALTER TABLE requests ADD COLUMN tokens_per_sec REAL",
+        "ALTER TABLE requests ADD COLUMN stream_timing TEXT",
+        "ALTER TABLE rollups ADD COLUMN streams INTEGER NOT NULL DEFAULT 0",
+        "ALTER TABLE rollups ADD COLUMN stalls INTEGER NOT NULL DEFAULT 0",
+        "ALTER TABLE rollups ADD COLUMN ttft_sketch TEXT",
+        "ALTER TABLE rollups ADD COLUMN tokens_per_sec_sketch TEXT",
+    ],
+    # 10: per-session aggregates; sessions were never assigned before, so
+    # there is nothing to count yet.
+    [
+        CREATE_SESSION_STATS_TABLE,
+        CREATE_SESSION_STATS_LAST_SEEN_IDX,
+    ],
+]
+
+# Copy streams that only exist in the inline ``requests.sse_events`` column
+# into ``sse_events`` rows, so the rows can serve as the single source of truth.
+BACKFILL_SSE_ROWS = """
+INSERT INTO sse_events (id, request_id, event_index, event_type, data, timestamp)
+SELECT
+    r.id || ':' || j.key,
+    r.id,
+    j.key,
+    COALESCE(json_extract(j.value, '$.event'), 'message'),
+    COALESCE(json_extract(j.value, '$.data'), ''),
+    r.timestamp
+FROM requests AS r, json_each(r.sse_events) AS j
+WHERE typeof(r.sse_events) = 'text'
+  AND NOT EXISTS (SELECT 1 FROM sse_events AS s WHERE s.request_id = r.id)
+"""
+
+# Compressed inline streams, which json_each cannot read; backfilled in Python.
+SELECT_COMPRESSED_INLINE_SSE = """
+SELECT r.id, r.timestamp, r.sse_events FROM requests AS r
+WHERE typeof(r.sse_events) = 'blob'
+  AND NOT EXISTS (SELECT 1 FROM sse_events AS s WHERE s.request_id = r.id)
+"""
+
+# Drop the inline copies of streams whose events are stored as rows.
+COMPACT_INLINE_SSE = """
+UPDATE requests SET sse_events = NULL, response_body = NULL
+WHERE is_streaming = 1 AND sse_events IS NOT NULL
+"""
+
+SELECT_META = "SELECT value FROM meta WHERE key = :key"
+UPSERT_META = """
+INSERT INTO meta (key, value) VALUES (:key, :value)
+ON CONFLICT(key) DO UPDATE SET value = excluded.value
+"""
+
 INSERT_REQUEST = """
 INSERT INTO requests (
     id, sequence, timestamp, agent_type, source_pid,
     method, url, host, path,
     request_headers, request_body, request_size,
     status_code, response_headers, response_body, response_size,
-    sse_events, duration_ms, ttfb_ms,
-    protocol_type, api_provider,
-    session_id, conversation_id, is_streaming
+    sse_events, response_message, duration_ms, ttfb_ms,
+    ttft_ms, max_gap_ms, stall_count, tokens_per_sec, stream_timing,
+    protocol_type, api_provider, model,
+    session_id, conversation_id, is_streaming,
+    request_body_ref, response_body_ref, request_body_delta, request_body_base
 ) VALUES (
     :id, :sequence, :timestamp, :agent_type, :source_pid,
     :method, :url, :host, :path,
     :request_headers, :request_body, :request_size,
     :status_code, :response_headers, :response_body, :response_size,
-    :sse_events, :duration_ms, :ttfb_ms,
-    :protocol_type, :api_provider,
-    :session_id, :conversation_id, :is_streaming
+    :sse_events, :response_message, :duration_ms, :ttfb_ms,
+    :ttft_ms, :max_gap_ms, :stall_count, :tokens_per_sec, :stream_timing,
+    :protocol_type, :api_provider, :model,
+    :session_id, :conversation_id, :is_streaming,
+    :request_body_ref, :response_body_ref, :request_body_delta, :request_body_base
 )
 """
 
@@ -92,6 +441,20 @@ VALUES (:id, :request_id, :event_index, :event_type, :data, :timestamp)
 """
 
 SELECT_REQUEST_BY_ID = "SELECT * FROM requests WHERE id = :id"
+SELECT_REQUEST_EXISTS = "SELECT 1 FROM requests WHERE id = :id"
+SELECT_BODY_COLUMNS = """
+SELECT request_body, request_body_ref, request_body_delta, request_headers,
+    response_body, response_body_ref, response_headers, is_streaming
+FROM requests WHERE id = :id
+"""
+SELECT_MAX_SEQUENCE = "SELECT MAX(sequence) FROM requests"
+SELECT_COMPRESSION_DICTIONARIES = "SELECT dict_id, data FROM compression_dictionaries"
+INSERT_COMPRESSION_DICTIONARY = (
+    "INSERT OR IGNORE INTO compression_dictionaries (dict_id, data) VALUES (?, ?)"
+)
+SELECT_REQUEST_BODY = """
+SELECT request_body, request_body_ref, request_body_delta FROM requests WHERE id = :id
+"""
 
 SELECT_SSE_EVENTS_BY_REQUEST = """
 SELECT * FROM sse_events WHERE request_id = :request_id ORDER BY event_index
@@ -99,17 +462,32 @@ SELECT * FROM sse_events WHERE request_id = :request_id ORDER BY event_index
 
 DELETE_ALL_REQUESTS = "DELETE FROM requests"
 DELETE_ALL_SSE_EVENTS = "DELETE FROM sse_events"
+DELETE_ALL_SEARCH_DOCS = "DELETE FROM requests_fts"
 
-STATS_QUERY = """
-SELECT
-    COUNT(*) AS total_requests,
-    COUNT(DISTINCT host) AS unique_hosts,
-    COUNT(DISTINCT agent_type) AS unique_agents,
-    SUM(request_size) AS total_request_bytes,
-    SUM(response_size) AS total_response_bytes,
-    AVG(duration_ms) AS avg_duration_ms,
-    SUM(CASE WHEN is_streaming = 1 THEN 1 ELSE 0 END) AS streaming_count
-FROM requests
+# A search document shares the rowid of its request, so deleting requests
+# can find their documents without scanning the index.
+INSERT_SEARCH_DOC = """
+INSERT INTO requests_fts (rowid, request_id, prompt, tools, response)
+SELECT rowid, :request_id, :prompt, :tools, :response FROM requests WHERE id = :request_id
+"""
+
+SELECT_RETENTION_TOTALS = """
+SELECT COALESCE(SUM(requests), 0), COALESCE(SUM(request_bytes + response_bytes), 0)
+FROM stats_counters WHERE dimension = 'total'
+"""
+SELECT_OLDEST_REQUESTS = """
+SELECT id, timestamp, request_size + response_size FROM requests
+ORDER BY sequence, rowid LIMIT :limit
+"""
+REBASE_REQUEST_BODY = """
+UPDATE requests SET request_body = :request_body, request_body_ref = :request_body_ref,
+    request_body_delta = NULL, request_body_base = NULL
+WHERE id = :id
+"""
+
+SELECT_BLOB_REFS = """
+SELECT request_body_ref FROM requests WHERE request_body_ref IS NOT NULL
+UNION SELECT response_body_ref FROM requests WHERE response_body_ref IS NOT NULL
 """
 
 SUMMARY_COLUMNS = (
@@ -126,16 +504,17 @@ FILTER_FIELDS: dict[str, str] = {
     "is_streaming": "is_streaming = :is_streaming",
     "session_id": "session_id = :session_id",
     "api_provider": "api_provider = :api_provider",
+    "model": "model = :model",
+    "stop_reason": "stop_reason = :stop_reason",
+    "mcp_method": "mcp_method = :mcp_method",
+    "enriched": "enriched = :enriched",
     "search": "(url LIKE :search OR host LIKE :search OR path LIKE :search)",
+    "since": "timestamp >= :since",
+    "until": "timestamp < :until",
 }
 
 
-def build_list_query(
-    filters: dict[str, object] | None = None,
-    order_by: str = "sequence DESC",
-    limit: int = 100,
-    offset: int = 0,
-) -> tuple[str, dict[str, object]]:
+def _filter_clauses(filters: dict[str, object] | None) -> tuple[list[str], dict[str, object]]:
     clauses: list[str] = []
     params: dict[str, object] = {}
 
@@ -145,11 +524,21 @@ def build_list_query(
                 clauses.append(FILTER_FIELDS[key])
                 if key == "search":
                     params["search"] = f"%{value}%"
-                elif key == "is_streaming":
-                    params["is_streaming"] = 1 if value else 0
+                elif key in ("is_streaming", "enriched"):
+                    params[key] = 1 if value else 0
                 else:
                     params[key] = value
 
+    return clauses, params
+
+
+def build_list_query(
+    filters: dict[str, object] | None = None,
+    order_by: str = "sequence DESC",
+    limit: int = 100,
+    offset: int = 0,
+) -> tuple[str, dict[str, object]]:
+    clauses, params = _filter_clauses(filters)
     where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
     sql = f"SELECT {SUMMARY_COLUMNS} FROM requests{where} ORDER BY {order_by} LIMIT :limit OFFSET :offset"
     params["limit"] = limit
@@ -158,8 +547,194 @@ def build_list_query(
     return sql, params
 
 
+def build_page_query(
+    filters: dict[str, object] | None = None,
+    after: tuple[int, int] | None = None,
+    limit: int = 100,
+) -> tuple[str, dict[str, object]]:
+    """Newest-first page of summaries strictly older than the ``after`` key.
+
+    Rows are ordered by ``(sequence, rowid)`` descending; the rowid breaks
+    ties between rows that share a sequence number. Each row carries its
+    ``rowid`` so the caller can build the key of the next page.
+    """
+    clauses, params = _filter_clauses(filters)
+    if after is not None:
+        clauses.append("(sequence, rowid) < (:after_sequence, :after_rowid)")
+        params["after_sequence"], params["after_rowid"] = after
+    where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+    sql = (
+        f"SELECT {SUMMARY_COLUMNS}, rowid FROM requests{where} "
+        "ORDER BY sequence DESC, rowid DESC LIMIT :limit"
+    )
+    params["limit"] = limit
+    return sql, params
+
+
+def build_export_query(filters: dict[str, object] | None = None) -> tuple[str, dict[str, object]]:
+    """Every matching full row, oldest first, for a single streaming pass.
+
+    Streams stored only as ``sse_events`` rows come back in an extra
+    ``sse_rows`` column as a JSON array, so no per-row follow-up query is needed.
+    """
+    clauses, params = _filter_clauses(filters)
+    where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+    sql = f"""
+SELECT requests.*,
+    CASE WHEN is_streaming = 1 AND sse_events IS NULL THEN (
+        SELECT json_group_array(json_object('event', s.event_type, 'data', s.data))
+        FROM (
+            SELECT event_type, data FROM sse_events
+            WHERE request_id = requests.id ORDER BY event_index
+        ) AS s
+    ) END AS sse_rows
+FROM requests{where}
+ORDER BY sequence, rowid
+"""
+    return sql, params
+
+
 def build_update_query(fields: dict[str, object], request_id: str) -> tuple[str, dict[str, object]]:
     set_clauses = [f"{key} = :{key}" for key in fields]
     params: dict[str, object] = {**fields, "id": request_id}
     sql = f"UPDATE requests SET {', '.join(set_clauses)} WHERE id = :id"
     return sql, params
+
+
+def fts_match_expression(query: str) -> str | None:
+    """Turn free text into an FTS5 query matching rows that contain every term.
+
+    Each whitespace-separated term is quoted, so FTS5 operators and
+    punctuation in user input are searched literally; a trailing ``*``
+    keeps its prefix-match meaning.
+    """
+    terms = []
+    for term in query.split():
+        prefix = term.endswith("*") and len(term) > 1
+        if prefix:
+            term = term[:-1]
+        quoted = '"' + term.replace('"', '""') + '"'
+        terms.append(quoted + "*" if prefix else quoted)
+    return " ".join(terms) or None
+
+
+def build_search_query(
+    match: str,
+    filters: dict[str, object] | None = None,
+    limit: int = 100,
+) -> tuple[str, dict[str, object]]:
+    """Best-ranked summaries for an FTS5 ``match`` expression, with a snippet each."""
+    clauses, params = _filter_clauses(filters)
+    clauses.insert(0, "requests_fts MATCH :match")
+    params["match"] = match
+    sql = (
+        f"SELECT {SUMMARY_COLUMNS}, "
+        "snippet(requests_fts, -1, '<mark>', '</mark>', '…', 16) AS snippet, rank "
+        "FROM requests_fts JOIN requests ON requests.id = requests_fts.request_id "
+        f"WHERE {' AND '.join(clauses)} ORDER BY rank LIMIT :limit"
+    )
+    params["limit"] = limit
+    return sql, params
+
+
+def _placeholders(values: list[str]) -> str:
+    return ", ".join("?" * len(values))
+
+
+def build_delete_queries(ids: list[str]) -> dict[str, tuple[str, list[str]]]:
+    """Statements for deleting a batch of requests, keyed by step.
+
+    ``dependents`` selects rows outside the batch whose request body is a
+    delta on a row inside it, ``refs`` the blob references of the batch,
+    and ``search``/``requests`` delete the rows; ``sse_events`` rows follow
+    through ``ON DELETE CASCADE``.
+    """
+    marks = _placeholders(ids)
+    return {
+        "dependents": (
+            f"SELECT id, request_body_delta FROM requests WHERE request_body_base IN ({marks}) "
+            f"AND id NOT IN ({marks})",
+            ids + ids,
+        ),
+        "refs": (
+            f"SELECT request_body_ref, response_body_ref FROM requests WHERE id IN ({marks})",
+            ids,
+        ),
+        "search": (
+            "DELETE FROM requests_fts WHERE rowid IN "
+            f"(SELECT rowid FROM requests WHERE id IN ({marks}))",
+            ids,
+        ),
+        "requests": (f"DELETE FROM requests WHERE id IN ({marks})", ids),
+    }
+
+
+def build_referenced_blobs_query(refs: list[str]) -> tuple[str, list[str]]:
+    """Those of ``refs`` that some request still points at."""
+    marks = _placeholders(refs)
+    sql = (
+        f"SELECT request_body_ref FROM requests WHERE request_body_ref IN ({marks}) "
+        f"UNION SELECT response_body_ref FROM requests WHERE response_body_ref IN ({marks})"
+    )
+    return sql, refs + refs
+
+
+def build_stats_source_query(ids: list[str]) -> tuple[str, list[str]]:
+    """The columns counters and rollups depend on, for those of ``ids`` that exist."""
+    columns = ", ".join(STATS_SOURCE_COLUMNS)
+    return f"SELECT id, {columns} FROM requests WHERE id IN ({_placeholders(ids)})", ids
+
+
+_ROLLUP_SKETCH_COLUMNS = (
+    "duration_sketch, ttfb_sketch, streams, stalls, ttft_sketch, tokens_per_sec_sketch"
+)
+
+
+def build_rollup_keys_query(keys: list[tuple[str, str, str, int]]) -> tuple[str, list[object]]:
+    """Stored rollups for ``(resolution, dimension, key, bucket)`` keys."""
+    values = ", ".join("(?, ?, ?, ?)" for _ in keys)
+    sql = (
+        "SELECT resolution, dimension, key, bucket, requests, request_bytes, response_bytes, "
+        f"errors, {_ROLLUP_SKETCH_COLUMNS} FROM rollups "
+        f"WHERE (resolution, dimension, key, bucket) IN (VALUES {values})"
+    )
+    return sql, [part for key in keys for part in key]
+
+
+def build_rollup_range_query(
+    resolution: str, dimension: str, key: str | None, start: int, end: int
+) -> tuple[str, dict[str, object]]:
+    """Rollups of one resolution and dimension with buckets in ``[start, end)``."""
+    sql = (
+        "SELECT key, bucket, requests, request_bytes, response_bytes, errors, "
+        f"{_ROLLUP_SKETCH_COLUMNS} FROM rollups "
+        "WHERE resolution = :resolution AND dimension = :dimension "
+        "AND bucket >= :start AND bucket < :end"
+    )
+    params: dict[str, object] = {
+        "resolution": resolution,
+        "dimension": dimension,
+        "start": start,
+        "end": end,
+    }
+    if key is not None:
+        sql += " AND key = :key"
+        params["key"] = key
+    return sql, params
+
+
+def build_sessions_query(
+    limit: int, agent_type: str | None = None, ids: list[str] | None = None
+) -> tuple[str, list[object]]:
+    """Session aggregates, most recently active first; only ``ids`` if given."""
+    clauses: list[str] = []
+    params: list[object] = []
+    if agent_type is not None:
+        clauses.append("agent_type = ?")
+        params.append(agent_type)
+    if ids is not None:
+        clauses.append(f"session_id IN ({_placeholders(ids)})")
+        params.extend(ids)
+    where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+    sql = f"SELECT {_SESSION_COLUMNS} FROM session_stats{where} ORDER BY last_seen DESC LIMIT ?"
+    return sql, [*params, limit]
@@ -0,0 +1,222 @@
+"""Compact records used on the capture path.
+
+The proxy hooks and the capture writer handle one :class:`CaptureRecord` per
+flow and one :class:`SSEBatch` per stream. Both are slotted dataclasses, so
+capturing costs no validation and no per-event objects; the Pydantic models
+in :mod:`agentprobe.storage.models` are only built at the API boundary.
+"""
+
+from __future__ import annotations
+
+import os
+import time
+import uuid
+from array import array
+from dataclasses import dataclass, field
+from datetime import UTC, datetime, timedelta
+from typing import Any
+
+from agentprobe.storage.models import CapturedRequest
+
+
+def _utcnow() -> datetime:
+    return datetime.now(UTC)
+
+
+def _uuid() -> str:
+    """A UUIDv7: 48 bits of Unix milliseconds, then version, variant and random bits.
+
+    Ids sort by creation time and carry it, see :func:`request_id_time`.
+    """
+    millis = time.time_ns() // 1_000_000
+    rand = int.from_bytes(os.urandom(10), "big")
+    value = (
+        millis << 80 | 0x7 << 76 | (rand >> 62 & 0xFFF) << 64 | 0b10 << 62 | rand & ((1 << 62) - 1)
+    )
+    return str(uuid.UUID(int=value))
+
+
+def request_id_time(request_id: str) -> datetime | None:
+    """When a request id made by this module was created; ``None`` for other ids."""
+    try:
+        value = uuid.UUID(request_id)
+    except ValueError:
+        return None
+    if value.version != 7:
+        return None
+    return datetime.fromtimestamp((value.int >> 80) / 1000, UTC)
+
+
+def sse_event_id(request_id: str, index: int) -> str:
+    """Row id of the ``index``-th event of a stream in the ``sse_events`` table."""
+    return f"{request_id}:{index}"
+
+
+@dataclass(slots=True)
+class SSEBatch:
+    """All events of one stream, stored column by column.
+
+    ``offsets`` holds the monotonic seconds between ``started_at`` and the
+    arrival of the chunk that completed each event. ``id`` and ``retry``
+    fields are rare, so they live in a sparse map keyed by event index.
+    Fields an event did not carry are ``None`` and stay absent from
+    :meth:`to_dicts`, which reproduces the parser output exactly.
+    """
+
+    started_at: datetime = field(default_factory=_utcnow)
+    event_types: list[str | None] = field(default_factory=list)
+    data: list[str | None] = field(default_factory=list)
+    offsets: array = field(default_factory=lambda: array("d"))
+    extras: dict[int, dict[str, str]] = field(default_factory=dict)
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+    def append(self, events: list[dict], offset: float) -> None:
+        """Add parsed events that arrived ``offset`` seconds into the stream."""
+        event_types = self.event_types
+        data = self.data
+        for event in events:
+            event_type = event.get("event")
+            value = event.get("data")
+            if len(event) > (event_type is not None) + (value is not None):
+                self.extras[len(data)] = {
+                    k: v for k, v in event.items() if k != "event" and k != "data"
+                }
+            event_types.append(event_type)
+            data.append(value)
+        self.offsets.extend([offset] * len(events))
+
+    def to_dicts(self, start: int = 0) -> list[dict[str, str]]:
+        events: list[dict[str, str]] = []
+        for index in range(start, len(self.data)):
+            event: dict[str, str] = {}
+            event_type = self.event_types[index]
+            if event_type is not None:
+                event["event"] = event_type
+            value = self.data[index]
+            if value is not None:
+                event["data"] = value
+            extra = self.extras.get(index)
+            if extra:
+                event.update(extra)
+            events.append(event)
+        return events
+
+    def rows(self, request_id: str) -> list[dict[str, Any]]:
+        """Parameters for ``INSERT_SSE_EVENT``, one dict per event."""
+        started_at = self.started_at
+        return [
+            {
+                "id": sse_event_id(request_id, index),
+                "request_id": request_id,
+                "event_index": index,
+                "event_type": event_type if event_type is not None else "message",
+                "data": value if value is not None else "",
+                "timestamp": (started_at + timedelta(seconds=offset)).isoformat(),
+            }
+            for index, (event_type, value, offset) in enumerate(
+                zip(self.event_types, self.data, self.offsets)
+            )
+        ]
+
+
+@dataclass(slots=True)
+class CaptureRecord:
+    """One captured flow while it is in flight and on its way to SQLite."""
+
+    sequence: int
+    agent_type: str
+    method: str
+    url: str
+    host: str
+    path: str
+    id: str = field(default_factory=_uuid)
+    timestamp: datetime = field(default_factory=_utcnow)
+    source_pid: int | None = None
+
+    request_headers: dict[str, str] = field(default_factory=dict)
+    request_body: str | None = None
+    request_size: int = 0
+
+    status_code: int | None = None
+    response_headers: dict[str, str] | None = None
+    response_body: str | None = None
+    response_size: int = 0
+
+    sse: SSEBatch | None = None
+    # A streamed response reassembled, see agentprobe.parser.reassembly.
+    response_message: dict[str, Any] | None = None
+    duration_ms: float | None = None
+    ttfb_ms: float | None = None
+    # Output timing of a stream, see agentprobe.proxy.timing.
+    ttft_ms: float | None = None
+    max_gap_ms: float | None = None
+    stall_count: int | None = None
+    tokens_per_sec: float | None = None
+    stream_timing: dict[str, list] | None = None
+
+    protocol_type: str = "http"
+    api_provider: str | None = None
+    model: str | None = None
+
+    session_id: str | None = None
+    conversation_id: str | None = None
+    is_streaming: bool = False
+
+    def summary_dict(self) -> dict[str, Any]:
+        """The fields of :class:`RequestSummary` as a plain dict, ready for encoding."""
+        return {
+            "id": self.id,
+            "sequence": self.sequence,
+            "timestamp": self.timestamp,
+            "method": self.method,
+            "host": self.host,
+            "path": self.path,
+            "status_code": self.status_code,
+            "agent_type": self.agent_type,
+            "protocol_type": self.protocol_type,
+            "duration_ms": self.duration_ms,
+            "response_size": self.response_size,
+            "is_streaming": self.is_streaming,
+        }
+
+    def response_fields(self) -> dict[str, Any]:
+        """Columns filled in once the response is known, for ``update_request``."""
+        return {
+            "status_code": self.status_code,
+            "response_headers": self.response_headers,
+            "response_body": self.response_body,
+            "response_size": self.response_size,
+            "duration_ms": self.duration_ms,
+            "ttfb_ms": self.ttfb_ms,
+            "ttft_ms": self.ttft_ms,
+            "max_gap_ms": self.max_gap_ms,
+            "stall_count": self.stall_count,
+            "tokens_per_sec": self.tokens_per_sec,
+            "stream_timing": self.stream_timing,
+            "is_streaming": self.is_streaming,
+            "sse_events": self.sse,
+            "response_message": self.response_message,
+        }
+
+    def to_dict(self) -> dict[str, Any]:
+        """Every field except the stream, ready for encoding."""
+        data = {name: getattr(self, name) for name in _RECORD_FIELDS}
+        del data["sse"]
+        return data
+
+    @classmethod
+    def from_dict(cls, data: dict[str, Any]) -> CaptureRecord:
+        data = {name: data[name] for name in _RECORD_FIELDS if name in data}
+        if isinstance(data.get("timestamp"), str):
+            data["timestamp"] = datetime.fromisoformat(data["timestamp"])
+        return cls(**data)
+
+    def to_model(self) -> CapturedRequest:
+        data = self.to_dict()
+        data["sse_events"] = self.sse.to_dicts() if self.sse is not None else None
+        return CapturedRequest.model_validate(data)
+
+
+_RECORD_FIELDS = CaptureRecord.__slots__
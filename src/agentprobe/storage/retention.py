@@ -0,0 +1,165 @@
+"""Background enforcement of retention limits on the capture store."""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from typing import TYPE_CHECKING, Any
+
+from agentprobe.storage.partitions import PartitionedDatabase
+
+if TYPE_CHECKING:
+    from agentprobe.storage.database import Database
+
+log = logging.getLogger(__name__)
+
+
+class RetentionWorker:
+    """Deletes the oldest requests once a limit is exceeded, then compacts.
+
+    Every ``interval`` seconds a pass deletes requests beyond
+    ``max_requests`` rows, older than ``max_age`` seconds or beyond
+    ``max_bytes`` captured bytes, oldest first, in transactions of at most
+    ``batch_size`` rows so capture writes can interleave. Once the database
+    has seen no writes for ``idle_after`` seconds after a pass deleted
+    something, freed pages are handed back and the WAL is truncated.
+    A limit of ``None`` is not enforced.
+
+    On a :class:`PartitionedDatabase` a pass drops whole partition files
+    instead, so a limit takes effect once the oldest partition lies
+    entirely beyond it.
+    """
+
+    def __init__(
+        self,
+        db: Database | PartitionedDatabase,
+        max_requests: int | None = None,
+        max_age: float | None = None,
+        max_bytes: int | None = None,
+        interval: float = 30.0,
+        batch_size: int = 200,
+        idle_after: float = 5.0,
+    ) -> None:
+        self._db = db
+        self._max_requests = max_requests
+        self._max_age = max_age
+        self._max_bytes = max_bytes
+        self._interval = interval
+        self._batch_size = max(1, batch_size)
+        self._idle_after = idle_after
+        self._task: asyncio.Task[None] | None = None
+        self._needs_compaction = False
+
+        self._passes = 0
+        self._deleted = 0
+        self._rebased = 0
+        self._blobs_deleted = 0
+        self._partitions_dropped = 0
+        self._compactions = 0
+        self._reclaimed_bytes = 0
+        self._last_pass: dict[str, Any] | None = None
+        self._last_compaction: dict[str, Any] | None = None
+
+    @property
+    def enabled(self) -> bool:
+        return any(
+            limit is not None for limit in (self._max_requests, self._max_age, self._max_bytes)
+        )
+
+    def start(self) -> None:
+        if self._task is None and self.enabled:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def close(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def run_pass(self) -> dict[str, Any]:
+        """Delete everything over the limits now and return what was done."""
+        started = time.perf_counter()
+        totals = {"deleted": 0, "rebased": 0, "blobs": 0}
+        if isinstance(self._db, PartitionedDatabase):
+            dropped = await self._db.drop_partitions(
+                self._max_requests, self._max_age, self._max_bytes
+            )
+            self._partitions_dropped += dropped.pop("partitions")
+            totals.update(dropped)
+        else:
+            await self._prune_rows(totals)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+
+        self._passes += 1
+        self._deleted += totals["deleted"]
+        self._rebased += totals["rebased"]
+        self._blobs_deleted += totals["blobs"]
+        self._last_pass = {**totals, "duration_ms": elapsed_ms}
+        if totals["deleted"]:
+            self._needs_compaction = True
+            log.info(
+                "retention pass deleted %d requests and %d blobs in %.1f ms",
+                totals["deleted"],
+                totals["blobs"],
+                elapsed_ms,
+            )
+        return self._last_pass
+
+    async def _prune_rows(self, totals: dict[str, int]) -> None:
+        while True:
+            ids = await self._db.prune_candidates(
+                self._max_requests, self._max_age, self._max_bytes, limit=self._batch_size
+            )
+            if not ids:
+                break
+            result = await self._db.delete_requests(ids)
+            for key, value in result.items():
+                totals[key] += value
+            if not result["deleted"]:
+                break
+            # Let queued capture writes in between batches.
+            await asyncio.sleep(0)
+
+    async def compact(self) -> dict[str, Any]:
+        """Reclaim free space now and return how much and how long it took."""
+        started = time.perf_counter()
+        reclaimed = await self._db.reclaim_space()
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        self._needs_compaction = False
+        self._compactions += 1
+        self._reclaimed_bytes += reclaimed
+        self._last_compaction = {"reclaimed_bytes": reclaimed, "duration_ms": elapsed_ms}
+        log.info("compaction reclaimed %d bytes in %.1f ms", reclaimed, elapsed_ms)
+        return self._last_compaction
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "max_requests": self._max_requests,
+            "max_age": self._max_age,
+            "max_bytes": self._max_bytes,
+            "passes": self._passes,
+            "deleted": self._deleted,
+            "rebased": self._rebased,
+            "blobs_deleted": self._blobs_deleted,
+            "partitions_dropped": self._partitions_dropped,
+            "compactions": self._compactions,
+            "reclaimed_bytes": self._reclaimed_bytes,
+            "last_pass": self._last_pass,
+            "last_compaction": self._last_compaction,
+        }
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.run_pass()
+                if self._needs_compaction and self._db.idle_seconds >= self._idle_after:
+                    await self.compact()
+            except Exception:
+                log.exception("retention pass failed")
+            await asyncio.sleep(self._interval)
@@ -0,0 +1,323 @@
+"""Per-minute, hour and day rollups of completed flows with latency sketches."""
+
+from __future__ import annotations
+
+import math
+from collections.abc import Iterable, Mapping, Sequence
+from datetime import UTC, datetime
+from typing import Any
+
+from agentprobe.serialization import dumps_str, loads
+from agentprobe.storage.queries import STATS_DIMENSIONS
+
+# Bucket widths in seconds; buckets start at multiples of the width in UTC.
+RESOLUTIONS = {"minute": 60, "hour": 3600, "day": 86400}
+
+# Dimensions rolled up, with the requests column each groups by.
+ROLLUP_DIMENSIONS = {
+    "total": None,
+    **{d: STATS_DIMENSIONS[d] for d in ("agent", "provider", "host", "model")},
+}
+
+_GROUP_DIMENSIONS = [d for d, column in ROLLUP_DIMENSIONS.items() if column is not None]
+_GROUP_COLUMNS = [ROLLUP_DIMENSIONS[d] for d in _GROUP_DIMENSIONS]
+
+# Seconds rollups of each resolution are kept; day rollups are kept forever.
+DEFAULT_ROLLUP_RETENTION = {"minute": 2 * 86400.0, "hour": 90 * 86400.0}
+
+# Quantiles are within this fraction of the true value.
+_RELATIVE_ACCURACY = 0.01
+_GAMMA = (1 + _RELATIVE_ACCURACY) / (1 - _RELATIVE_ACCURACY)
+_LOG_GAMMA = math.log(_GAMMA)
+# Latencies below this many milliseconds all count as zero.
+_MIN_VALUE = 1e-3
+
+
+class LatencySketch:
+    """Mergeable quantile sketch: a histogram with logarithmically growing buckets.
+
+    Bucket ``i`` holds values in ``(gamma**(i-1), gamma**i]``, so any
+    quantile read back is within 1% of the recorded value, over any range
+    of latencies, in a few hundred buckets at most. Two sketches merge by
+    adding their bucket counts, which is what lets per-minute sketches be
+    combined into hours or an arbitrary window exactly.
+    """
+
+    __slots__ = ("buckets", "zeros", "count", "total", "low", "high")
+
+    def __init__(self) -> None:
+        self.buckets: dict[int, int] = {}
+        self.zeros = 0
+        self.count = 0
+        self.total = 0.0
+        self.low = math.inf
+        self.high = -math.inf
+
+    def add(self, value: float) -> None:
+        if value > _MIN_VALUE:
+            index = math.ceil(math.log(value) / _LOG_GAMMA)
+            self.buckets[index] = self.buckets.get(index, 0) + 1
+        else:
+            self.zeros += 1
+        self.count += 1
+        self.total += value
+        if value < self.low:
+            self.low = value
+        if value > self.high:
+            self.high = value
+
+    def merge(self, other: LatencySketch) -> None:
+        for index, count in other.buckets.items():
+            self.buckets[index] = self.buckets.get(index, 0) + count
+        self.zeros += other.zeros
+        self.count += other.count
+        self.total += other.total
+        self.low = min(self.low, other.low)
+        self.high = max(self.high, other.high)
+
+    def quantile(self, q: float) -> float | None:
+        if not self.count:
+            return None
+        if q >= 1:
+            return self.high
+        rank = q * (self.count - 1)
+        seen = self.zeros
+        if seen > rank:
+            return max(self.low, 0.0)
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if seen > rank:
+                estimate = 2 * _GAMMA**index / (_GAMMA + 1)
+                return min(max(estimate, self.low), self.high)
+        return self.high
+
+    def summary(self, quantiles: Sequence[float]) -> dict[str, Any]:
+        data: dict[str, Any] = {
+            "count": self.count,
+            "mean": self.total / self.count if self.count else None,
+            "min": self.low if self.count else None,
+            "max": self.high if self.count else None,
+        }
+        for q in quantiles:
+            data[quantile_label(q)] = self.quantile(q)
+        return data
+
+    def to_json(self) -> str:
+        return dumps_str(
+            {
+                "n": self.count,
+                "z": self.zeros,
+                "s": self.total,
+                "lo": self.low if self.count else None,
+                "hi": self.high if self.count else None,
+                "b": sorted(self.buckets.items()),
+            }
+        )
+
+    @classmethod
+    def from_json(cls, text: str) -> LatencySketch:
+        data = loads(text)
+        sketch = cls()
+        sketch.buckets = {index: count for index, count in data["b"]}
+        sketch.zeros = data["z"]
+        sketch.count = data["n"]
+        sketch.total = data["s"]
+        if sketch.count:
+            sketch.low = data["lo"]
+            sketch.high = data["hi"]
+        return sketch
+
+
+def quantile_label(q: float) -> str:
+    """``0.5`` -> ``"p50"``, ``0.999`` -> ``"p99.9"``."""
+    return f"p{q * 100:g}"
+
+
+class Rollup:
+    """Counts, bytes, errors and latency sketches of the flows in one bucket.
+
+    Streams with output timing (see :mod:`agentprobe.proxy.timing`) also
+    count into ``streams``, ``stalls`` and the ``ttft`` and
+    ``tokens_per_sec`` sketches.
+    """
+
+    __slots__ = (
+        "requests",
+        "request_bytes",
+        "response_bytes",
+        "errors",
+        "duration",
+        "ttfb",
+        "streams",
+        "stalls",
+        "ttft",
+        "tokens_per_sec",
+    )
+
+    def __init__(self) -> None:
+        self.requests = 0
+        self.request_bytes = 0
+        self.response_bytes = 0
+        self.errors = 0
+        self.duration = LatencySketch()
+        self.ttfb = LatencySketch()
+        self.streams = 0
+        self.stalls = 0
+        self.ttft = LatencySketch()
+        self.tokens_per_sec = LatencySketch()
+
+    def add(self, row: Mapping[str, Any]) -> None:
+        self.requests += 1
+        self.request_bytes += row["request_size"]
+        self.response_bytes += row["response_size"]
+        status = row["status_code"]
+        if status is None or status >= 400:
+            self.errors += 1
+        self.duration.add(row["duration_ms"])
+        if row["ttfb_ms"] is not None:
+            self.ttfb.add(row["ttfb_ms"])
+        if row["ttft_ms"] is not None:
+            self.streams += 1
+            self.stalls += row["stall_count"] or 0
+            self.ttft.add(row["ttft_ms"])
+            if row["tokens_per_sec"] is not None:
+                self.tokens_per_sec.add(row["tokens_per_sec"])
+
+    def merge(self, other: Rollup) -> None:
+        self.requests += other.requests
+        self.request_bytes += other.request_bytes
+        self.response_bytes += other.response_bytes
+        self.errors += other.errors
+        self.duration.merge(other.duration)
+        self.ttfb.merge(other.ttfb)
+        self.streams += other.streams
+        self.stalls += other.stalls
+        self.ttft.merge(other.ttft)
+        self.tokens_per_sec.merge(other.tokens_per_sec)
+
+    def params(self) -> dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "request_bytes": self.request_bytes,
+            "response_bytes": self.response_bytes,
+            "errors": self.errors,
+            "duration_sketch": self.duration.to_json(),
+            "ttfb_sketch": self.ttfb.to_json(),
+            "streams": self.streams,
+            "stalls": self.stalls,
+            "ttft_sketch": self.ttft.to_json(),
+            "tokens_per_sec_sketch": self.tokens_per_sec.to_json(),
+        }
+
+    @classmethod
+    def from_row(cls, row: Mapping[str, Any]) -> Rollup:
+        rollup = cls()
+        rollup.requests = row["requests"]
+        rollup.request_bytes = row["request_bytes"]
+        rollup.response_bytes = row["response_bytes"]
+        rollup.errors = row["errors"]
+        rollup.duration = LatencySketch.from_json(row["duration_sketch"])
+        rollup.ttfb = LatencySketch.from_json(row["ttfb_sketch"])
+        rollup.streams = row["streams"]
+        rollup.stalls = row["stalls"]
+        # Rolled up before stream timing was recorded.
+        if row["ttft_sketch"] is not None:
+            rollup.ttft = LatencySketch.from_json(row["ttft_sketch"])
+            rollup.tokens_per_sec = LatencySketch.from_json(row["tokens_per_sec_sketch"])
+        return rollup
+
+    def summary(self, quantiles: Sequence[float]) -> dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "request_bytes": self.request_bytes,
+            "response_bytes": self.response_bytes,
+            "errors": self.errors,
+            "duration_ms": self.duration.summary(quantiles),
+            "ttfb_ms": self.ttfb.summary(quantiles),
+            "streams": self.streams,
+            "stalls": self.stalls,
+            "ttft_ms": self.ttft.summary(quantiles),
+            "tokens_per_sec": self.tokens_per_sec.summary(quantiles),
+        }
+
+
+# (resolution, dimension, key, bucket start in epoch seconds)
+RollupKey = tuple[str, str, str, int]
+
+
+class RollupDelta:
+    """Rollup buckets touched by one write transaction.
+
+    :meth:`add` counts a completed flow, a row with the requests columns in
+    :data:`~agentprobe.storage.queries.STATS_SOURCE_COLUMNS`, into the
+    bucket of its start time at every resolution and dimension. Flows are
+    first grouped by minute and all dimension values, so a batch pays one
+    sketch update per flow and one merge per group and rollup it feeds.
+    """
+
+    def __init__(self) -> None:
+        self._groups: dict[tuple[Any, ...], Rollup] = {}
+
+    def __bool__(self) -> bool:
+        return bool(self._groups)
+
+    def add(self, row: Mapping[str, Any]) -> None:
+        timestamp = row["timestamp"]
+        if isinstance(timestamp, str):
+            timestamp = datetime.fromisoformat(timestamp)
+        minute = int(timestamp.timestamp() // 60 * 60)
+        group = (minute, *(row[column] or "" for column in _GROUP_COLUMNS))
+        rollup = self._groups.get(group)
+        if rollup is None:
+            rollup = self._groups[group] = Rollup()
+        rollup.add(row)
+
+    def rollups(self) -> dict[RollupKey, Rollup]:
+        """The rollup of every bucket the added flows fall in."""
+        rollups: dict[RollupKey, Rollup] = {}
+        for (minute, *values), group in self._groups.items():
+            keys = [("total", "")] + list(zip(_GROUP_DIMENSIONS, values, strict=True))
+            for resolution, width in RESOLUTIONS.items():
+                bucket = minute // width * width
+                for dimension, key in keys:
+                    rollup = rollups.get((resolution, dimension, key, bucket))
+                    if rollup is None:
+                        rollup = rollups[(resolution, dimension, key, bucket)] = Rollup()
+                    rollup.merge(group)
+        return rollups
+
+
+def merge_rollups(
+    rows: Iterable[tuple[str, int, Rollup]],
+) -> dict[str, dict[int, Rollup]]:
+    """Combine ``(key, bucket, rollup)`` rows, e.g. from several databases, by key and bucket."""
+    merged: dict[str, dict[int, Rollup]] = {}
+    for key, bucket, rollup in rows:
+        buckets = merged.setdefault(key, {})
+        existing = buckets.get(bucket)
+        if existing is None:
+            buckets[bucket] = rollup
+        else:
+            existing.merge(rollup)
+    return merged
+
+
+def build_timeseries(
+    merged: Mapping[str, Mapping[int, Rollup]], quantiles: Sequence[float]
+) -> list[dict[str, Any]]:
+    """One series per key, oldest bucket first, each with a summary of its whole window."""
+    series = []
+    for key in sorted(merged):
+        window = Rollup()
+        points = []
+        for bucket in sorted(merged[key]):
+            rollup = merged[key][bucket]
+            window.merge(rollup)
+            points.append(
+                {
+                    "bucket": datetime.fromtimestamp(bucket, UTC),
+                    **rollup.summary(quantiles),
+                }
+            )
+        series.append({"key": key, "window": window.summary(quantiles), "points": points})
+    return series
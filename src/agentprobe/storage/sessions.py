@@ -0,0 +1,134 @@
+"""Per-session aggregates kept next to the requests they count."""
+
+from __future__ import annotations
+
+from collections.abc import Iterable, Mapping
+from datetime import datetime
+from typing import Any
+
+# session_stats columns summed over the requests of a session.
+SESSION_COUNTERS = (
+    "requests",
+    "errors",
+    "request_bytes",
+    "response_bytes",
+    "duration_sum",
+    "duration_count",
+    "input_tokens",
+    "output_tokens",
+    "tool_calls",
+)
+
+
+class SessionDelta:
+    """Changes to ``session_stats`` collected over one write transaction.
+
+    Works like :class:`~agentprobe.storage.stats.StatsDelta` on the same
+    rows, with one counter row per ``session_id``; rows without a session
+    are not counted. Tokens and tool calls arrive with enrichment, after
+    the request is counted, and are added by :meth:`replace` then.
+    """
+
+    def __init__(self) -> None:
+        # session id -> [agent_type, host, first_seen, last_seen, *SESSION_COUNTERS]
+        self._sessions: dict[str, list[Any]] = {}
+
+    def __bool__(self) -> bool:
+        return bool(self._sessions)
+
+    def add(self, row: Mapping[str, Any], sign: int = 1) -> None:
+        if row["session_id"]:
+            self._apply(row, _values(row, sign))
+
+    def replace(self, old: Mapping[str, Any], new: Mapping[str, Any]) -> None:
+        """Count ``new`` instead of ``old``, the same row before an update."""
+        if old["session_id"] != new["session_id"]:
+            self.add(old, -1)
+            self.add(new)
+            return
+        if not new["session_id"]:
+            return
+        before, after = _values(old, 1), _values(new, 1)
+        if before != after:
+            self._apply(new, tuple(a - b for a, b in zip(after, before)))
+
+    def _apply(self, row: Mapping[str, Any], values: tuple[float, ...]) -> None:
+        timestamp = row["timestamp"]
+        if isinstance(timestamp, datetime):
+            timestamp = timestamp.isoformat()
+        entry = self._sessions.get(row["session_id"])
+        if entry is None:
+            self._sessions[row["session_id"]] = [
+                row["agent_type"],
+                row["host"],
+                timestamp,
+                timestamp,
+                *values,
+            ]
+            return
+        entry[2] = min(entry[2], timestamp)
+        entry[3] = max(entry[3], timestamp)
+        for index, value in enumerate(values, start=4):
+            entry[index] += value
+
+    def params(self) -> list[dict[str, Any]]:
+        return [
+            {
+                "session_id": session_id,
+                "agent_type": agent_type,
+                "host": host,
+                "first_seen": first_seen,
+                "last_seen": last_seen,
+                **dict(zip(SESSION_COUNTERS, counters)),
+            }
+            for session_id, (
+                agent_type,
+                host,
+                first_seen,
+                last_seen,
+                *counters,
+            ) in self._sessions.items()
+        ]
+
+
+def _values(row: Mapping[str, Any], sign: int) -> tuple[float, ...]:
+    duration = row["duration_ms"]
+    status = row["status_code"]
+    return (
+        sign,
+        sign * (status is not None and status >= 400),
+        sign * row["request_size"],
+        sign * row["response_size"],
+        sign * (duration or 0),
+        sign * (duration is not None),
+        sign * (row["input_tokens"] or 0),
+        sign * (row["output_tokens"] or 0),
+        sign * (row["tool_call_count"] or 0),
+    )
+
+
+# Served as avg_duration_ms instead.
+_AVERAGED = ("duration_sum", "duration_count")
+
+
+def merge_sessions(rows: Iterable[Mapping[str, Any]]) -> dict[str, dict[str, Any]]:
+    """Combine ``session_stats`` rows, e.g. from several databases, by session."""
+    merged: dict[str, dict[str, Any]] = {}
+    for row in rows:
+        existing = merged.get(row["session_id"])
+        if existing is None:
+            merged[row["session_id"]] = dict(row)
+            continue
+        existing["first_seen"] = min(existing["first_seen"], row["first_seen"])
+        existing["last_seen"] = max(existing["last_seen"], row["last_seen"])
+        for counter in SESSION_COUNTERS:
+            existing[counter] += row[counter]
+    return merged
+
+
+def session_summary(row: Mapping[str, Any]) -> dict[str, Any]:
+    """A ``session_stats`` row as served by ``/api/sessions``."""
+    data = {name: value for name, value in row.items() if name not in _AVERAGED}
+    count = row["duration_count"]
+    data["avg_duration_ms"] = row["duration_sum"] / count if count else None
+    return data
@@ -0,0 +1,121 @@
+"""Aggregate stats kept as counters next to the requests they count."""
+
+from __future__ import annotations
+
+from collections.abc import Mapping, Sequence
+from typing import Any
+
+from agentprobe.storage.queries import STATS_DIMENSIONS, STATS_SOURCE_COLUMNS
+
+# stats_parts() totals and the stats_counters columns they are read from.
+TOTAL_COLUMNS = {
+    "total_requests": "requests",
+    "total_request_bytes": "request_bytes",
+    "total_response_bytes": "response_bytes",
+    "duration_sum": "duration_sum",
+    "duration_count": "duration_count",
+    "streaming_count": "streaming",
+}
+
+_COUNTERS = tuple(TOTAL_COLUMNS.values())
+
+
+class StatsDelta:
+    """Changes to ``stats_counters`` collected over one write transaction.
+
+    Rows are mappings with the :data:`STATS_SOURCE_COLUMNS`; :meth:`add`
+    counts one in (or out, with ``sign=-1``) of every dimension, and
+    :meth:`params` yields one upsert per counter row that changed.
+    """
+
+    def __init__(self) -> None:
+        self._counters: dict[tuple[str, str], list[float]] = {}
+
+    def __bool__(self) -> bool:
+        return bool(self._counters)
+
+    def add(self, row: Mapping[str, Any], sign: int = 1) -> None:
+        self._apply(_keys(row), _values(row, sign))
+
+    def replace(self, old: Mapping[str, Any], new: Mapping[str, Any]) -> None:
+        """Count ``new`` instead of ``old``, the same row before an update."""
+        keys = _keys(new)
+        if keys != _keys(old):
+            self.add(old, -1)
+            self._apply(keys, _values(new, 1))
+            return
+        # Same counter rows: apply the difference once instead of out and in.
+        before, after = _values(old, 1), _values(new, 1)
+        if before != after:
+            self._apply(keys, tuple(a - b for a, b in zip(after, before)))
+
+    def _apply(self, keys: list[tuple[str, str]], values: tuple[float, ...]) -> None:
+        requests, request_bytes, response_bytes, duration_sum, duration_count, streaming = values
+        for key in keys:
+            counters = self._counters.get(key)
+            if counters is None:
+                self._counters[key] = list(values)
+            else:
+                counters[0] += requests
+                counters[1] += request_bytes
+                counters[2] += response_bytes
+                counters[3] += duration_sum
+                counters[4] += duration_count
+                counters[5] += streaming
+
+    def params(self) -> list[dict[str, Any]]:
+        return [
+            {"dimension": dimension, "key": key, **dict(zip(_COUNTERS, counters))}
+            for (dimension, key), counters in self._counters.items()
+            if any(counters)
+        ]
+
+
+def _keys(row: Mapping[str, Any]) -> list[tuple[str, str]]:
+    keys = [("total", "")]
+    keys.extend((dimension, row[column] or "") for dimension, column in STATS_DIMENSIONS.items())
+    return keys
+
+
+def _values(row: Mapping[str, Any], sign: int) -> tuple[float, ...]:
+    duration = row["duration_ms"]
+    return (
+        sign,
+        sign * row["request_size"],
+        sign * row["response_size"],
+        sign * (duration or 0),
+        sign * (duration is not None),
+        sign * bool(row["is_streaming"]),
+    )
+
+
+def source_row(params: Mapping[str, Any]) -> dict[str, Any]:
+    """The columns counted by :class:`StatsDelta` out of a row's insert parameters.
+
+    Columns the enrichment worker fills in later are not inserted, so they start as ``None``.
+    """
+    return {column: params.get(column) for column in STATS_SOURCE_COLUMNS}
+
+
+def summarize_stats(parts: Sequence[dict[str, Any]]) -> dict[str, Any]:
+    """The ``/api/stats`` figures for the union of databases with these ``stats_parts``."""
+    totals = {name: sum(p[name] for p in parts) for name in TOTAL_COLUMNS}
+    counts: dict[str, dict[str, int]] = {dimension: {} for dimension in STATS_DIMENSIONS}
+    for p in parts:
+        for dimension, values in p["counts"].items():
+            merged = counts[dimension]
+            for key, requests in values.items():
+                merged[key] = merged.get(key, 0) + requests
+    duration_count = totals["duration_count"]
+    return {
+        "total_requests": totals["total_requests"],
+        "unique_hosts": len(counts["host"]),
+        "unique_agents": len(counts["agent"]),
+        "total_request_bytes": totals["total_request_bytes"],
+        "total_response_bytes": totals["total_response_bytes"],
+        "avg_duration_ms": totals["duration_sum"] / duration_count if duration_count else None,
+        "streaming_count": totals["streaming_count"],
+        # The shape the web UI's stats_update handler reads.
+        "total_size": totals["total_response_bytes"],
+        **{f"requests_by_{dimension}": values for dimension, values in counts.items()},
+    }
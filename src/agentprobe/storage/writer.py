@@ -0,0 +1,248 @@
+"""Write-behind queue that groups capture writes into batched transactions."""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from collections.abc import Callable
+from typing import TYPE_CHECKING, Any
+
+from agentprobe.parser.text import extract_search_text
+
+if TYPE_CHECKING:
+    from agentprobe.storage.database import Database, SearchDocument
+    from agentprobe.storage.records import CaptureRecord, SSEBatch
+
+log = logging.getLogger(__name__)
+
+OVERFLOW_POLICIES = ("block", "drop")
+
+# Remember this many request ids whose insert was dropped, so that their
+# follow-up updates and SSE rows are discarded instead of failing the batch.
+_DROPPED_ID_MEMORY = 4096
+
+_WriteOp = tuple[str, Any]
+
+
+class CaptureWriter:
+    """Bounded write-behind queue in front of :class:`Database`.
+
+    Producers enqueue inserts, updates and SSE rows; a single flush task
+    drains them and commits one transaction per flush window. A window
+    closes when ``batch_size`` operations are collected or ``flush_interval``
+    seconds have passed since its first operation, whichever comes first.
+
+    When the queue is full, the ``"block"`` policy makes producers wait for
+    room (backpressure on the proxy hooks) and the ``"drop"`` policy discards
+    the operation and counts it.
+
+    With ``search_index`` on, finished requests can also be queued for the
+    full-text index. Indexing is best effort: it never waits for room in the
+    queue, and text extraction runs in a worker thread during the flush.
+
+    ``on_commit``, when given, is called with the id of every inserted
+    request once the transaction holding the insert has committed.
+    """
+
+    def __init__(
+        self,
+        db: Database,
+        queue_size: int = 10000,
+        batch_size: int = 500,
+        flush_interval: float = 0.05,
+        overflow: str = "block",
+        search_index: bool = True,
+        on_commit: Callable[[str], None] | None = None,
+    ) -> None:
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"unknown overflow policy: {overflow!r}")
+        self._db = db
+        self._queue: asyncio.Queue[_WriteOp | None] = asyncio.Queue(maxsize=queue_size)
+        self._batch_size = max(1, batch_size)
+        self._flush_interval = flush_interval
+        self._overflow = overflow
+        self._search_index = search_index
+        self._on_commit = on_commit
+        self._task: asyncio.Task[None] | None = None
+        self._dropped_ids: dict[str, None] = {}
+
+        self._enqueued = 0
+        self._written = 0
+        self._dropped = 0
+        self._blocked = 0
+        self._failed = 0
+        self._indexed = 0
+        self._index_skipped = 0
+        self._flushes = 0
+        self._last_batch_size = 0
+        self._last_flush_ms: float | None = None
+        self._max_flush_ms = 0.0
+        self._total_flush_ms = 0.0
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def close(self) -> None:
+        """Flush everything still queued and stop the flush task."""
+        if self._task is None:
+            return
+        await self._queue.put(None)
+        await self._task
+        self._task = None
+
+    async def save_request(self, request: CaptureRecord) -> bool:
+        accepted = await self._put(("insert", request), request.id)
+        if not accepted:
+            self._remember_dropped(request.id)
+        return accepted
+
+    async def update_request(self, request_id: str, fields: dict[str, Any]) -> bool:
+        return await self._put(("update", (request_id, fields)), request_id)
+
+    async def save_sse_batch(self, request_id: str, batch: SSEBatch) -> bool:
+        if not batch:
+            return True
+        return await self._put(("sse", (request_id, batch)), request_id)
+
+    async def index_request(self, request: CaptureRecord) -> bool:
+        """Queue a finished request for the full-text index if there is room."""
+        if not self._search_index or request.id in self._dropped_ids:
+            return False
+        try:
+            self._queue.put_nowait(("index", request))
+        except asyncio.QueueFull:
+            self._index_skipped += 1
+            return False
+        self._enqueued += 1
+        return True
+
+    @property
+    def depth(self) -> int:
+        return self._queue.qsize()
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "depth": self._queue.qsize(),
+            "capacity": self._queue.maxsize,
+            "overflow": self._overflow,
+            "enqueued": self._enqueued,
+            "written": self._written,
+            "dropped": self._dropped,
+            "blocked": self._blocked,
+            "failed": self._failed,
+            "indexed": self._indexed,
+            "index_skipped": self._index_skipped,
+            "flushes": self._flushes,
+            "last_batch_size": self._last_batch_size,
+            "last_flush_ms": self._last_flush_ms,
+            "max_flush_ms": self._max_flush_ms,
+            "avg_flush_ms": self._total_flush_ms / self._flushes if self._flushes else None,
+        }
+
+    async def _put(self, op: _WriteOp, request_id: str) -> bool:
+        if op[0] != "insert" and request_id in self._dropped_ids:
+            self._dropped += 1
+            return False
+        if self._overflow == "drop":
+            try:
+                self._queue.put_nowait(op)
+            except asyncio.QueueFull:
+                self._dropped += 1
+                return False
+        else:
+            if self._queue.full():
+                self._blocked += 1
+            await self._queue.put(op)
+        self._enqueued += 1
+        return True
+
+    def _remember_dropped(self, request_id: str) -> None:
+        self._dropped_ids[request_id] = None
+        if len(self._dropped_ids) > _DROPPED_ID_MEMORY:
+            del self._dropped_ids[next(iter(self._dropped_ids))]
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            op = await self._queue.get()
+            if op is None:
+                break
+            batch = [op]
+            deadline = loop.time() + self._flush_interval
+            while len(batch) < self._batch_size:
+                try:
+                    nxt = self._queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        nxt = await asyncio.wait_for(self._queue.get(), timeout)
+                    except TimeoutError:
+                        break
+                if nxt is None:
+                    stopping = True
+                    break
+                batch.append(nxt)
+            await self._flush(batch)
+
+    async def _flush(self, batch: list[_WriteOp]) -> None:
+        started = time.perf_counter()
+        try:
+            await self._write(batch)
+            self._written += len(batch)
+        except Exception:
+            log.warning(
+                "batched write of %d ops failed, retrying one by one", len(batch), exc_info=True
+            )
+            for op in batch:
+                try:
+                    await self._write([op])
+                    self._written += 1
+                except Exception:
+                    self._failed += 1
+                    log.exception("capture write failed (%s)", op[0])
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        self._flushes += 1
+        self._last_batch_size = len(batch)
+        self._last_flush_ms = elapsed_ms
+        self._total_flush_ms += elapsed_ms
+        self._max_flush_ms = max(self._max_flush_ms, elapsed_ms)
+
+    async def _write(self, batch: list[_WriteOp]) -> None:
+        inserts: list[CaptureRecord] = []
+        updates: list[tuple[str, dict[str, Any]]] = []
+        sse_batches: list[tuple[str, SSEBatch]] = []
+        to_index: list[CaptureRecord] = []
+        for kind, payload in batch:
+            if kind == "insert":
+                inserts.append(payload)
+            elif kind == "update":
+                updates.append(payload)
+            elif kind == "sse":
+                sse_batches.append(payload)
+            else:
+                to_index.append(payload)
+        search_docs = await asyncio.to_thread(_search_documents, to_index) if to_index else []
+        await self._db.write_batch(inserts, updates, sse_batches, search_docs)
+        self._indexed += len(search_docs)
+        if self._on_commit is not None:
+            for request in inserts:
+                try:
+                    self._on_commit(request.id)
+                except Exception:
+                    log.exception("commit callback failed for %s", request.id)
+
+
+def _search_documents(records: list[CaptureRecord]) -> list[SearchDocument]:
+    docs = []
+    for record in records:
+        sse_data = record.sse.data if record.sse is not None else ()
+        prompt, tools, response = extract_search_text(
+            record.request_body, record.response_body, sse_data
+        )
+        docs.append((record.id, prompt, tools, response))
+    return docs
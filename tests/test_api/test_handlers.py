@@ -0,0 +1,229 @@
+import gzip
+from datetime import UTC, datetime, timedelta
+
+import pytest
+from fastapi import HTTPException
+
+from agentprobe.api import handlers
+from agentprobe.serialization import loads
+from agentprobe.storage.blobs import BlobStore
+from agentprobe.storage.database import Database
+from agentprobe.storage.records import CaptureRecord, SSEBatch
+
+
+async def test_list_requests_pages_with_cursor_header(tmp_path) -> None:
+    db = Database()
+    await db.init(tmp_path / "test.db")
+    await db.write_batch(
+        [
+            CaptureRecord(
+                sequence=i,
+                agent_type="claude_code",
+                method="GET" if i % 2 else "POST",
+                url="https://api.anthropic.com/v1/messages",
+                host="api.anthropic.com",
+                path="/v1/messages",
+            )
+            for i in range(1, 6)
+        ],
+        [],
+        [],
+    )
+
+    first = await handlers.list_requests(db, {"method": "GET", "limit": "2"})
+    assert [r["sequence"] for r in loads(first.body)] == [5, 3]
+    cursor = first.headers["X-Next-Cursor"]
+
+    second = await handlers.list_requests(
+        db, {"method": "GET", "limit": "2", "after_sequence": cursor}
+    )
+    assert [r["sequence"] for r in loads(second.body)] == [1]
+    assert "X-Next-Cursor" not in second.headers
+
+    with pytest.raises(HTTPException):
+        await handlers.list_requests(db, {"after_sequence": "not-a-cursor"})
+    with pytest.raises(HTTPException):
+        await handlers.list_requests(db, {"status_code": "ok"})
+    await db.close()
+
+
+async def test_list_requests_full_text_query(tmp_path) -> None:
+    db = Database()
+    await db.init(tmp_path / "test.db")
+    record = CaptureRecord(
+        sequence=1,
+        agent_type="codex",
+        method="POST",
+        url="https://api.openai.com/v1/responses",
+        host="api.openai.com",
+        path="/v1/responses",
+    )
+    await db.write_batch([record], [], [], [(record.id, "refactor the parser", "", "")])
+
+    hits = loads((await handlers.list_requests(db, {"q": "pars*"})).body)
+    assert [h["id"] for h in hits] == [record.id]
+    # FTS5 syntax in user input is searched literally instead of failing.
+    assert loads((await handlers.list_requests(db, {"q": 'parser AND "('})).body) == []
+    assert loads((await handlers.list_requests(db, {"q": "parser", "agent_type": "x"})).body) == []
+    await db.close()
+
+
+async def test_export_har_streams_filtered_rows(tmp_path) -> None:
+    db = Database()
+    await db.init(tmp_path / "test.db")
+    sse = SSEBatch()
+    sse.append([{"event": "ping", "data": "{}"}], 0.0)
+    streamed = CaptureRecord(
+        sequence=1,
+        agent_type="claude_code",
+        method="POST",
+        url="https://api.anthropic.com/v1/messages",
+        host="api.anthropic.com",
+        path="/v1/messages",
+        request_headers={"content-type": "application/json"},
+        request_body="{}",
+        status_code=200,
+        is_streaming=True,
+        sse=sse,
+    )
+    other = CaptureRecord(
+        sequence=2,
+        agent_type="codex",
+        method="GET",
+        url="https://example.com/",
+        host="example.com",
+        path="/",
+    )
+    await db.write_batch([streamed, other], [], [(streamed.id, sse)])
+
+    response = await handlers.export_har(db, {"agent_type": "claude_code", "gzip": "true"})
+    body = b"".join([chunk async for chunk in response.body_iterator])
+    har = loads(gzip.decompress(body))
+
+    entries = har["log"]["entries"]
+    assert [e["request"]["url"] for e in entries] == [streamed.url]
+    assert entries[0]["response"]["content"]["text"] == "event: ping\ndata: {}\n"
+    assert entries[0]["request"]["postData"]["mimeType"] == "application/json"
+    await db.close()
+
+
+async def test_request_body_serves_byte_ranges(tmp_path) -> None:
+    db = Database(blobs=BlobStore(tmp_path / "blobs"), blob_threshold=16)
+    await db.init(tmp_path / "test.db")
+    record = CaptureRecord(
+        sequence=1,
+        agent_type="claude_code",
+        method="POST",
+        url="https://api.anthropic.com/v1/messages",
+        host="api.anthropic.com",
+        path="/v1/messages",
+        request_headers={"Content-Type": "application/json"},
+        request_body='{"prompt":"0123456789abcdef"}',
+    )
+    await db.write_batch([record], [], [])
+
+    full = await handlers.get_request_body(db, record.id, "request", None)
+    assert full.body == record.request_body.encode()
+    assert full.media_type == "application/json"
+
+    partial = await handlers.get_request_body(db, record.id, "request", "bytes=11-14")
+    assert partial.status_code == 206
+    assert partial.body == b"0123"
+    assert partial.headers["Content-Range"] == f"bytes 11-14/{len(record.request_body)}"
+
+    suffix = await handlers.get_request_body(db, record.id, "request", "bytes=-2")
+    assert suffix.body == b'"}'
+    with pytest.raises(HTTPException) as excinfo:
+        await handlers.get_request_body(db, record.id, "request", "bytes=999-")
+    assert excinfo.value.status_code == 416
+    await db.close()
+
+
+async def test_timeseries_reads_rollups_of_completed_flows(tmp_path) -> None:
+    db = Database()
+    await db.init(tmp_path / "test.db")
+    start = datetime.now(UTC).replace(second=0, microsecond=0) - timedelta(minutes=10)
+    records = [
+        CaptureRecord(
+            sequence=i,
+            timestamp=start + timedelta(seconds=20 * i),
+            agent_type="claude_code" if i % 2 else "codex",
+            method="POST",
+            url="https://api.anthropic.com/v1/messages",
+            host="api.anthropic.com",
+            path="/v1/messages",
+            status_code=500 if i == 3 else 200,
+            duration_ms=float(100 * (i + 1)),
+            request_size=10,
+        )
+        for i in range(6)
+    ]
+    # Still in flight: not rolled up until its duration arrives.
+    records[5].duration_ms = None
+    await db.write_batch(records, [], [])
+    params = {
+        "since": start.isoformat(),
+        "until": (start + timedelta(seconds=90)).isoformat(),
+    }
+
+    body = loads((await handlers.get_timeseries(db, params)).body)
+    [series] = body["series"]
+    assert [p["requests"] for p in series["points"]] == [3, 2]
+    assert series["window"]["errors"] == 1
+    assert series["window"]["request_bytes"] == 50
+    assert series["points"][0]["duration_ms"]["p50"] == pytest.approx(200, rel=0.01)
+
+    await db.write_batch([], [(records[5].id, {"duration_ms": 600.0})], [])
+    body = loads((await handlers.get_timeseries(db, {**params, "dimension": "agent"})).body)
+    by_agent = {s["key"]: s["window"] for s in body["series"]}
+    assert by_agent["claude_code"]["requests"] == 3
+    assert by_agent["claude_code"]["duration_ms"]["max"] == 600.0
+
+    with pytest.raises(HTTPException):
+        await handlers.get_timeseries(db, {"resolution": "week"})
+    with pytest.raises(HTTPException):
+        await handlers.get_timeseries(db, {"quantiles": "1.5"})
+    await db.close()
+
+
+async def test_sessions_keep_aggregates_up_to_date(tmp_path) -> None:
+    db = Database()
+    await db.init(tmp_path / "test.db")
+    now = datetime.now(UTC)
+    records = [
+        CaptureRecord(
+            sequence=i,
+            timestamp=now - timedelta(hours=2 if i == 3 else 0, seconds=10 - i),
+            agent_type="codex" if i == 3 else "claude_code",
+            method="POST",
+            url="https://api.anthropic.com/v1/messages",
+            host="api.anthropic.com",
+            path="/v1/messages",
+            status_code=500 if i == 1 else 200,
+            duration_ms=100.0,
+            request_size=10,
+            session_id="old" if i == 3 else "s1",
+        )
+        for i in range(4)
+    ]
+    await db.write_batch(records, [], [])
+    # Enrichment adds tokens to a request already counted.
+    await db.write_batch([], [(records[0].id, {"output_tokens": 40, "tool_call_count": 2})], [])
+
+    body = loads((await handlers.list_sessions(db, {}, 1800.0)).body)
+    current, old = body["sessions"]
+    assert current["session_id"] == "s1"
+    assert current["requests"] == 3
+    assert current["errors"] == 1
+    assert current["request_bytes"] == 30
+    assert current["output_tokens"] == 40
+    assert current["tool_calls"] == 2
+    assert current["avg_duration_ms"] == 100.0
+    assert current["active"] and not old["active"]
+
+    await db.delete_requests([records[3].id, records[0].id])
+    body = loads((await handlers.list_sessions(db, {"agent": "claude_code"}, 1800.0)).body)
+    [current] = body["sessions"]
+    assert current["requests"] == 2
+    assert current["output_tokens"] == 0
+    await db.close()
@@ -0,0 +1,132 @@
+import asyncio
+import json
+
+from agentprobe.api.stats import StatsPublisher
+from agentprobe.api.websocket import WebSocketHub
+from agentprobe.storage.database import Database
+from agentprobe.storage.records import CaptureRecord
+
+
+class _FakeSocket:
+    def __init__(self) -> None:
+        self.sent: list[dict] = []
+        self.closed_with: int | None = None
+        self.stalled = False
+
+    async def accept(self) -> None:
+        pass
+
+    async def send_text(self, text: str) -> None:
+        if self.stalled:
+            await asyncio.Event().wait()
+        self.sent.append(json.loads(text))
+
+    async def close(self, code: int = 1000) -> None:
+        self.closed_with = code
+
+
+async def _drain() -> None:
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+async def test_sse_events_only_reach_subscribers() -> None:
+    hub = WebSocketHub()
+    watcher, idle = _FakeSocket(), _FakeSocket()
+    await hub.connect(watcher)
+    await hub.connect(idle)
+    hub.handle_message(watcher, json.dumps({"type": "subscribe_sse", "request_id": "req-1"}))
+
+    assert hub.wants_sse("req-1")
+    assert not hub.wants_sse("req-2")
+
+    await hub.broadcast_sse_events("req-1", 3, [{"data": "x"}], dropped=1)
+    await _drain()
+
+    assert watcher.sent == [
+        {
+            "type": "sse_events",
+            "request_id": "req-1",
+            "start_index": 3,
+            "dropped": 1,
+            "events": [{"data": "x"}],
+        }
+    ]
+    assert idle.sent == []
+
+
+async def test_disconnect_releases_subscriptions() -> None:
+    hub = WebSocketHub()
+    ws = _FakeSocket()
+    await hub.connect(ws)
+    hub.subscribe_sse(ws, "*")
+    assert hub.wants_sse("anything")
+
+    hub.disconnect(ws)
+    hub.disconnect(ws)
+
+    assert not hub.wants_sse("anything")
+    assert hub.connection_count == 0
+
+
+async def test_queued_summaries_for_the_same_request_coalesce() -> None:
+    hub = WebSocketHub(queue_size=2)
+    ws = _FakeSocket()
+    await hub.connect(ws)
+
+    await hub.broadcast({"type": "new_request", "data": {"id": "a"}})
+    await hub.broadcast({"type": "request_complete", "data": {"id": "a"}})
+    await hub.broadcast({"type": "new_request", "data": {"id": "b"}})
+    await hub.broadcast({"type": "new_request", "data": {"id": "c"}})
+    await _drain()
+
+    assert [(m["type"], m["data"]["id"]) for m in ws.sent] == [
+        ("new_request", "b"),
+        ("new_request", "c"),
+    ]
+    stats = hub.stats()["clients"][0]
+    assert stats["coalesced"] == 1
+    assert stats["dropped"] == 1
+
+
+async def test_stalled_client_is_evicted_without_blocking_others() -> None:
+    hub = WebSocketHub(max_lag=0.0)
+    slow, fast = _FakeSocket(), _FakeSocket()
+    slow.stalled = True
+    await hub.connect(slow)
+    await hub.connect(fast)
+
+    await hub.broadcast({"type": "stats_update", "data": {}})
+    await _drain()
+    await hub.broadcast({"type": "stats_update", "data": {}})
+    await asyncio.sleep(0.01)
+    await hub.broadcast({"type": "stats_update", "data": {}})
+    await _drain()
+
+    assert slow.closed_with == 1013
+    assert hub.connection_count == 1
+    assert hub.stats()["evicted"] == 1
+    assert len(fast.sent) == 3
+
+
+async def test_stats_are_pushed_once_per_change(tmp_path) -> None:
+    db = Database()
+    await db.init(tmp_path / "test.db")
+    hub = WebSocketHub()
+    ws = _FakeSocket()
+    await hub.connect(ws)
+    publisher = StatsPublisher(db, hub)
+
+    assert await publisher.publish()
+    assert not await publisher.publish()
+    await db.save_request(
+        CaptureRecord(
+            sequence=1, agent_type="codex", method="GET", url="https://x/", host="x", path="/"
+        )
+    )
+    assert await publisher.publish()
+    await _drain()
+
+    assert [m["type"] for m in ws.sent] == ["stats_update", "stats_update"]
+    assert ws.sent[-1]["data"]["requests_by_agent"] == {"codex": 1}
+    await db.close()
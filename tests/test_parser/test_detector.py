@@ -1,4 +1,14 @@
-from agentprobe.parser.detector import detect_agent
+import json
+
+import pytest
+
+from agentprobe.parser.detector import (
+    AgentMatcher,
+    detect_agent,
+    detect_model,
+    detect_protocol,
+    peek_json,
+)
 
 
 def test_detect_agent_claude_cli_user_agent() -> None:
@@ -26,3 +36,46 @@ def test_detect_agent_unknown_without_claude_markers() -> None:
     }
 
     assert detect_agent(headers) == "unknown"
+
+
+def test_detect_model_from_body_or_google_path() -> None:
+    assert detect_model("/v1/messages", {"model": "claude-sonnet-4"}) == "claude-sonnet-4"
+    path = "/v1beta/models/gemini-2.5-pro:streamGenerateContent?alt=sse"
+    assert detect_model(path, {"contents": []}) == "gemini-2.5-pro"
+    assert detect_model("/mcp", None) is None
+
+
+def test_agent_matcher_custom_signatures_and_priority() -> None:
+    matcher = AgentMatcher({"aider": [r"aider/\d+"]}, cache_size=8)
+    assert matcher.detect({"User-Agent": "Aider/0.86 python-httpx"}) == "aider"
+    # Custom signatures come before the built-in ones.
+    assert matcher.detect({"user-agent": "aider/1 claude-code/1.0"}) == "aider"
+    # Among built-ins the earlier agent wins wherever it appears.
+    assert matcher.detect({"user-agent": "cline/3.0", "x-app": "claude-code"}) == "claude_code"
+    assert matcher.detect({"user-agent": "Aider/0.86 python-httpx"}) == "aider"
+    assert matcher.cache_info().hits == 1
+
+
+def test_agent_matcher_keeps_priority_over_greedy_signatures() -> None:
+    # vscode.*cline and vscode.*codex must not swallow an earlier agent's token.
+    assert detect_agent({"user-agent": "vscode/1.9 claude-code/2.0 cline/3"}) == "claude_code"
+    assert detect_agent({"user-agent": "vscode claude-cli codex"}) == "claude_code"
+    matcher = AgentMatcher({"mine": [r"my(agent|tool)/(\d+)"]})
+    assert matcher.detect({"user-agent": "vscode cline mytool/3"}) == "mine"
+    assert matcher.detect({"user-agent": "vscode cline codex"}) == "cline"
+
+
+@pytest.mark.parametrize("pattern", ["agent(", "(?i)agent", r"(a)\1", "(?P<n>a)(?P=n)"])
+def test_agent_matcher_rejects_invalid_signature(pattern: str) -> None:
+    with pytest.raises(ValueError, match="'broken'"):
+        AgentMatcher({"broken": [pattern]})
+
+
+def test_peek_json_reads_members_within_prefix() -> None:
+    body = json.dumps(
+        {"model": "gpt-4o", "stream": True, "messages": [{"content": "x" * 100}], "tools": []}
+    )
+    assert peek_json(body, limit=60) == {"model": "gpt-4o", "stream": True, "messages": None}
+    assert peek_json(body, limit=len(body)) == json.loads(body)
+    assert peek_json("[1, 2]") is None
+    assert detect_protocol("llm.internal", "/chat", peek_json(body, limit=60)) == ("openai", None)
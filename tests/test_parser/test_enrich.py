@@ -0,0 +1,122 @@
+import json
+
+from agentprobe.parser.enrich import enrich_flow, enrich_request
+from agentprobe.parser.session import conversation_fingerprint, conversation_id
+
+
+def test_enrich_anthropic_stream() -> None:
+    events = [
+        {
+            "type": "message_start",
+            "message": {
+                "model": "claude-sonnet-4-5",
+                "usage": {
+                    "input_tokens": 12,
+                    "cache_read_input_tokens": 300,
+                    "output_tokens": 1,
+                },
+            },
+        },
+        {"type": "content_block_start", "index": 0, "content_block": {"type": "text"}},
+        {
+            "type": "content_block_start",
+            "index": 1,
+            "content_block": {
+                "type": "tool_use",
+                "id": "toolu_1",
+                "name": "Read",
+            },
+        },
+        {
+            "type": "message_delta",
+            "delta": {"stop_reason": "tool_use"},
+            "usage": {"output_tokens": 42},
+        },
+        {"type": "message_stop"},
+    ]
+    fields = enrich_flow("anthropic", None, None, [json.dumps(e) for e in events] + [None])
+    assert fields == {
+        "model": "claude-sonnet-4-5",
+        "input_tokens": 12,
+        "output_tokens": 42,
+        "cache_read_tokens": 300,
+        "cache_creation_tokens": 0,
+        "tool_call_count": 1,
+        "stop_reason": "tool_use",
+    }
+
+
+def test_enrich_openai_bodies_and_mcp() -> None:
+    chat = {
+        "object": "chat.completion",
+        "model": "gpt-4o",
+        "choices": [{"finish_reason": "stop", "message": {"content": "hi"}}],
+        "usage": {
+            "prompt_tokens": 9,
+            "completion_tokens": 3,
+            "prompt_tokens_details": {"cached_tokens": 4},
+        },
+    }
+    fields = enrich_flow("openai", "{}", json.dumps(chat))
+    assert fields["input_tokens"] == 9
+    assert fields["cache_read_tokens"] == 4
+    assert fields["stop_reason"] == "stop"
+
+    chunks = [
+        {
+            "object": "chat.completion.chunk",
+            "model": "gpt-4o",
+            "choices": [
+                {
+                    "delta": {
+                        "tool_calls": [{"index": 0, "id": "call_1", "function": {"name": "ls"}}],
+                    }
+                }
+            ],
+        },
+        {
+            "object": "chat.completion.chunk",
+            "choices": [
+                {
+                    "delta": {
+                        "tool_calls": [{"index": 0, "function": {"arguments": "{}"}}],
+                    },
+                    "finish_reason": "tool_calls",
+                }
+            ],
+        },
+        {
+            "object": "chat.completion.chunk",
+            "choices": [],
+            "usage": {"prompt_tokens": 5, "completion_tokens": 2},
+        },
+    ]
+    fields = enrich_flow("openai", None, None, [json.dumps(c) for c in chunks] + ["[DONE]"])
+    assert fields["tool_call_count"] == 1
+    assert fields["stop_reason"] == "tool_calls"
+    assert fields["output_tokens"] == 2
+
+    call = {"jsonrpc": "2.0", "id": 1, "method": "tools/call", "params": {"name": "x"}}
+    assert enrich_flow("mcp", json.dumps(call), "{}") == {"mcp_method": "tools/call"}
+    assert enrich_flow("anthropic", "{}", '{"type": "error"}') == {}
+
+
+def test_enrich_request_finishes_bodies_the_hook_skipped() -> None:
+    body = json.dumps(
+        {
+            "messages": [
+                {"role": "system", "content": "be brief"},
+                {"role": "user", "content": "hi"},
+            ],
+            "model": "gpt-4o",
+        }
+    )
+    fingerprint = conversation_fingerprint("openai", json.loads(body))
+    assert enrich_request("unknown", "llm.internal", body, session_id="s1") == {
+        "protocol_type": "openai",
+        "api_provider": None,
+        "model": "gpt-4o",
+        "conversation_id": conversation_id("s1", fingerprint),
+    }
+    # Requests the hook parsed already have their conversation.
+    assert enrich_request("openai", "api.openai.com", body, "s1", "c1") == {}
@@ -0,0 +1,179 @@
+import json
+
+import pytest
+
+from agentprobe.parser.anthropic import parse_anthropic_response
+from agentprobe.parser.openai import parse_openai_response
+from agentprobe.parser.reassembly import StreamReassembler, reassemble, reassembler_for
+
+
+def _chunks(text: str, size: int) -> list[str]:
+    return [text[i : i + size] for i in range(0, len(text), size)]
+
+
+def test_anthropic_stream_matches_plain_response() -> None:
+    arguments = json.dumps({"file_path": "/tmp/x.py", "limit": 20})
+    body = {
+        "id": "msg_1",
+        "type": "message",
+        "role": "assistant",
+        "model": "claude-sonnet-4-5",
+        "content": [
+            {"type": "text", "text": "Reading the file now."},
+            {"type": "tool_use", "id": "toolu_1", "name": "Read", "input": json.loads(arguments)},
+        ],
+        "stop_reason": "tool_use",
+        "usage": {"input_tokens": 12, "output_tokens": 42},
+    }
+    events = [
+        {
+            "type": "message_start",
+            "message": {
+                "id": "msg_1",
+                "type": "message",
+                "role": "assistant",
+                "model": "claude-sonnet-4-5",
+                "content": [],
+                "usage": {"input_tokens": 12, "output_tokens": 1},
+            },
+        },
+        {"type": "content_block_start", "index": 0, "content_block": {"type": "text", "text": ""}},
+        *(
+            {
+                "type": "content_block_delta",
+                "index": 0,
+                "delta": {"type": "text_delta", "text": part},
+            }
+            for part in _chunks("Reading the file now.", 3)
+        ),
+        {"type": "content_block_stop", "index": 0},
+        {
+            "type": "content_block_start",
+            "index": 1,
+            "content_block": {
+                "type": "tool_use",
+                "id": "toolu_1",
+                "name": "Read",
+                "input": {},
+            },
+        },
+        *(
+            {
+                "type": "content_block_delta",
+                "index": 1,
+                "delta": {"type": "input_json_delta", "partial_json": part},
+            }
+            for part in _chunks(arguments, 2)
+        ),
+        {"type": "content_block_stop", "index": 1},
+        {
+            "type": "message_delta",
+            "delta": {"stop_reason": "tool_use"},
+            "usage": {"output_tokens": 42},
+        },
+        {"type": "message_stop"},
+    ]
+    reassembler = reassembler_for("anthropic")
+    assert reassembler is not None
+    # Fed in uneven slices, the way SSEParser hands them over.
+    data = [{"event": e["type"], "data": json.dumps(e)} for e in events]
+    for start in range(0, len(data), 5):
+        reassembler.feed(data[start : start + 5])
+    assert reassembler.finish() == parse_anthropic_response(body)
+
+
+def test_openai_chat_tool_call_deltas() -> None:
+    arguments = '{"city": "Paris"}'
+    chunks = [
+        {
+            "object": "chat.completion.chunk",
+            "id": "c1",
+            "model": "gpt-4o",
+            "choices": [
+                {
+                    "index": 0,
+                    "delta": {
+                        "role": "assistant",
+                        "tool_calls": [
+                            {
+                                "index": 0,
+                                "id": "call_1",
+                                "function": {"name": "weather", "arguments": ""},
+                            },
+                        ],
+                    },
+                }
+            ],
+        },
+        *(
+            {
+                "object": "chat.completion.chunk",
+                "id": "c1",
+                "model": "gpt-4o",
+                "choices": [
+                    {
+                        "index": 0,
+                        "delta": {
+                            "tool_calls": [
+                                {"index": 0, "function": {"arguments": part}},
+                            ]
+                        },
+                    }
+                ],
+            }
+            for part in _chunks(arguments, 4)
+        ),
+        {
+            "object": "chat.completion.chunk",
+            "id": "c1",
+            "model": "gpt-4o",
+            "choices": [{"index": 0, "delta": {}, "finish_reason": "tool_calls"}],
+        },
+        {
+            "object": "chat.completion.chunk",
+            "id": "c1",
+            "model": "gpt-4o",
+            "choices": [],
+            "usage": {"prompt_tokens": 9, "completion_tokens": 7},
+        },
+    ]
+    body = {
+        "id": "c1",
+        "object": "chat.completion",
+        "model": "gpt-4o",
+        "choices": [
+            {
+                "index": 0,
+                "finish_reason": "tool_calls",
+                "message": {
+                    "role": "assistant",
+                    "content": None,
+                    "tool_calls": [
+                        {
+                            "id": "call_1",
+                            "type": "function",
+                            "function": {"name": "weather", "arguments": arguments},
+                        }
+                    ],
+                },
+            }
+        ],
+        "usage": {"prompt_tokens": 9, "completion_tokens": 7},
+    }
+    data = [json.dumps(c) for c in chunks] + ["[DONE]"]
+    assert reassemble("openai", data) == parse_openai_response(body)
+
+
+def test_malformed_or_foreign_stream_gives_nothing() -> None:
+    assert reassemble("anthropic", ['{"type": "message_start", "message": "msg_1"}']) is None
+    assert reassemble("anthropic", ['{"unrelated": true}']) is None
+    assert reassemble("mcp", ['{"jsonrpc": "2.0"}']) is None
+
+
+def test_reassembler_needs_both_hooks() -> None:
+    class Partial(StreamReassembler):
+        def _event(self, event_type: str | None, data: dict) -> bool:
+            return True
+
+    with pytest.raises(TypeError):
+        Partial()
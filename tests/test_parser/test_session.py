@@ -0,0 +1,46 @@
+from agentprobe.parser.session import SessionTracker, conversation_fingerprint
+
+
+def _turn(first: str, *history: str) -> dict:
+    messages = [{"role": "user", "content": [{"type": "text", "text": first}]}]
+    for i, text in enumerate(history):
+        messages.append({"role": "assistant" if i % 2 == 0 else "user", "content": text})
+    return {"system": [{"type": "text", "text": "You are helpful."}], "messages": messages}
+
+
+def test_fingerprint_is_stable_across_turns() -> None:
+    first = conversation_fingerprint("anthropic", _turn("fix the tests"))
+    later = _turn("fix the tests", "looking", "thanks")
+    # Clients move cache markers between turns; they do not change the fingerprint.
+    later["messages"][0]["content"][0]["cache_control"] = {"type": "ephemeral"}
+    assert conversation_fingerprint("anthropic", later) == first
+    assert conversation_fingerprint("anthropic", _turn("write docs")) != first
+    assert conversation_fingerprint("anthropic", {"messages": []}) is None
+    chat = {
+        "messages": [{"role": "system", "content": "Be brief."}, {"role": "user", "content": "hi"}]
+    }
+    responses = {"instructions": "Be brief.", "input": "hi"}
+    assert conversation_fingerprint("openai", chat) is not None
+    assert conversation_fingerprint("openai", responses) is not None
+
+
+def test_conversations_keep_their_session_and_idle_sessions_expire() -> None:
+    tracker = SessionTracker(window=100)
+    host = "api.anthropic.com"
+    s1, c1 = tracker.assign("claude_code", host, "anthropic", body=_turn("a"), timestamp=0)
+    s2, c2 = tracker.assign("claude_code", host, "anthropic", body=_turn("b"), timestamp=10)
+    assert s2 == s1 and c2 != c1
+    # A request without a conversation joins the agent's session on that host.
+    assert tracker.assign("claude_code", host, "http", timestamp=20) == (s1, None)
+    # A second session on the same host: conversation a still finds its own.
+    tracker.assign("codex", host, "anthropic", body=_turn("a"), timestamp=30)
+    assert tracker.assign("claude_code", "other", "anthropic", body=_turn("a"), timestamp=40) == (
+        s1,
+        c1,
+    )
+
+    assert tracker.expire_sessions(120) == 0  # active at 40, so due at 140
+    assert tracker.expire_sessions(140) == 2
+    assert tracker.session_count == 0
+    s3, c3 = tracker.assign("claude_code", host, "anthropic", body=_turn("a"), timestamp=150)
+    assert s3 != s1 and c3 != c1
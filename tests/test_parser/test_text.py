@@ -0,0 +1,65 @@
+import json
+
+from agentprobe.parser.text import extract_search_text
+
+
+def test_extracts_prompt_tools_and_streamed_response() -> None:
+    request = json.dumps(
+        {
+            "model": "claude-sonnet-4",
+            "system": [{"type": "text", "text": "You are a coding agent"}],
+            "tools": [{"name": "Bash", "input_schema": {"type": "object"}}],
+            "messages": [
+                {"role": "user", "content": "fix the flaky test"},
+                {
+                    "role": "user",
+                    "content": [
+                        {
+                            "type": "tool_result",
+                            "tool_use_id": "t1",
+                            "content": [
+                                {"type": "text", "text": "1 failed"},
+                            ],
+                        },
+                    ],
+                },
+            ],
+        }
+    )
+    sse = [
+        json.dumps(
+            {
+                "type": "content_block_start",
+                "content_block": {"type": "tool_use", "name": "Edit", "input": {}},
+            }
+        ),
+        json.dumps({"type": "content_block_delta", "delta": {"type": "text_delta", "text": "Fix"}}),
+        json.dumps({"type": "content_block_delta", "delta": {"type": "text_delta", "text": "ed"}}),
+        "[DONE]",
+    ]
+
+    prompt, tools, response = extract_search_text(request, None, sse)
+
+    assert prompt == "You are a coding agent\nfix the flaky test\n1 failed"
+    assert tools == "Bash Edit"
+    assert response == "Fixed"
+
+
+def test_extracts_mcp_tool_call() -> None:
+    request = json.dumps(
+        {
+            "jsonrpc": "2.0",
+            "id": 1,
+            "method": "tools/call",
+            "params": {"name": "read_file", "arguments": {"path": "README.md"}},
+        }
+    )
+    response = json.dumps(
+        {
+            "jsonrpc": "2.0",
+            "id": 1,
+            "result": {"content": [{"type": "text", "text": "# AgentProbe"}]},
+        }
+    )
+
+    assert extract_search_text(request, response) == ("", "read_file", "# AgentProbe")
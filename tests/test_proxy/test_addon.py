@@ -0,0 +1,32 @@
+import asyncio
+
+from mitmproxy.test import tflow
+
+from agentprobe.api.websocket import WebSocketHub
+from agentprobe.proxy.addon import AgentProbeAddon
+from agentprobe.proxy.bridge import LoopBridge
+from agentprobe.storage.database import Database
+from agentprobe.storage.writer import CaptureWriter
+
+
+async def test_aborted_flow_is_rolled_up_as_an_error(tmp_path) -> None:
+    db = Database()
+    await db.init(tmp_path / "test.db")
+    writer = CaptureWriter(db, batch_size=100, flush_interval=0.01)
+    writer.start()
+    bridge = LoopBridge()
+    bridge.bind(asyncio.get_running_loop())
+    addon = AgentProbeAddon(writer, WebSocketHub(), bridge)
+
+    flow = tflow.tflow()
+    await addon.request(flow)
+    await addon.error(flow)
+    await writer.close()
+
+    [stored] = await db.list_requests()
+    assert stored.status_code is None
+    assert stored.duration_ms is not None
+    [(_, _, rollup)] = await db.get_rollups("minute", "total", None, 0, 2**40)
+    assert rollup.requests == 1
+    assert rollup.errors == 1
+    await db.close()
@@ -0,0 +1,65 @@
+import asyncio
+import threading
+
+import pytest
+
+from agentprobe.proxy.bridge import LoopBridge
+
+
+@pytest.fixture
+def web_loop():
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    yield loop
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join()
+    loop.close()
+
+
+async def test_call_runs_on_the_bound_loop(web_loop) -> None:
+    bridge = LoopBridge()
+    bridge.bind(web_loop)
+
+    async def which_loop() -> asyncio.AbstractEventLoop:
+        return asyncio.get_running_loop()
+
+    assert await bridge.call(which_loop()) is web_loop
+    assert bridge.stats()["completed"] == 1
+
+
+async def test_submit_counts_failures(web_loop) -> None:
+    bridge = LoopBridge()
+    bridge.bind(web_loop)
+    done = threading.Event()
+
+    async def boom() -> None:
+        done.set()
+        raise ValueError("boom")
+
+    bridge.submit(boom())
+    await asyncio.get_running_loop().run_in_executor(None, done.wait)
+    for _ in range(100):
+        if bridge.stats()["failed"]:
+            break
+        await asyncio.sleep(0.01)
+
+    assert bridge.stats() == {
+        "scheduled": 1,
+        "completed": 0,
+        "failed": 1,
+        "rejected": 0,
+        "pending": 0,
+    }
+
+
+async def test_unbound_bridge_rejects_work() -> None:
+    bridge = LoopBridge()
+
+    async def noop() -> None:
+        pass
+
+    bridge.submit(noop())
+    with pytest.raises(RuntimeError):
+        await bridge.call(noop())
+    assert bridge.stats()["rejected"] == 2
@@ -0,0 +1,52 @@
+from agentprobe.proxy.sse import SSEParser
+
+
+def _feed_all(parser: SSEParser, chunks: list[bytes]) -> list[dict]:
+    events: list[dict] = []
+    for chunk in chunks:
+        events.extend(parser.feed(chunk))
+    events.extend(parser.flush())
+    return events
+
+
+def test_parses_events_with_every_line_ending() -> None:
+    for eol in (b"\n", b"\r\n", b"\r"):
+        stream = (
+            b"event: ping"
+            + eol
+            + b"data: {}"
+            + eol
+            + eol
+            + b": comment"
+            + eol
+            + b"data: a"
+            + eol
+            + b"data: b"
+            + eol
+            + eol
+        )
+        assert _feed_all(SSEParser(), [stream]) == [
+            {"event": "ping", "data": "{}"},
+            {"data": "a\nb"},
+        ]
+
+
+def test_crlf_split_across_chunks_is_one_line_ending() -> None:
+    parser = SSEParser()
+    assert parser.feed(b"data: x\r") == []
+    assert parser.feed(b"\n\r") == []
+    assert parser.feed(b"\ndata: y\r\n\r\n") == [{"data": "x"}, {"data": "y"}]
+
+
+def test_multibyte_character_split_across_chunks() -> None:
+    payload = "data: héllo — 世界\n\n".encode()
+    chunks = [payload[i : i + 1] for i in range(len(payload))]
+
+    assert _feed_all(SSEParser(), chunks) == [{"data": "héllo — 世界"}]
+
+
+def test_flush_dispatches_unterminated_event() -> None:
+    parser = SSEParser()
+    assert parser.feed(b"\xef\xbb\xbfevent: done\ndata: [DONE]") == []
+    assert parser.flush() == [{"event": "done", "data": "[DONE]"}]
+    assert parser.flush() == []
@@ -0,0 +1,27 @@
+from agentprobe.proxy.timing import STREAM_TIMING_COLUMNS, StreamTiming
+
+
+def test_metrics_from_output_chunks() -> None:
+    timing = StreamTiming()
+    for offset, count in [(0.4, 1), (0.5, 0), (0.6, 2), (3.1, 1), (3.2, 1)]:
+        timing.add(offset, count)
+    metrics = timing.metrics(output_tokens=56, stall_threshold=2.0)
+    assert metrics["ttft_ms"] == 400.0
+    assert round(metrics["max_gap_ms"], 6) == 2500.0
+    assert metrics["stall_count"] == 1
+    assert round(metrics["tokens_per_sec"], 6) == 20.0
+    # The chunk with no output is not recorded.
+    assert metrics["stream_timing"] == {
+        "offsets_ms": [400.0, 600.0, 3100.0, 3200.0],
+        "events": [1, 2, 1, 1],
+    }
+
+
+def test_metrics_of_streams_without_output() -> None:
+    assert StreamTiming().metrics(10, 2.0) == dict.fromkeys(STREAM_TIMING_COLUMNS)
+    single = StreamTiming()
+    single.add(0.25, 1)
+    metrics = single.metrics(None, 2.0)
+    assert metrics["ttft_ms"] == 250.0
+    assert metrics["max_gap_ms"] is None
+    assert metrics["tokens_per_sec"] is None
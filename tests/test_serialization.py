@@ -0,0 +1,5 @@
+from agentprobe.serialization import dumps
+
+
+def test_dumps_is_compact_utf8() -> None:
+    assert dumps({"text": "héllo", "n": [1, 2]}) == '{"text":"héllo","n":[1,2]}'.encode()
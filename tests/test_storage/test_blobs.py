@@ -0,0 +1,54 @@
+import pytest
+
+from agentprobe.storage.blobs import BlobStore, zstandard
+from agentprobe.storage.database import Database
+from agentprobe.storage.records import CaptureRecord
+
+
+@pytest.mark.parametrize("compress", [False, True])
+def test_blob_store_dedupes_and_reads_ranges(tmp_path, compress) -> None:
+    if compress and zstandard is None:
+        pytest.skip("zstandard not installed")
+    store = BlobStore(tmp_path / "blobs", compress=compress)
+    data = b"system prompt " * 1000
+
+    ref = store.put(data)
+    assert store.put(data) == ref
+    assert len(list((tmp_path / "blobs").rglob("*"))) == 3  # two fan-out dirs, one file
+    assert store.get(ref) == data
+    assert store.size(ref) == len(data)
+    assert store.read_range(ref, 7, 13) == b"prompt"
+
+
+async def test_large_bodies_spill_to_blobs_and_load_on_read(tmp_path) -> None:
+    store = BlobStore(tmp_path / "blobs")
+    db = Database(blobs=store, blob_threshold=1024)
+    await db.init(tmp_path / "test.db")
+    prompt = '{"system":"' + "x" * 4096 + '"}'
+    records = [
+        CaptureRecord(
+            sequence=i,
+            agent_type="claude_code",
+            method="POST",
+            url="https://api.anthropic.com/v1/messages",
+            host="api.anthropic.com",
+            path="/v1/messages",
+            request_body=prompt,
+            response_body="small",
+        )
+        for i in (1, 2)
+    ]
+    await db.write_batch(records, [], [])
+
+    cursor = await db._get_db().execute(
+        "SELECT request_body, request_body_ref, response_body_ref FROM requests"
+    )
+    rows = [tuple(r) for r in await cursor.fetchall()]
+    assert rows[0] == rows[1] == (None, rows[0][1], None)
+    assert store.get(rows[0][1]) == prompt.encode()
+
+    stored = await db.get_request(records[0].id)
+    assert stored is not None
+    assert stored.request_body == prompt
+    assert stored.response_body == "small"
+    await db.close()
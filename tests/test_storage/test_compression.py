@@ -0,0 +1,75 @@
+import pytest
+
+from agentprobe.storage.compression import ColumnCodec, zstandard
+from agentprobe.storage.database import Database
+from agentprobe.storage.records import CaptureRecord, SSEBatch
+
+
+@pytest.mark.parametrize("method", ["zlib", "zstd"])
+def test_codec_round_trips_and_passes_text_through(method) -> None:
+    if method == "zstd" and zstandard is None:
+        pytest.skip("zstandard not installed")
+    codec = ColumnCodec(method, dictionary_samples=50)
+    values = [f'{{"role":"user","content":"turn {i} {"x" * i}"}}' * 4 for i in range(60)]
+    packed = [codec.compress(value) for value in values]
+
+    assert all(isinstance(value, bytes) for value in packed)
+    assert [codec.decompress(value) for value in packed] == values
+    assert codec.compress("short") == "short"
+    assert codec.decompress("plain text") == "plain text"
+    if method == "zstd":
+        assert len(codec.unsaved) == 1  # trained after 50 samples
+
+
+def _record(i: int) -> CaptureRecord:
+    sse = SSEBatch()
+    sse.append([{"event": "content_block_delta", "data": '{"text":"' + "token " * 40 + '"}'}], 0.0)
+    content = f"question {i} " * 20
+    body = '{"model":"claude","messages":[{"role":"user","content":"' + content + '"}]}'
+    return CaptureRecord(
+        sequence=i,
+        agent_type="claude_code",
+        method="POST",
+        url="https://api.anthropic.com/v1/messages",
+        host="api.anthropic.com",
+        path="/v1/messages",
+        request_headers={"content-type": "application/json", "user-agent": "claude-cli " * 20},
+        request_body=body,
+        request_size=len(body),
+        status_code=200,
+        is_streaming=True,
+        sse=sse,
+    )
+
+
+async def test_compressed_columns_read_back_and_keep_sizes(tmp_path) -> None:
+    if zstandard is None:
+        pytest.skip("zstandard not installed")
+    path = tmp_path / "test.db"
+    db = Database(sse_storage="inline", compression="zstd")
+    await db.init(path)
+    records = [_record(i) for i in range(400)]
+    await db.write_batch(records, [], [])
+
+    cursor = await db._get_db().execute(
+        "SELECT typeof(request_body), typeof(request_headers), typeof(sse_events) "
+        "FROM requests WHERE id = ?",
+        (records[-1].id,),
+    )
+    assert tuple(await cursor.fetchone()) == ("blob", "blob", "blob")
+    stats = await db.get_stats()
+    assert stats["total_request_bytes"] == sum(r.request_size for r in records)
+    cursor = await db._get_db().execute("SELECT COUNT(*) FROM compression_dictionaries")
+    assert (await cursor.fetchone())[0] == 1
+    await db.close()
+
+    # The trained dictionary is saved, and switching to row storage
+    # backfills rows from the compressed inline copies.
+    db = Database(sse_storage="rows", compression="zstd")
+    await db.init(path)
+    for record in (records[0], records[-1]):
+        stored = await db.get_request(record.id)
+        assert stored.request_body == record.request_body
+        assert stored.request_headers == record.request_headers
+        assert stored.sse_events == record.sse.to_dicts()
+    await db.close()
@@ -0,0 +1,143 @@
+from agentprobe.storage.database import Database
+from agentprobe.storage.records import CaptureRecord, SSEBatch
+
+_EVENTS = [
+    {"event": "message_start", "data": '{"type":"message_start"}'},
+    {"event": "message_stop", "data": '{"type":"message_stop"}'},
+]
+
+
+def _streamed() -> CaptureRecord:
+    sse = SSEBatch()
+    sse.append(_EVENTS, 0.0)
+    return CaptureRecord(
+        sequence=1,
+        agent_type="claude_code",
+        method="POST",
+        url="https://api.anthropic.com/v1/messages",
+        host="api.anthropic.com",
+        path="/v1/messages",
+        status_code=200,
+        is_streaming=True,
+        sse=sse,
+    )
+
+
+async def test_rows_storage_rebuilds_stream_on_read(tmp_path) -> None:
+    db = Database(sse_storage="rows")
+    await db.init(tmp_path / "test.db")
+    captured = _streamed()
+    await db.write_batch([captured], [], [(captured.id, captured.sse)])
+
+    cursor = await db._get_db().execute(
+        "SELECT sse_events, response_body FROM requests WHERE id = ?", (captured.id,)
+    )
+    assert tuple(await cursor.fetchone()) == (None, None)
+
+    stored = await db.get_request(captured.id)
+    assert stored is not None
+    assert stored.sse_events == _EVENTS
+    assert stored.response_body == (
+        'event: message_start\ndata: {"type":"message_start"}\n\n'
+        'event: message_stop\ndata: {"type":"message_stop"}\n'
+    )
+    await db.close()
+
+
+async def test_switching_to_rows_compacts_inline_streams(tmp_path) -> None:
+    path = tmp_path / "test.db"
+    legacy = Database(sse_storage="inline")
+    await legacy.init(path)
+    captured = _streamed()
+    await legacy.save_request(captured)
+    await legacy.close()
+
+    db = Database(sse_storage="rows")
+    await db.init(path)
+    cursor = await db._get_db().execute(
+        "SELECT sse_events FROM requests WHERE id = ?", (captured.id,)
+    )
+    assert (await cursor.fetchone())[0] is None
+    assert [e.event_type for e in await db.get_sse_events(captured.id)] == [
+        "message_start",
+        "message_stop",
+    ]
+    stored = await db.get_request(captured.id)
+    assert stored is not None
+    assert stored.sse_events == _EVENTS
+    await db.close()
+
+
+async def test_keyset_pages_cover_every_row_once(tmp_path) -> None:
+    db = Database()
+    await db.init(tmp_path / "test.db")
+    # A restarted legacy capture can repeat sequence numbers; the rowid
+    # tie-break must still page through each row exactly once.
+    records = [
+        CaptureRecord(
+            sequence=sequence,
+            agent_type="codex" if i % 2 else "claude_code",
+            method="POST",
+            url="https://api.anthropic.com/v1/messages",
+            host="api.anthropic.com",
+            path="/v1/messages",
+        )
+        for i, sequence in enumerate([1, 2, 3, 1, 2, 3, 4])
+    ]
+    await db.write_batch(records, [], [])
+
+    seen: list[str] = []
+    after = None
+    while True:
+        page, after = await db.list_summary_page(after=after, limit=3)
+        seen.extend(row["id"] for row in page)
+        if after is None:
+            break
+    assert sorted(seen) == sorted(r.id for r in records)
+    assert len(seen) == len(set(seen))
+
+    page, after = await db.list_summary_page(filters={"agent_type": "codex"}, limit=10)
+    assert [row["sequence"] for row in page] == [3, 2, 1]
+    assert after is None
+    assert await db.max_sequence() == 4
+    await db.close()
+
+
+async def test_stats_counters_follow_writes_and_recount_on_open(tmp_path) -> None:
+    db = Database()
+    await db.init(tmp_path / "test.db")
+    records = [
+        CaptureRecord(
+            sequence=i,
+            agent_type="codex" if i else "claude_code",
+            method="POST",
+            url="https://api.anthropic.com/v1/messages",
+            host=f"host{i % 2}.example",
+            path="/v1/messages",
+            request_size=100,
+            model="claude-sonnet-4" if i < 2 else None,
+        )
+        for i in range(3)
+    ]
+    await db.write_batch(records, [(records[0].id, {"response_size": 50, "duration_ms": 30.0})], [])
+    await db.update_request(records[1].id, {"duration_ms": 10.0, "is_streaming": True})
+    await db.delete_requests([records[2].id])
+
+    stats = await db.get_stats()
+    assert stats["total_requests"] == 2
+    assert stats["unique_hosts"] == 2
+    assert stats["total_request_bytes"] == 200
+    assert stats["total_response_bytes"] == 50
+    assert stats["avg_duration_ms"] == 20.0
+    assert stats["streaming_count"] == 1
+    assert stats["requests_by_agent"] == {"claude_code": 1, "codex": 1}
+    assert stats["requests_by_model"] == {"claude-sonnet-4": 2}
+
+    connection = db._get_db()
+    await connection.execute("UPDATE stats_counters SET requests = 7 WHERE dimension = 'total'")
+    await connection.commit()
+    await db.close()
+    reopened = Database()
+    await reopened.init(tmp_path / "test.db")
+    assert await reopened.get_stats() == stats
+    await reopened.close()
@@ -0,0 +1,102 @@
+import asyncio
+import json
+
+from agentprobe.storage.database import Database
+from agentprobe.storage.delta import DeltaEncoder
+from agentprobe.storage.records import CaptureRecord, SSEBatch
+from agentprobe.storage.writer import CaptureWriter
+
+_SYSTEM = "You are a coding agent. " * 100
+
+
+def _turns(count: int) -> list[str]:
+    messages: list[dict] = []
+    bodies = []
+    for turn in range(count):
+        messages.append({"role": "user", "content": f"step {turn}: run the tests"})
+        bodies.append(
+            json.dumps(
+                {"model": "claude", "system": _SYSTEM, "messages": messages, "stream": True},
+                separators=(",", ":"),
+            )
+        )
+        messages = messages + [{"role": "assistant", "content": [{"type": "text", "text": "ok"}]}]
+    return bodies
+
+
+def _record(sequence: int, body: str) -> CaptureRecord:
+    return CaptureRecord(
+        sequence=sequence,
+        agent_type="claude_code",
+        method="POST",
+        url="https://api.anthropic.com/v1/messages",
+        host="api.anthropic.com",
+        path="/v1/messages",
+        request_body=body,
+    )
+
+
+def test_encoder_stores_appended_messages_and_keyframes() -> None:
+    encoder = DeltaEncoder(keyframe_interval=3)
+    encoded = [encoder.encode(f"r{i}", body) for i, body in enumerate(_turns(5))]
+    deltas = [e[1] if e is not None else None for e in encoded]
+
+    assert deltas[0] is None
+    assert deltas[3] is None  # keyframe
+    first = json.loads(deltas[1])
+    assert first["base"] == encoded[1][0] == "r0"
+    assert first["keep"] == 1
+    assert first["set"] == {}  # the system prompt is not repeated
+    assert len(first["append"]) == 2
+    assert json.loads(deltas[4])["base"] == "r3"
+
+
+def test_encoder_keeps_bodies_that_do_not_round_trip() -> None:
+    encoder = DeltaEncoder()
+    body = _turns(1)[0]
+    encoder.encode("a", body)
+    spaced = json.dumps(json.loads(body))  # ", " separators would not survive
+    assert encoder.encode("b", spaced) is None
+
+
+async def test_delta_bodies_are_rebuilt_on_read(tmp_path) -> None:
+    db = Database(body_storage="delta", keyframe_interval=4)
+    await db.init(tmp_path / "test.db")
+    bodies = _turns(6)
+    records = [_record(i, body) for i, body in enumerate(bodies)]
+    await db.write_batch(records, [], [])
+
+    cursor = await db._get_db().execute(
+        "SELECT COUNT(*) FROM requests WHERE request_body_delta IS NOT NULL"
+    )
+    assert (await cursor.fetchone())[0] == 4
+    for record, body in zip(records, bodies):
+        assert (await db.get_request(record.id)).request_body == body
+    columns = await db.get_body_columns(records[-1].id, "request")
+    assert columns["body"] == bodies[-1]
+    exported = [data["request_body"] async for data in db.iter_request_dicts()]
+    assert exported == bodies
+    await db.close()
+
+
+async def test_failed_batch_leaves_no_bases_behind(tmp_path) -> None:
+    db = Database(body_storage="delta")
+    await db.init(tmp_path / "test.db")
+    writer = CaptureWriter(db, flush_interval=0.01)
+    writer.start()
+    first, second = (_record(i, body) for i, body in enumerate(_turns(2)))
+    await writer.save_request(first)
+    # SSE rows for a request that does not exist fail the batch, which is
+    # then retried one op at a time.
+    sse = SSEBatch()
+    sse.append([{"event": "ping", "data": "{}"}], 0.0)
+    await writer.save_sse_batch("missing", sse)
+    await writer.close()
+    assert writer.stats()["failed"] == 1
+
+    # The retried insert is not a delta on itself and the read terminates.
+    stored = await asyncio.wait_for(db.get_request(first.id), 5)
+    assert stored.request_body == first.request_body
+    await db.write_batch([second], [], [])
+    assert (await db.get_request(second.id)).request_body == second.request_body
+    await db.close()
@@ -0,0 +1,64 @@
+import json
+
+from agentprobe.storage.database import Database
+from agentprobe.storage.enrichment import EnrichmentWorker
+from agentprobe.storage.records import CaptureRecord
+from agentprobe.storage.writer import CaptureWriter
+
+_RESPONSE = json.dumps(
+    {
+        "type": "message",
+        "model": "claude-haiku-4-5",
+        "content": [{"type": "tool_use", "id": "t", "name": "Bash", "input": {}}],
+        "stop_reason": "tool_use",
+        "usage": {"input_tokens": 10, "output_tokens": 20},
+    }
+)
+
+
+def _captured(sequence: int) -> CaptureRecord:
+    return CaptureRecord(
+        sequence=sequence,
+        agent_type="claude_code",
+        method="POST",
+        url="https://api.anthropic.com/v1/messages",
+        host="api.anthropic.com",
+        path="/v1/messages",
+        protocol_type="anthropic",
+        model="claude-haiku-4-5",
+        response_body=_RESPONSE,
+        duration_ms=5.0,
+    )
+
+
+async def test_worker_and_backfill_fill_typed_columns(tmp_path) -> None:
+    db = Database()
+    await db.init(tmp_path / "test.db")
+    writer = CaptureWriter(db, flush_interval=0.01)
+    worker = EnrichmentWorker(writer, workers=2, batch_size=1)
+    writer.start()
+    worker.start()
+
+    live, earlier = _captured(1), _captured(2)
+    await writer.save_request(live)
+    await writer.save_request(earlier)
+    assert await worker.submit(live)
+    await worker.close()
+    await writer.close()
+
+    # The second request was never enriched, so only it is backfilled.
+    writer.start()
+    worker.start()
+    assert await worker.backfill(db) == 1
+    await worker.close()
+    await writer.close()
+
+    for record in (live, earlier):
+        stored = await db.get_request(record.id)
+        assert stored.input_tokens == 10
+        assert stored.tool_call_count == 1
+        assert stored.stop_reason == "tool_use"
+    page, _ = await db.list_summary_page(filters={"stop_reason": "tool_use"})
+    assert len(page) == 2
+    assert worker.stats()["enriched"] == 2
+    await db.close()
@@ -0,0 +1,71 @@
+from agentprobe.storage.journal import FlowJournal
+from agentprobe.storage.records import CaptureRecord
+
+
+def _captured(sequence: int) -> CaptureRecord:
+    return CaptureRecord(
+        sequence=sequence,
+        agent_type="codex",
+        method="POST",
+        url="https://api.openai.com/v1/responses",
+        host="api.openai.com",
+        path="/v1/responses",
+        request_body='{"model":"gpt-5"}',
+    )
+
+
+def test_recover_returns_only_unfinished_flows(tmp_path) -> None:
+    journal = FlowJournal(tmp_path / "inflight.journal")
+    journal.open()
+    done, aborted, other = _captured(1), _captured(2), _captured(3)
+    journal.begin(done)
+    journal.begin(aborted)
+    journal.begin(other)
+    journal.end(done.id)
+    journal.end(other.id)
+    journal.close()
+
+    recovered = FlowJournal(tmp_path / "inflight.journal").recover()
+
+    assert [r.id for r in recovered] == [aborted.id]
+    assert recovered[0].request_body == '{"model":"gpt-5"}'
+
+
+def test_journal_truncates_when_nothing_is_in_flight(tmp_path) -> None:
+    path = tmp_path / "inflight.journal"
+    journal = FlowJournal(path)
+    journal.open()
+    captured = _captured(1)
+    journal.begin(captured)
+    journal.end(captured.id)
+    journal.close()
+
+    assert path.read_text() == ""
+    assert FlowJournal(path).recover() == []
+
+
+def test_recovered_flows_stay_journaled_until_they_end(tmp_path) -> None:
+    path = tmp_path / "inflight.journal"
+    journal = FlowJournal(path)
+    journal.open()
+    first, second = _captured(1), _captured(2)
+    journal.begin(first)
+    journal.begin(second)
+    journal.close()
+    with open(path, "a") as fh:
+        fh.write('{"op": "begin", "requ')
+
+    # Restarted, but only one of the recovered rows committed before a crash.
+    journal = FlowJournal(path)
+    assert [r.id for r in journal.recover()] == [first.id, second.id]
+    journal.open()
+    journal.end(first.id)
+    journal.close()
+
+    journal = FlowJournal(path)
+    assert [r.id for r in journal.recover()] == [second.id]
+    journal.open()
+    journal.end(second.id)
+    journal.close()
+
+    assert path.read_text() == ""
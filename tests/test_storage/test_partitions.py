@@ -0,0 +1,83 @@
+from datetime import UTC, datetime, timedelta
+
+from agentprobe.storage.blobs import BlobStore
+from agentprobe.storage.partitions import PartitionedDatabase
+from agentprobe.storage.records import CaptureRecord
+from agentprobe.storage.retention import RetentionWorker
+
+
+def _records(days: int, per_day: int) -> list[CaptureRecord]:
+    start = datetime.now(UTC) - timedelta(days=days - 1)
+    return [
+        CaptureRecord(
+            sequence=day * per_day + i,
+            timestamp=start + timedelta(days=day),
+            agent_type="claude_code",
+            method="POST",
+            url=f"https://host{day}.example/v1/messages",
+            host=f"host{day}.example",
+            path="/v1/messages",
+            request_body="x" * 100,
+            request_size=100,
+            duration_ms=10.0 * (day + 1),
+        )
+        for day in range(days)
+        for i in range(per_day)
+    ]
+
+
+async def test_pages_and_stats_merge_across_day_partitions(tmp_path) -> None:
+    db = PartitionedDatabase(partition_by="day", open_partitions=1)
+    await db.init(tmp_path)
+    records = _records(3, 4)
+    await db.write_batch(records, [(records[0].id, {"status_code": 200})], [])
+    assert len(db.partitions) == 3
+
+    seen = []
+    page, after = await db.list_summary_page(limit=5)
+    seen += page
+    while after is not None:
+        page, after = await db.list_summary_page(after=after, limit=5)
+        seen += page
+    assert [row["sequence"] for row in seen] == list(range(11, -1, -1))
+
+    stats = await db.get_stats()
+    assert stats["total_requests"] == 12
+    assert stats["unique_hosts"] == 3
+    assert stats["avg_duration_ms"] == 20.0
+    assert await db.max_sequence() == 11
+    assert (await db.get_request(records[0].id)).status_code == 200
+    exported = [data["sequence"] async for data in db.iter_request_dicts()]
+    assert exported == list(range(12))
+    await db.close()
+
+    reopened = PartitionedDatabase(partition_by="day")
+    await reopened.init(tmp_path)
+    assert await reopened.request_exists(records[5].id)
+    assert not await reopened.request_exists("missing")
+    await reopened.close()
+
+
+async def test_retention_drops_whole_partitions(tmp_path) -> None:
+    store = BlobStore(tmp_path / "blobs")
+    db = PartitionedDatabase(partition_by="rows", partition_rows=4, blobs=store, blob_threshold=50)
+    await db.init(tmp_path / "parts")
+    records = _records(1, 12)
+    for i, record in enumerate(records):
+        record.request_body = f"body {i} " + "y" * 100
+    await db.write_batch(records, [], [])
+    first_ref = (await db.get_request(records[0].id)).request_body_ref
+
+    worker = RetentionWorker(db, max_requests=6)
+    result = await worker.run_pass()
+
+    # Only the first file is wholly beyond the cap; the second still holds rows 6-7.
+    assert result["deleted"] == 4
+    assert result["blobs"] == 4
+    assert db.partitions == ["00000001", "00000002"]
+    assert worker.stats()["partitions_dropped"] == 1
+    assert not (tmp_path / "parts" / "rows-00000000.db").exists()
+    assert not store.exists(first_ref)
+    assert await db.get_request(records[0].id) is None
+    assert (await db.get_stats())["total_requests"] == 8
+    await db.close()
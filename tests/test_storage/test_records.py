@@ -0,0 +1,44 @@
+from agentprobe.storage.records import CaptureRecord, SSEBatch
+
+_EVENTS = [
+    {"event": "message_start", "data": '{"type":"message_start"}'},
+    {"data": "[DONE]", "id": "7"},
+    {"retry": "3000"},
+]
+
+
+def test_sse_batch_round_trips_parser_output() -> None:
+    sse = SSEBatch()
+    sse.append(_EVENTS[:1], 0.0)
+    sse.append(_EVENTS[1:], 0.25)
+
+    assert len(sse) == 3
+    assert sse.to_dicts() == _EVENTS
+    assert sse.to_dicts(start=1) == _EVENTS[1:]
+    rows = sse.rows("req")
+    assert [r["id"] for r in rows] == ["req:0", "req:1", "req:2"]
+    assert [(r["event_type"], r["data"]) for r in rows] == [
+        ("message_start", '{"type":"message_start"}'),
+        ("message", "[DONE]"),
+        ("message", ""),
+    ]
+
+
+def test_capture_record_converts_to_api_model() -> None:
+    sse = SSEBatch()
+    sse.append(_EVENTS[:1], 0.0)
+    record = CaptureRecord(
+        sequence=1,
+        agent_type="claude_code",
+        method="POST",
+        url="https://api.anthropic.com/v1/messages",
+        host="api.anthropic.com",
+        path="/v1/messages",
+        is_streaming=True,
+        sse=sse,
+    )
+
+    model = record.to_model()
+    assert model.id == record.id
+    assert model.sse_events == _EVENTS[:1]
+    assert CaptureRecord.from_dict(record.to_dict()).to_dict() == record.to_dict()
@@ -0,0 +1,75 @@
+import json
+from datetime import UTC, datetime, timedelta
+
+from agentprobe.storage.blobs import BlobStore
+from agentprobe.storage.database import Database
+from agentprobe.storage.records import CaptureRecord
+from agentprobe.storage.retention import RetentionWorker
+
+
+def _conversation(turns: int) -> list[CaptureRecord]:
+    messages: list[dict] = []
+    records = []
+    for turn in range(turns):
+        messages = messages + [{"role": "user", "content": f"turn {turn} " + "y" * 600}]
+        body = json.dumps(
+            {"model": "claude", "system": "x" * 2000, "messages": messages},
+            separators=(",", ":"),
+        )
+        records.append(
+            CaptureRecord(
+                sequence=turn,
+                agent_type="claude_code",
+                method="POST",
+                url="https://api.anthropic.com/v1/messages",
+                host="api.anthropic.com",
+                path="/v1/messages",
+                request_body=body,
+                request_size=len(body),
+            )
+        )
+    return records
+
+
+async def test_pruning_rebases_deltas_and_drops_orphaned_blobs(tmp_path) -> None:
+    store = BlobStore(tmp_path / "blobs")
+    db = Database(blobs=store, blob_threshold=2048, body_storage="delta")
+    await db.init(tmp_path / "test.db")
+    records = _conversation(6)
+    docs = [(r.id, f"prompt {r.sequence}", "", "") for r in records]
+    await db.write_batch(records, [], [], docs)
+    first_ref = (await db.get_request(records[0].id)).request_body_ref
+    assert first_ref is not None  # the keyframe spilled, the deltas did not
+
+    worker = RetentionWorker(db, max_requests=3, batch_size=2)
+    result = await worker.run_pass()
+
+    assert result["deleted"] == 3
+    # Batches of two: turn 2 is rebased when turns 0-1 go, turn 3 when turn 2 does.
+    assert result["rebased"] == 2
+    for record in records[3:]:
+        assert (await db.get_request(record.id)).request_body == record.request_body
+    assert await db.get_request(records[0].id) is None
+    assert not store.exists(first_ref)
+    cursor = await db._get_db().execute("SELECT COUNT(*) FROM requests_fts")
+    assert (await cursor.fetchone())[0] == 3
+    assert worker.stats()["deleted"] == 3
+    await db.close()
+
+
+async def test_age_limit_and_compaction(tmp_path) -> None:
+    db = Database()
+    await db.init(tmp_path / "test.db")
+    old = datetime.now(UTC) - timedelta(days=2)
+    records = _conversation(40)
+    for record in records[:30]:
+        record.timestamp = old
+    await db.write_batch(records, [], [])
+
+    worker = RetentionWorker(db, max_age=86400)
+    assert (await worker.run_pass())["deleted"] == 30
+    compaction = await worker.compact()
+    assert compaction["reclaimed_bytes"] > 0
+    cursor = await db._get_db().execute("PRAGMA freelist_count")
+    assert (await cursor.fetchone())[0] == 0
+    await db.close()
@@ -0,0 +1,22 @@
+import random
+
+from agentprobe.storage.rollups import LatencySketch
+
+
+def test_sketch_quantiles_within_relative_accuracy_after_merge() -> None:
+    rng = random.Random(7)
+    values = [rng.lognormvariate(6, 1.5) for _ in range(20_000)] + [0.0] * 100
+    halves = LatencySketch(), LatencySketch()
+    for i, value in enumerate(values):
+        halves[i % 2].add(value)
+    merged = LatencySketch.from_json(halves[0].to_json())
+    merged.merge(halves[1])
+
+    values.sort()
+    assert merged.count == len(values)
+    assert merged.quantile(0.0) == 0.0
+    assert merged.quantile(1.0) == values[-1]
+    for q in (0.5, 0.9, 0.99, 0.999):
+        exact = values[int(q * (len(values) - 1))]
+        assert abs(merged.quantile(q) - exact) <= 0.01 * exact
+    assert LatencySketch().quantile(0.5) is None
@@ -0,0 +1,100 @@
+import asyncio
+
+from agentprobe.storage.database import Database
+from agentprobe.storage.records import CaptureRecord, SSEBatch
+from agentprobe.storage.writer import CaptureWriter
+
+
+def _captured(sequence: int) -> CaptureRecord:
+    return CaptureRecord(
+        sequence=sequence,
+        agent_type="claude_code",
+        method="POST",
+        url="https://api.anthropic.com/v1/messages",
+        host="api.anthropic.com",
+        path="/v1/messages",
+    )
+
+
+async def test_writer_batches_insert_update_and_sse(tmp_path) -> None:
+    db = Database()
+    await db.init(tmp_path / "test.db")
+    writer = CaptureWriter(db, batch_size=100, flush_interval=0.01)
+    writer.start()
+
+    captured = _captured(1)
+    await writer.save_request(captured)
+    await writer.update_request(captured.id, {"status_code": 200, "is_streaming": True})
+    sse = SSEBatch()
+    sse.append([{"event": "ping", "data": "{}"}], 0.0)
+    await writer.save_sse_batch(captured.id, sse)
+    await writer.close()
+
+    stored = await db.get_request(captured.id)
+    assert stored is not None
+    assert stored.status_code == 200
+    assert len(await db.get_sse_events(captured.id)) == 1
+    stats = writer.stats()
+    assert stats["written"] == 3
+    assert stats["flushes"] == 1
+    await db.close()
+
+
+async def test_writer_drop_policy_discards_follow_ups(tmp_path) -> None:
+    db = Database()
+    await db.init(tmp_path / "test.db")
+    writer = CaptureWriter(db, queue_size=1, overflow="drop")
+
+    first, second = _captured(1), _captured(2)
+    assert await writer.save_request(first)
+    assert not await writer.save_request(second)
+    assert not await writer.update_request(second.id, {"status_code": 200})
+
+    writer.start()
+    await asyncio.sleep(0)
+    await writer.close()
+
+    assert await db.get_request(first.id) is not None
+    assert await db.get_request(second.id) is None
+    assert writer.stats()["dropped"] == 2
+    await db.close()
+
+
+async def test_writer_indexes_finished_requests_for_search(tmp_path) -> None:
+    db = Database()
+    await db.init(tmp_path / "test.db")
+    writer = CaptureWriter(db, flush_interval=0.01)
+    writer.start()
+
+    captured = _captured(1)
+    captured.request_body = '{"messages":[{"role":"user","content":"rename the widget"}]}'
+    captured.response_body = '{"content":[{"type":"text","text":"Renamed Widget to Gadget"}]}'
+    await writer.save_request(captured)
+    assert await writer.index_request(captured)
+    await writer.close()
+
+    hits = await db.search_summaries('"gadget"')
+    assert [h["id"] for h in hits] == [captured.id]
+    assert "<mark>Gadget</mark>" in hits[0]["snippet"]
+    assert await db.search_summaries('"gizmo"') == []
+    assert writer.stats()["indexed"] == 1
+    await db.close()
+
+
+async def test_writer_reports_inserts_once_committed(tmp_path) -> None:
+    db = Database()
+    await db.init(tmp_path / "test.db")
+    committed: list[str] = []
+    writer = CaptureWriter(db, flush_interval=0.01, on_commit=committed.append)
+    writer.start()
+
+    captured = _captured(1)
+    await writer.save_request(captured)
+    await writer.update_request(captured.id, {"status_code": 200})
+    # Queued is not committed.
+    assert committed == []
+    await writer.close()
+
+    assert committed == [captured.id]
+    assert await db.get_request(captured.id) is not None
+    await db.close()
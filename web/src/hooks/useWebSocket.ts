@@ -37,6 +37,9 @@ export function useWebSocket() {
               addRequest(msg.data as RequestSummary);
               break;
             case 'update_request':
+            // A request_complete may stand in for a new_request still queued
+            // on the server, so it is an upsert.
+            case 'request_complete':
               updateRequest(msg.data as RequestSummary);
               break;
             case 'stats_update':